@@ -3,18 +3,53 @@ import google.generativeai as genai
 import os
 import tempfile
 import zipfile
+import tarfile
+import zlib
+import io
 import subprocess
 import json
+import csv
+import difflib
+import math
+import posixpath
 import time
 import ast
+import sys
+import builtins
 import re
+import importlib.util
+import xml.etree.ElementTree as ET
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional, Iterator
 import pandas as pd
 import plotly.graph_objects as go
 import plotly.express as px
-from datetime import datetime
+from datetime import datetime, timedelta
+from collections import OrderedDict, deque
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+try:
+    from google.generativeai import caching as genai_caching
+except ImportError:  # Older SDKs without context caching
+    genai_caching = None
+try:
+    import zstandard
+except ImportError:  # Optional; project blobs fall back to zlib
+    zstandard = None
 import shutil
+import hashlib
+import sqlite3
+import threading
+import queue
+import shlex
+import uuid
+import weakref
+import heapq
+import random
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed, FIRST_COMPLETED
 
 # Page config
 st.set_page_config(
@@ -220,292 +255,4547 @@ h1 {
 </style>
 """, unsafe_allow_html=True)
 
-class CodeOracle:
-    def __init__(self, api_key: str):
-        self.api_key = api_key
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
-        self.projects = {}
-        
-    def generate_project(self, prompt: str, language: str, architecture: str = "standard") -> Dict:
-        """Generate a complete project from natural language prompt"""
-        
-        system_prompt = f"""
-        You are CodeOracle, an expert software engineer. Generate a complete, production-ready {language} project based on the user's requirements.
-        
-        CRITICAL REQUIREMENTS:
-        1. Create a multi-file project structure with proper organization
-        2. Include all necessary files: source code, tests, README.md, requirements/package files, .gitignore
-        3. Write actual working code, not pseudocode or placeholders
-        4. Include comprehensive error handling and logging
-        5. Follow {language} best practices and conventions
-        6. Make the code modular and well-documented
-        7. Include unit tests and integration tests
-        8. Add security considerations where applicable
-        
-        Project Requirements: {prompt}
-        Target Language: {language}
-        Architecture Pattern: {architecture}
+class ProjectStreamParser:
+    """Incremental JSON scanner that emits entries of the "files" object as soon as they are complete
+
+    Also usable on a finished but truncated response to salvage every complete
+    file entry plus the top-level string fields seen before the cut-off.
+    """
+
+    _STRUCTURAL = re.compile(r'[{}\[\]:,"]')
+    _STRING_END = re.compile(r'["\\]')
+    _OBJECT_START = re.compile(r'\{\s*"')
+
+    def __init__(self, files_key: str = "files"):
+        self.files_key = files_key
+        self.fields = {}
+        self.buffer = ""
+        self.pos = 0
+        self.started = False
+        self.in_string = False
+        self.string_start = 0
+        # Each entry is [container_char, expecting_key, last_key]
+        self.stack = []
+        self.files_depth = None
+        self.pending_file = None
+        self.files = {}
+
+    def feed(self, text: str) -> List[Tuple[str, str]]:
+        """Consume a chunk of model output and return the files completed by it"""
+        self.buffer += text
+        completed = []
+
+        if not self.started:
+            # Skip prose (which may contain stray braces) up to the first '{"'
+            match = self._OBJECT_START.search(self.buffer, self.pos)
+            if not match:
+                last_brace = self.buffer.rfind('{', self.pos)
+                self.pos = last_brace if last_brace != -1 else len(self.buffer)
+                return completed
+            self.started = True
+            self.pos = match.start()
+
+        while self.pos < len(self.buffer):
+            if self.in_string:
+                match = self._STRING_END.search(self.buffer, self.pos)
+                if not match:
+                    self.pos = len(self.buffer)
+                    break
+                if match.group() == '\\':
+                    if match.end() >= len(self.buffer):
+                        # Escape sequence split across chunks, wait for more data
+                        self.pos = match.start()
+                        break
+                    self.pos = match.end() + 1
+                    continue
+                self.in_string = False
+                self.pos = match.end()
+                entry = self._close_string(self.buffer[self.string_start:self.pos])
+                if entry:
+                    completed.append(entry)
+                continue
+
+            match = self._STRUCTURAL.search(self.buffer, self.pos)
+            if not match:
+                self.pos = len(self.buffer)
+                break
+            char = match.group()
+            self.pos = match.end()
+
+            if char == '"':
+                self.in_string = True
+                self.string_start = match.start()
+            elif char == '{':
+                parent = self.stack[-1] if self.stack else None
+                self.stack.append(['{', True, None])
+                if (parent and parent[0] == '{' and len(self.stack) == 2
+                        and parent[2] == self.files_key and self.files_depth is None):
+                    self.files_depth = len(self.stack)
+            elif char == '[':
+                self.stack.append(['[', False, None])
+            elif char in '}]':
+                if self.stack:
+                    if len(self.stack) == self.files_depth:
+                        self.files_depth = -1
+                    self.stack.pop()
+            elif char == ':':
+                if self.stack:
+                    self.stack[-1][1] = False
+            elif char == ',':
+                if self.stack and self.stack[-1][0] == '{':
+                    self.stack[-1][1] = True
+
+        return completed
+
+    def _close_string(self, raw: str) -> Optional[Tuple[str, str]]:
+        """Handle a just-closed string literal, returning a file entry if one finished"""
+        if not self.stack or self.stack[-1][0] != '{':
+            return None
+
+        top = self.stack[-1]
+        in_files = len(self.stack) == self.files_depth
+
+        if top[1]:
+            top[2] = json.loads(raw) if (in_files or len(self.stack) == 1) else None
+            if in_files:
+                self.pending_file = top[2]
+            return None
+
+        if in_files and self.pending_file is not None:
+            filename, self.pending_file = self.pending_file, None
+            content = json.loads(raw)
+            self.files[filename] = content
+            return filename, content
+        if len(self.stack) == 1 and top[2] is not None:
+            self.fields[top[2]] = json.loads(raw)
+        return None
+
+def strip_markdown_fences(text: str) -> str:
+    """Return the body of the largest ``` fenced block, or the text unchanged"""
+    blocks = re.findall(r'^```[\w-]*[ \t]*\n(.*?)^```', text, re.MULTILINE | re.DOTALL)
+    return max(blocks, key=len) if blocks else text
+
+def extract_json_object(text: str, required_key: Optional[str] = None) -> Dict:
+    """Find the first JSON object in a model response, tolerating fences and surrounding prose"""
+    decoder = json.JSONDecoder()
+    
+    for candidate in (strip_markdown_fences(text), text):
+        for match in re.finditer(r'\{', candidate):
+            try:
+                data, _ = decoder.raw_decode(candidate, match.start())
+            except ValueError:
+                continue
+            if isinstance(data, dict) and (required_key is None or required_key in data):
+                return data
+    
+    raise ValueError("No complete JSON object found in model response")
+
+def salvage_json_files(text: str, files_key: str = "files") -> Tuple[Dict, bool]:
+    """Parse a response that should hold a files object; returns (data, complete)
+
+    A truncated response yields the complete file entries and top-level string
+    fields that arrived before the cut-off, with complete=False.
+    """
+    try:
+        return extract_json_object(text, required_key=files_key), True
+    except ValueError:
+        parser = ProjectStreamParser(files_key)
+        parser.feed(strip_markdown_fences(text) if text.count('```') >= 2 else text)
+        if not parser.files:
+            raise
+        return {**parser.fields, files_key: parser.files}, False
+
+CACHE_DIR = os.environ.get(
+    "SINGULARITY_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "singularity-ai")
+)
+
+class ResponseCache:
+    """Content-addressed LLM response cache on SQLite, shared across sessions and worker processes"""
+
+    def __init__(self, path: str, ttl_seconds: int = 7 * 24 * 3600, max_entries: int = 5000):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(path), exist_ok=True)
         
-        Return the response as a JSON object with this exact structure:
-        {{
-            "project_name": "project-name",
-            "description": "Brief project description",
-            "files": {{
-                "filename1.ext": "file content here",
-                "filename2.ext": "file content here",
-                "tests/test_file.ext": "test content here",
-                "README.md": "comprehensive readme",
-                ".gitignore": "appropriate gitignore for {language}"
-            }},
-            "dependencies": ["list", "of", "dependencies"],
-            "build_commands": ["command1", "command2"],
-            "run_commands": ["command1", "command2"],
-            "test_commands": ["test command"],
-            "architecture_notes": "explanation of the chosen architecture"
-        }}
-        """
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    model TEXT,
+                    method TEXT,
+                    response TEXT,
+                    created_at REAL,
+                    last_access REAL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_access ON responses(last_access)")
+            conn.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER)")
+            conn.execute("INSERT OR IGNORE INTO stats VALUES ('hits', 0), ('misses', 0)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    @staticmethod
+    def make_key(model: str, method: str, prompt: str) -> str:
+        """Hash model name, method and prompt into a cache key"""
+        digest = hashlib.sha256()
+        for part in (model, method, prompt):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def get(self, model: str, method: str, prompt: str) -> Optional[str]:
+        """Return a cached response or None, updating hit/miss counters"""
+        key = self.make_key(model, method, prompt)
+        now = time.time()
         
-        try:
-            response = self.model.generate_content(system_prompt)
-            
-            # Parse JSON response
-            json_start = response.text.find('{')
-            json_end = response.text.rfind('}') + 1
-            json_str = response.text[json_start:json_end]
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
             
-            project_data = json.loads(json_str)
-            return project_data
+            if row and now - row[1] <= self.ttl_seconds:
+                conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+                conn.execute("UPDATE stats SET value = value + 1 WHERE name = 'hits'")
+                return row[0]
             
-        except Exception as e:
-            st.error(f"Generation failed: {str(e)}")
+            if row:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            conn.execute("UPDATE stats SET value = value + 1 WHERE name = 'misses'")
             return None
-    
-    def run_tests(self, project_path: str, language: str, test_commands: List[str]) -> Dict:
-        """Run automated tests and return results"""
-        results = {
-            "success": False,
-            "output": "",
-            "errors": "",
-            "coverage": 0,
-            "failed_tests": []
-        }
+
+    def set(self, model: str, method: str, prompt: str, response: str):
+        """Store a response and evict expired and least recently used entries"""
+        key = self.make_key(model, method, prompt)
+        now = time.time()
         
-        try:
-            os.chdir(project_path)
-            
-            for cmd in test_commands:
-                process = subprocess.run(
-                    cmd.split(), 
-                    capture_output=True, 
-                    text=True, 
-                    timeout=30
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, method, response, now, now)
+            )
+            conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+            conn.execute("""
+                DELETE FROM responses WHERE key IN (
+                    SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?
                 )
-                
-                results["output"] += f"Command: {cmd}\n"
-                results["output"] += process.stdout
-                
-                if process.returncode != 0:
-                    results["errors"] += process.stderr
-                    results["failed_tests"].append(cmd)
-                else:
-                    results["success"] = True
-                    
-        except subprocess.TimeoutExpired:
-            results["errors"] = "Test execution timed out"
-        except Exception as e:
-            results["errors"] = str(e)
+            """, (self.max_entries,))
+
+    def invalidate(self, model: str, method: str, prompt: str):
+        """Drop a cached response, e.g. one that turned out to be unparseable"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM responses WHERE key = ?", (self.make_key(model, method, prompt),))
+
+    def stats(self) -> Dict:
+        """Return hit/miss counters and current entry count"""
+        with self._connect() as conn:
+            counters = dict(conn.execute("SELECT name, value FROM stats").fetchall())
+            entries = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        
+        lookups = counters.get('hits', 0) + counters.get('misses', 0)
+        return {
+            "hits": counters.get('hits', 0),
+            "misses": counters.get('misses', 0),
+            "hit_rate": round(counters.get('hits', 0) / lookups * 100, 1) if lookups else 0.0,
+            "entries": entries
+        }
+
+@st.cache_resource
+def get_response_cache() -> ResponseCache:
+    """Process-wide response cache instance"""
+    return ResponseCache(os.path.join(CACHE_DIR, "llm_cache.sqlite"))
+
+# Model call telemetry: recent samples per operation for percentiles, cumulative counters for export
+TELEMETRY_WINDOW = 2000
+TELEMETRY_EXPORT_INTERVAL = 10
+TELEMETRY_QUANTILES = (0.5, 0.95, 0.99)
+
+class LLMCall:
+    """Measurements for one model call; use as a context manager around the call"""
+
+    def __init__(self, telemetry: "LLMTelemetry", operation: str, model: str, prompt: str):
+        self.telemetry = telemetry
+        self.operation = operation
+        self.model = model
+        self.prompt_chars = len(prompt)
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self.ttft = None
+        self.prompt_tokens = 0
+        self.response_tokens = 0
+        self.response_chars = 0
+        self.retries = 0
+        self.cache = "miss"
+        self.error = None
+
+    def first_token(self):
+        """Mark the arrival of the first response chunk"""
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self.started
+
+    def output(self, text: str):
+        """Account a response chunk"""
+        self.first_token()
+        self.response_chars += len(text)
+
+    def usage(self, response):
+        """Take token counts from the response's usage metadata when the API reports them"""
+        meta = getattr(response, "usage_metadata", None)
+        if meta:
+            self.prompt_tokens = getattr(meta, "prompt_token_count", 0) or 0
+            self.response_tokens = getattr(meta, "candidates_token_count", 0) or 0
+
+    def __enter__(self) -> "LLMCall":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.started
+        if exc_type is GeneratorExit:
+            self.error = "Cancelled"
+        elif exc_type is not None:
+            self.error = exc_type.__name__
+        if self.cache != "hit":
+            # Roughly 4 characters per token when the API did not report usage
+            self.prompt_tokens = self.prompt_tokens or self.prompt_chars // 4
+            self.response_tokens = self.response_tokens or self.response_chars // 4
+        self.telemetry.record(self)
+        return False
+
+class LLMTelemetry:
+    """Thread-safe collector of model call latency, token, retry, cache and error statistics"""
+
+    def __init__(self, export_path: Optional[str] = None):
+        self.export_path = export_path
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.totals = {}
+        self.last_export = 0.0
+
+    def call(self, operation: str, model: str, prompt: str) -> LLMCall:
+        return LLMCall(self, operation, model, prompt)
+
+    def record(self, call: LLMCall):
+        with self.lock:
+            window = self.samples.setdefault(call.operation, deque(maxlen=TELEMETRY_WINDOW))
+            window.append((time.time(), call.model, call.duration, call.ttft, call.cache, call.error))
             
-        return results
-    
-    def debug_and_fix(self, project_data: Dict, test_results: Dict, max_iterations: int = 3) -> Dict:
-        """Autonomous debugging loop"""
+            totals = self.totals.setdefault(call.operation, {
+                "calls": 0, "errors": {}, "cache": {}, "duration_sum": 0.0, "ttft_sum": 0.0, "ttft_count": 0,
+                "prompt_tokens": 0, "response_tokens": 0, "retries": 0, "models": set()
+            })
+            totals["calls"] += 1
+            totals["duration_sum"] += call.duration
+            if call.ttft is not None:
+                totals["ttft_sum"] += call.ttft
+                totals["ttft_count"] += 1
+            totals["prompt_tokens"] += call.prompt_tokens
+            totals["response_tokens"] += call.response_tokens
+            totals["retries"] += call.retries
+            totals["models"].add(call.model)
+            totals["cache"][call.cache] = totals["cache"].get(call.cache, 0) + 1
+            if call.error:
+                totals["errors"][call.error] = totals["errors"].get(call.error, 0) + 1
+            
+            export_due = self.export_path and time.time() - self.last_export >= TELEMETRY_EXPORT_INTERVAL
+            if export_due:
+                self.last_export = time.time()
         
-        debug_prompt = f"""
-        The following project has failing tests. Analyze the errors and fix the code:
+        if export_due:
+            self.export()
+
+    @staticmethod
+    def _quantile(values: List[float], q: float) -> float:
+        """Nearest-rank quantile of a non-empty list"""
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+    def recent(self, operation: str, model: str, since: float) -> List[Tuple[float, bool]]:
+        """(duration, succeeded) of model-served calls for an operation and model since a timestamp"""
+        with self.lock:
+            window = list(self.samples.get(operation, ()))
+        return [
+            (duration, error is None)
+            for ts, call_model, duration, _, cache, error in window
+            if ts >= since and call_model == model and cache != "hit" and error != "Cancelled"
+        ]
+
+    def summary(self) -> List[Dict]:
+        """Per-operation rows with latency percentiles over the recent window and cumulative counters"""
+        with self.lock:
+            snapshot = {op: (list(window), dict(self.totals[op])) for op, window in self.samples.items()}
         
-        Project Structure: {list(project_data['files'].keys())}
-        Test Errors: {test_results['errors']}
-        Failed Commands: {test_results['failed_tests']}
+        rows = []
+        for operation, (window, totals) in sorted(snapshot.items()):
+            # Cache hits never reach the model, so they would skew model latency percentiles down
+            durations = [duration for _, _, duration, _, cache, _ in window if cache != "hit"] or [0.0]
+            ttfts = [ttft for _, _, _, ttft, cache, _ in window if ttft is not None and cache != "hit"] or [0.0]
+            row = {
+                "operation": operation,
+                "calls": totals["calls"],
+                "errors": sum(totals["errors"].values()),
+                "retries": totals["retries"],
+                "cache_hit_rate": round(100.0 * totals["cache"].get("hit", 0) / totals["calls"], 1),
+                "prompt_tokens": totals["prompt_tokens"],
+                "response_tokens": totals["response_tokens"],
+            }
+            for q in TELEMETRY_QUANTILES:
+                row[f"p{int(q * 100)}_s"] = round(self._quantile(durations, q), 3)
+            for q in TELEMETRY_QUANTILES[:2]:
+                row[f"ttft_p{int(q * 100)}_s"] = round(self._quantile(ttfts, q), 3)
+            rows.append(row)
+        return rows
+
+    def prometheus_text(self) -> str:
+        """Render all metrics in the Prometheus text exposition format"""
+        with self.lock:
+            snapshot = {op: (list(window), dict(self.totals[op])) for op, window in self.samples.items()}
         
-        Current Code Files:
-        {json.dumps(project_data['files'], indent=2)}
+        metrics = {
+            "singularity_llm_call_duration_seconds": ("summary", "Model call wall time", []),
+            "singularity_llm_time_to_first_token_seconds": ("summary", "Time to first response chunk", []),
+            "singularity_llm_calls_total": ("counter", "Model calls by cache status", []),
+            "singularity_llm_errors_total": ("counter", "Failed model calls by exception type", []),
+            "singularity_llm_tokens_total": ("counter", "Prompt and response tokens", []),
+            "singularity_llm_retries_total": ("counter", "Retried model calls", []),
+        }
         
-        Fix the issues and return the corrected files in the same JSON structure.
-        Focus on:
-        1. Syntax errors
-        2. Import/dependency issues  
-        3. Logic errors causing test failures
-        4. Missing error handling
+        def add(name, labels, value, suffix=""):
+            metrics[name][2].append((suffix, labels, value))
         
-        Return only the corrected files that need changes in this format:
-        {{
-            "fixed_files": {{
-                "filename": "corrected content"
-            }},
-            "fix_explanation": "What was fixed and why"
-        }}
-        """
+        for operation, (window, totals) in sorted(snapshot.items()):
+            op = {"operation": operation}
+            durations = [d for _, _, d, _, cache, _ in window if cache != "hit"]
+            ttfts = [t for _, _, _, t, cache, _ in window if t is not None and cache != "hit"]
+            for q in TELEMETRY_QUANTILES:
+                if durations:
+                    add("singularity_llm_call_duration_seconds", {**op, "quantile": q}, round(self._quantile(durations, q), 6))
+                if ttfts:
+                    add("singularity_llm_time_to_first_token_seconds", {**op, "quantile": q}, round(self._quantile(ttfts, q), 6))
+            add("singularity_llm_call_duration_seconds", op, round(totals["duration_sum"], 6), "_sum")
+            add("singularity_llm_call_duration_seconds", op, totals["calls"], "_count")
+            add("singularity_llm_time_to_first_token_seconds", op, round(totals["ttft_sum"], 6), "_sum")
+            add("singularity_llm_time_to_first_token_seconds", op, totals["ttft_count"], "_count")
+            for cache, count in sorted(totals["cache"].items()):
+                add("singularity_llm_calls_total", {**op, "cache": cache}, count)
+            for error, count in sorted(totals["errors"].items()):
+                add("singularity_llm_errors_total", {**op, "error": error}, count)
+            add("singularity_llm_tokens_total", {**op, "direction": "prompt"}, totals["prompt_tokens"])
+            add("singularity_llm_tokens_total", {**op, "direction": "response"}, totals["response_tokens"])
+            add("singularity_llm_retries_total", op, totals["retries"])
+        
+        lines = []
+        for name, (kind, help_text, samples) in metrics.items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            for suffix, labels, value in samples:
+                label_text = ",".join(f'{key}="{val}"' for key, val in labels.items())
+                lines.append(f"{name}{suffix}{{{label_text}}} {value}")
+        return "\n".join(lines) + "\n"
+
+    def export(self):
+        """Atomically write the Prometheus text file for a node_exporter textfile collector"""
+        if not self.export_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.export_path), exist_ok=True)
+            temp_path = f"{self.export_path}.{os.getpid()}.tmp"
+            with open(temp_path, "w") as handle:
+                handle.write(self.prometheus_text())
+            os.replace(temp_path, self.export_path)
+        except OSError:
+            pass
+
+@st.cache_resource
+def get_llm_telemetry() -> LLMTelemetry:
+    """Process-wide model call telemetry, exported to llm_metrics.prom in the cache dir"""
+    return LLMTelemetry(os.environ.get("SINGULARITY_METRICS_FILE", os.path.join(CACHE_DIR, "llm_metrics.prom")))
+
+# Model tiers from fastest/cheapest to strongest
+MODEL_TIERS = OrderedDict([
+    ("lite", "gemini-2.5-flash-lite"),
+    ("standard", "gemini-2.5-flash"),
+    ("pro", "gemini-2.5-pro"),
+])
+# Default tier per operation; SINGULARITY_MODEL_TIERS (JSON object) overrides entries
+OPERATION_TIERS = {
+    "explain_code": "lite", "env_config": "lite", "dockerfile": "lite",
+    "deploy": "standard", "generate_cicd": "standard", "refactor_code": "standard", "security_scan": "standard",
+    "generate_project": "pro", "generate_project_continue": "pro", "debug_and_fix": "pro",
+}
+# Prompts above this many tokens are too large for the lite tier
+LITE_MAX_TOKENS = 30000
+# Latency SLO per operation in seconds; breaching tiers fall back one step faster
+OPERATION_SLO_SECONDS = {
+    "explain_code": 20, "env_config": 20, "dockerfile": 20, "deploy": 30,
+    "generate_project": 240, "generate_project_continue": 240, "debug_and_fix": 180,
+}
+DEFAULT_SLO_SECONDS = 90
+SLO_WINDOW_SECONDS = 600
+SLO_MIN_SAMPLES = 5
+SLO_MIN_SUCCESS_RATE = 0.8
+
+class ModelRouter:
+    """Pick a model tier per operation and prompt size, falling back to faster tiers on SLO breaches"""
+
+    def __init__(self, telemetry: LLMTelemetry, overrides: Optional[Dict[str, str]] = None):
+        self.telemetry = telemetry
+        self.tiers = dict(OPERATION_TIERS)
+        self.tiers.update(overrides if overrides is not None else json.loads(os.environ.get("SINGULARITY_MODEL_TIERS", "{}")))
+        self.override = None
+        self.adaptive = True
+
+    def base_tier(self, operation: str, prompt: str) -> str:
+        """Configured tier for an operation, promoted off lite for oversized prompts"""
+        tier = self.override or self.tiers.get(operation, "standard")
+        if tier == "lite" and len(prompt) // 4 > LITE_MAX_TOKENS:
+            tier = "standard"
+        return tier
+
+    def breached(self, operation: str, tier: str) -> bool:
+        """Whether a tier recently missed the operation's latency SLO or success rate"""
+        samples = self.telemetry.recent(operation, MODEL_TIERS[tier], time.time() - SLO_WINDOW_SECONDS)
+        if len(samples) < SLO_MIN_SAMPLES:
+            return False
+        durations = [duration for duration, _ in samples]
+        success_rate = sum(ok for _, ok in samples) / len(samples)
+        slo = OPERATION_SLO_SECONDS.get(operation, DEFAULT_SLO_SECONDS)
+        return LLMTelemetry._quantile(durations, 0.95) > slo or success_rate < SLO_MIN_SUCCESS_RATE
+
+    def route(self, operation: str, prompt: str) -> str:
+        """Model name to use for this call"""
+        tiers = list(MODEL_TIERS)
+        index = tiers.index(self.base_tier(operation, prompt))
+        if self.adaptive:
+            while index > 0 and self.breached(operation, tiers[index]):
+                index -= 1
+        return MODEL_TIERS[tiers[index]]
+
+    def status(self) -> List[Dict]:
+        """Routing table: configured and effective model per known operation"""
+        rows = []
+        for operation in sorted(set(self.tiers) | set(OPERATION_SLO_SECONDS)):
+            tier = self.base_tier(operation, "")
+            rows.append({
+                "operation": operation,
+                "tier": tier,
+                "model": self.route(operation, ""),
+                "slo_s": OPERATION_SLO_SECONDS.get(operation, DEFAULT_SLO_SECONDS),
+                "fallback": self.adaptive and self.breached(operation, tier),
+            })
+        return rows
+
+# Shared request governor: RPM/TPM token buckets in SQLite so every session and worker process draws from one budget
+GOVERNOR_LIMITS = {
+    "rpm": int(os.environ.get("SINGULARITY_RPM", 60)),
+    "tpm": int(os.environ.get("SINGULARITY_TPM", 1000000)),
+}
+MAX_RETRIES = 4
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 30.0
+# google.api_core exception class names for 429/500/503/504 plus transport-level failures
+RETRYABLE_ERRORS = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "InternalServerError",
+    "DeadlineExceeded", "GatewayTimeout", "ConnectionError", "TimeoutError"
+}
+# Lower runs first: interactive calls ahead of generation, bulk work last
+OPERATION_PRIORITY = {
+    "explain_code": 0, "dockerfile": 0, "deploy": 0, "env_config": 0,
+    "generate_project": 1, "generate_project_continue": 1, "debug_and_fix": 1,
+    "refactor_code": 2, "generate_cicd": 2,
+    "security_scan": 3,
+}
+
+class RequestGovernor:
+    """Token-bucket rate limiter with priority admission and jittered exponential backoff"""
+
+    def __init__(self, path: str, rpm: int = GOVERNOR_LIMITS["rpm"], tpm: int = GOVERNOR_LIMITS["tpm"]):
+        self.path = path
+        self.buckets = {"requests": (rpm, rpm / 60.0), "tokens": (tpm, tpm / 60.0)}
+        self.condition = threading.Condition()
+        self.waiting = []
+        self.sequence = 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
         
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, level REAL, updated REAL)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def _take(self, tokens: int) -> float:
+        """Deduct one request and `tokens` tokens if both buckets allow it; otherwise return seconds to wait"""
+        now = time.time()
+        need = {"requests": 1, "tokens": min(tokens, self.buckets["tokens"][0])}
+        conn = self._connect()
         try:
-            response = self.model.generate_content(debug_prompt)
-            json_start = response.text.find('{')
-            json_end = response.text.rfind('}') + 1
-            json_str = response.text[json_start:json_end]
+            conn.execute("BEGIN IMMEDIATE")
+            levels = {}
+            for name, (capacity, rate) in self.buckets.items():
+                row = conn.execute("SELECT level, updated FROM buckets WHERE name = ?", (name,)).fetchone()
+                level = capacity if row is None else min(capacity, row[0] + (now - row[1]) * rate)
+                levels[name] = level
             
-            fix_data = json.loads(json_str)
+            wait = max((need[name] - levels[name]) / self.buckets[name][1] for name in self.buckets)
+            if wait > 0:
+                conn.execute("ROLLBACK")
+                return wait
             
-            # Apply fixes
-            for filename, content in fix_data.get("fixed_files", {}).items():
-                project_data["files"][filename] = content
-                
-            return {
-                "success": True,
-                "explanation": fix_data.get("fix_explanation", ""),
-                "updated_project": project_data
-            }
+            conn.executemany(
+                "INSERT OR REPLACE INTO buckets (name, level, updated) VALUES (?, ?, ?)",
+                [(name, levels[name] - need[name], now) for name in self.buckets]
+            )
+            conn.execute("COMMIT")
+            return 0.0
+        finally:
+            conn.close()
+
+    def acquire(self, operation: str, prompt: str):
+        """Block until the shared budget admits this call; within a process, higher priority goes first"""
+        tokens = len(prompt) // 4
+        with self.condition:
+            self.sequence += 1
+            ticket = (OPERATION_PRIORITY.get(operation, 1), self.sequence)
+            heapq.heappush(self.waiting, ticket)
+            try:
+                while True:
+                    wait = self._take(tokens) if self.waiting[0] == ticket else 1.0
+                    if wait <= 0:
+                        return
+                    self.condition.wait(timeout=min(wait, 5.0))
+            finally:
+                self.waiting.remove(ticket)
+                heapq.heapify(self.waiting)
+                self.condition.notify_all()
+
+    @staticmethod
+    def retry_delay(error: Exception, attempt: int) -> Optional[float]:
+        """Full-jitter backoff for retryable errors, None when the call should fail"""
+        retryable = type(error).__name__ in RETRYABLE_ERRORS or getattr(error, "code", None) in (429, 500, 503, 504)
+        if not retryable or attempt >= MAX_RETRIES:
+            return None
+        return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+    def levels(self) -> Dict[str, float]:
+        """Current bucket fill levels as a percentage of capacity"""
+        now = time.time()
+        with self._connect() as conn:
+            rows = dict((name, (level, updated)) for name, level, updated in conn.execute("SELECT name, level, updated FROM buckets"))
+        result = {}
+        for name, (capacity, rate) in self.buckets.items():
+            level, updated = rows.get(name, (capacity, now))
+            result[name] = round(100.0 * min(capacity, level + (now - updated) * rate) / capacity, 1)
+        return result
+
+@st.cache_resource
+def get_request_governor() -> RequestGovernor:
+    """Process-wide request governor backed by the shared governor database"""
+    return RequestGovernor(os.path.join(CACHE_DIR, "governor.sqlite"))
+
+# Per-command sandbox limits for build and test execution
+COMMAND_LIMITS = {
+    "timeout": 300,
+    "cpu_seconds": 240,
+    "memory_mb": 2048
+}
+
+# Commands that prepare the workspace and must finish before anything else runs
+SETUP_COMMAND_PREFIXES = (
+    "pip install", "pip3 install", "python -m pip", "poetry install", "npm install", "npm ci",
+    "yarn install", "pnpm install", "go mod", "go get", "cargo fetch", "cargo build",
+    "mvn install", "gradle build", "bundle install"
+)
+
+# Dependency caches shared by every workspace; variables the operator already set are left alone
+DEPENDENCY_CACHE_DIR = os.path.join(CACHE_DIR, "deps")
+DEPENDENCY_CACHE_ENV = {
+    "PIP_CACHE_DIR": "pip",
+    "npm_config_cache": "npm",
+    "YARN_CACHE_FOLDER": "yarn",
+    "CARGO_HOME": "cargo",
+    "GOMODCACHE": "go/mod",
+    "GOCACHE": "go/build",
+    "GRADLE_USER_HOME": "gradle",
+}
+
+def command_environment() -> Dict[str, str]:
+    """Environment for build and test commands, pointing package managers at the shared dependency cache"""
+    env = dict(os.environ)
+    for variable, subdir in DEPENDENCY_CACHE_ENV.items():
+        env.setdefault(variable, os.path.join(DEPENDENCY_CACHE_DIR, subdir))
+    return env
+
+# Bounded command logs: first lines plus a ring of the latest in memory, the full text spilled to disk when large
+LOG_HEAD_LINES = 200
+LOG_TAIL_LINES = 2000
+LOG_SPILL_BYTES = 1024 * 1024
+LOG_DIR = os.path.join(tempfile.gettempdir(), "singularity-ai-logs")
+
+class LogBuffer:
+    """Thread-safe, memory-bounded log of output lines"""
+
+    def __init__(self, spill: bool = True, head_lines: int = LOG_HEAD_LINES, tail_lines: int = LOG_TAIL_LINES,
+                 spill_bytes: int = LOG_SPILL_BYTES):
+        self.spill = spill
+        self.head_lines = head_lines
+        self.spill_bytes = spill_bytes
+        self.head = []
+        self.tail = deque(maxlen=tail_lines)
+        self.pending = []
+        self.lines = 0
+        self.bytes = 0
+        self.path = None
+        self._file = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self.lines
+
+    def append(self, line: str):
+        line = line.rstrip('\n')
+        with self._lock:
+            self.lines += 1
+            self.bytes += len(line) + 1
+            if len(self.head) < self.head_lines:
+                self.head.append(line)
+            else:
+                self.tail.append(line)
             
-        except Exception as e:
-            return {"success": False, "error": str(e)}
+            if not self.spill:
+                return
+            if self._file:
+                self._file.write(line + '\n')
+                return
+            self.pending.append(line)
+            if self.bytes > self.spill_bytes:
+                os.makedirs(LOG_DIR, exist_ok=True)
+                self._file = tempfile.NamedTemporaryFile('w', dir=LOG_DIR, suffix='.log', delete=False, encoding='utf-8')
+                self.path = self._file.name
+                weakref.finalize(self, _remove_file, self.path)
+                self._file.write('\n'.join(self.pending) + '\n')
+                self.pending = []
+
+    def text(self) -> str:
+        """Head and tail of the log, with a marker for the lines dropped in between"""
+        with self._lock:
+            omitted = self.lines - len(self.head) - len(self.tail)
+            lines = self.head + ([f"... {omitted} lines omitted ..."] if omitted else []) + list(self.tail)
+        return '\n'.join(lines) + ('\n' if lines else '')
+
+    def last(self, count: int) -> List[str]:
+        with self._lock:
+            lines = self.head + list(self.tail)
+        return lines[-count:]
+
+    def full_text(self) -> str:
+        """Complete log when it was kept or spilled, otherwise the bounded text"""
+        with self._lock:
+            if self._file:
+                self._file.flush()
+            path = self.path
+            pending = list(self.pending) if self.spill and not path else None
+        if path:
+            with open(path, encoding='utf-8', errors='replace') as f:
+                return f.read()
+        if pending is not None:
+            return '\n'.join(pending) + ('\n' if pending else '')
+        return self.text()
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+def _remove_file(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+@st.cache_resource
+def get_command_pool() -> ThreadPoolExecutor:
+    """Process-wide bounded pool that all sessions share for running commands"""
+    return ThreadPoolExecutor(max_workers=os.cpu_count() or 2, thread_name_prefix="singularity-cmd")
+
+PRLIMIT = shutil.which("prlimit")
+
+def _limited_argv(argv: List[str], cpu_seconds: int, memory_mb: int) -> List[str]:
+    """Wrap argv with prlimit(1) so CPU and memory rlimits are set before the command execs
+
+    preexec_fn is not safe in this multithreaded process; without prlimit the
+    limits are applied right after spawn instead (see _apply_limits).
+    """
+    if not PRLIMIT:
+        return argv
+    return [PRLIMIT, f"--cpu={cpu_seconds}", f"--data={memory_mb * 1024 * 1024}", "--", *argv]
+
+def _apply_limits(pid: int, cpu_seconds: int, memory_mb: int):
+    """Set CPU and memory rlimits on a running child (fallback when prlimit(1) is unavailable)"""
+    if PRLIMIT or resource is None or not hasattr(resource, "prlimit"):
+        return
+    try:
+        resource.prlimit(pid, resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds))
+        memory_bytes = memory_mb * 1024 * 1024
+        resource.prlimit(pid, resource.RLIMIT_DATA, (memory_bytes, memory_bytes))
+    except (OSError, ValueError):
+        pass
+
+def run_command(cmd: str, cwd: str, on_line=None, limits: Optional[Dict] = None, env: Optional[Dict[str, str]] = None,
+                cancel: Optional[threading.Event] = None, stdout_path: Optional[str] = None) -> Dict:
+    """Run one command in cwd under rlimits, calling on_line(stream, line) as output arrives
+
+    Captured stdout/stderr are bounded LogBuffers, so a chatty command keeps its
+    first and latest lines rather than its whole output; stdout_path additionally
+    receives the complete stdout, for reporters that print results there. Setting
+    `cancel` kills the command's process group.
+    """
+    limits = {**COMMAND_LIMITS, **(limits or {})}
+    result = {
+        "command": cmd,
+        "returncode": None,
+        "stdout": "",
+        "stderr": "",
+        "timed_out": False,
+        "cancelled": False,
+        "duration": 0.0
+    }
+    started = time.time()
     
-    def refactor_code(self, project_data: Dict, refactor_type: str) -> Dict:
-        """Refactor code for different objectives"""
-        
-        refactor_prompts = {
-            "readability": "Refactor for maximum readability and maintainability",
-            "performance": "Optimize for performance and efficiency", 
-            "size": "Minimize code size and bundle size",
-            "security": "Enhance security and add security best practices"
+    try:
+        process = subprocess.Popen(
+            _limited_argv(shlex.split(cmd), limits["cpu_seconds"], limits["memory_mb"]),
+            cwd=cwd,
+            env=env or command_environment(),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            bufsize=1,
+            start_new_session=True
+        )
+        _apply_limits(process.pid, limits["cpu_seconds"], limits["memory_mb"])
+    except Exception as e:
+        result["stderr"] = str(e)
+        result["returncode"] = -1
+        return result
+    
+    captured = {"stdout": LogBuffer(spill=False), "stderr": LogBuffer(spill=False)}
+    
+    def pump(stream_name, stream):
+        transcript = open(stdout_path, 'w', encoding='utf-8') if stream_name == "stdout" and stdout_path else None
+        try:
+            for line in stream:
+                captured[stream_name].append(line)
+                if transcript:
+                    transcript.write(line)
+                if on_line:
+                    on_line(stream_name, line)
+        finally:
+            if transcript:
+                transcript.close()
+            stream.close()
+    
+    readers = [
+        threading.Thread(target=pump, args=("stdout", process.stdout), daemon=True),
+        threading.Thread(target=pump, args=("stderr", process.stderr), daemon=True)
+    ]
+    for reader in readers:
+        reader.start()
+    
+    deadline = started + limits["timeout"]
+    while True:
+        try:
+            process.wait(timeout=0.2)
+            break
+        except subprocess.TimeoutExpired:
+            if cancel is not None and cancel.is_set():
+                result["cancelled"] = True
+            elif time.time() >= deadline:
+                result["timed_out"] = True
+            else:
+                continue
+        try:
+            os.killpg(process.pid, 9)
+        except (OSError, AttributeError):
+            process.kill()
+        process.wait()
+        break
+    
+    for reader in readers:
+        reader.join(timeout=5)
+    
+    result["returncode"] = process.returncode
+    result["stdout"] = captured["stdout"].text()
+    result["stderr"] = captured["stderr"].text()
+    if result["timed_out"]:
+        result["stderr"] += f"\nCommand timed out after {limits['timeout']}s\n"
+    if result["cancelled"]:
+        result["stderr"] += "\nCommand cancelled\n"
+    result["duration"] = round(time.time() - started, 2)
+    return result
+
+def stream_commands(commands: List[str], cwd: str, limits: Optional[Dict] = None,
+                    cancel: Optional[threading.Event] = None,
+                    stdout_paths: Optional[Dict[str, str]] = None) -> Iterator[Tuple[str, object]]:
+    """Run commands on the shared pool, yielding ("line", (cmd, stream, text)) events and a final ("results", [...])
+
+    Setup commands (installs, fetches) run one at a time in order; the remaining
+    commands are independent and run concurrently. Once `cancel` is set, running
+    commands are killed and later stages are skipped. stdout_paths maps a command
+    to a file receiving its complete stdout.
+    """
+    pool = get_command_pool()
+    events = queue.Queue()
+    setup = [cmd for cmd in commands if cmd.strip().startswith(SETUP_COMMAND_PREFIXES)]
+    independent = [cmd for cmd in commands if cmd not in setup]
+    stages = [[cmd] for cmd in setup] + ([independent] if independent else [])
+    results = {}
+    
+    for stage in stages:
+        if cancel is not None and cancel.is_set():
+            break
+        futures = {
+            pool.submit(
+                run_command, cmd, cwd,
+                lambda stream, line, cmd=cmd: events.put((cmd, stream, line)),
+                limits, None, cancel, (stdout_paths or {}).get(cmd)
+            ): cmd
+            for cmd in stage
         }
+        pending = set(futures)
         
-        prompt = f"""
-        {refactor_prompts[refactor_type]} for this project:
-        
-        {json.dumps(project_data['files'], indent=2)}
-        
-        Return the refactored files in JSON format with explanations.
-        """
+        while pending:
+            done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+            while not events.empty():
+                yield "line", events.get_nowait()
+            for future in done:
+                results[futures[future]] = future.result()
         
+        while not events.empty():
+            yield "line", events.get_nowait()
+    
+    yield "results", [results[cmd] for cmd in commands if cmd in results]
+
+# Test result ingestion: machine-readable reporters per runner, parsed into per-test records
+TEST_FAILURE_CONTEXT = 1500
+CARGO_TEST_PATTERN = re.compile(r'^test (\S+) \.\.\. (ok|FAILED|ignored)', re.MULTILINE)
+CARGO_FAILURE_PATTERN = re.compile(r'^---- (\S+) stdout ----\n(.*?)(?=^---- |^failures:|\Z)', re.MULTILINE | re.DOTALL)
+
+def _package_test_script(project_path: str) -> str:
+    try:
+        with open(os.path.join(project_path, "package.json"), encoding='utf-8') as f:
+            return str(json.load(f).get("scripts", {}).get("test", ""))
+    except (OSError, ValueError, AttributeError):
+        return ""
+
+def instrument_test_command(cmd: str, project_path: str, report_dir: str, index: int) -> Tuple[str, str, Dict[str, str]]:
+    """Add machine-readable reporter flags for known runners
+
+    Returns (command, runner, report paths); unknown runners are left as they
+    are and reported at command level only.
+    """
+    try:
+        tokens = shlex.split(cmd)
+    except ValueError:
+        return cmd, "", {}
+    reports = {}
+    
+    if tokens[:1] == ["pytest"] or tokens[1:3] == ["-m", "pytest"]:
+        reports["junit"] = os.path.join(report_dir, f"junit-{index}.xml")
+        cmd += f" --junitxml={shlex.quote(reports['junit'])}"
+        if importlib.util.find_spec("pytest_cov") is not None:
+            reports["coverage"] = os.path.join(report_dir, f"coverage-{index}.json")
+            cmd += f" --cov=. --cov-report=json:{shlex.quote(reports['coverage'])}"
+        return cmd, "pytest", reports
+    
+    uses_jest = any(token in ("jest", "vitest") for token in tokens[:3])
+    if not uses_jest and tokens[:2] in (["npm", "test"], ["yarn", "test"]) and "jest" in _package_test_script(project_path):
+        uses_jest = True
+        cmd += " --" if tokens[0] == "npm" and "--" not in tokens else ""
+    if uses_jest and "vitest" not in tokens[:3]:
+        reports["jest"] = os.path.join(report_dir, f"jest-{index}.json")
+        coverage_dir = os.path.join(report_dir, f"coverage-{index}")
+        reports["coverage"] = os.path.join(coverage_dir, "coverage-summary.json")
+        cmd += (f" --json --outputFile={shlex.quote(reports['jest'])} --coverage --coverageReporters=json-summary"
+                f" --coverageDirectory={shlex.quote(coverage_dir)}")
+        return cmd, "jest", reports
+    
+    # Go and cargo report on stdout, which run_command keeps only head+tail of; the full stream goes to a file
+    if tokens[:2] == ["go", "test"]:
+        reports["coverage"] = os.path.join(report_dir, f"cover-{index}.out")
+        reports["stdout"] = os.path.join(report_dir, f"go-{index}.jsonl")
+        return f"go test -json -coverprofile={shlex.quote(reports['coverage'])} {shlex.join(tokens[2:])}".strip(), "go", reports
+    
+    if tokens[:2] == ["cargo", "test"]:
+        reports["stdout"] = os.path.join(report_dir, f"cargo-{index}.txt")
+        return cmd, "cargo", reports
+    
+    return cmd, "", reports
+
+def _test_record(name: str, status: str, duration: float = 0.0, file: str = "", message: str = "") -> Dict:
+    return {
+        "name": name,
+        "file": file,
+        "status": status,
+        "duration": round(float(duration or 0.0), 3),
+        "message": message[-TEST_FAILURE_CONTEXT:]
+    }
+
+def _junit_test_file(classname: str, project_path: str) -> str:
+    """Source file of a JUnit classname such as tests.test_api.TestUsers, found by its longest existing module prefix"""
+    parts = classname.split('.')
+    for length in range(len(parts), 0, -1):
+        candidate = '/'.join(parts[:length]) + ".py"
+        if os.path.exists(os.path.join(project_path, candidate)):
+            return candidate
+    return ""
+
+def parse_junit_xml(path: str, project_path: str) -> List[Dict]:
+    """Per-test records from a JUnit XML report (pytest --junitxml and compatible runners)"""
+    records = []
+    for case in ET.parse(path).getroot().iter("testcase"):
+        status, message = "passed", ""
+        for tag, outcome in (("failure", "failed"), ("error", "error"), ("skipped", "skipped")):
+            element = case.find(tag)
+            if element is not None:
+                status = outcome
+                message = f"{element.get('message', '')}\n{element.text or ''}".strip()
+                break
+        classname = case.get("classname", "")
+        name = f"{classname}::{case.get('name', '')}" if classname else case.get("name", "")
+        file = case.get("file") or _junit_test_file(classname, project_path)
+        records.append(_test_record(name, status, case.get("time", 0), file, message))
+    return records
+
+def parse_jest_json(path: str, project_path: str) -> List[Dict]:
+    """Per-test records from a jest --json report"""
+    with open(path, encoding='utf-8') as f:
+        report = json.load(f)
+    records = []
+    for suite in report.get("testResults", []):
+        file = os.path.relpath(suite.get("name", ""), project_path) if suite.get("name") else ""
+        for assertion in suite.get("assertionResults", []):
+            status = {"passed": "passed", "failed": "failed"}.get(assertion.get("status"), "skipped")
+            records.append(_test_record(
+                assertion.get("fullName") or assertion.get("title", ""),
+                status,
+                (assertion.get("duration") or 0) / 1000.0,
+                file,
+                "\n".join(assertion.get("failureMessages") or [])
+            ))
+    return records
+
+def parse_go_test_json(lines) -> Tuple[List[Dict], str]:
+    """Per-test records from `go test -json` output lines, plus the equivalent plain text output (bounded)"""
+    records, output, plain = {}, {}, LogBuffer(spill=False)
+    for line in lines:
+        line = line.rstrip('\n')
         try:
-            response = self.model.generate_content(prompt)
-            # Parse and return refactored code
-            return {"success": True, "refactored": response.text}
-        except Exception as e:
-            return {"success": False, "error": str(e)}
+            event = json.loads(line)
+        except ValueError:
+            plain.append(line)
+            continue
+        if not isinstance(event, dict):
+            continue
+        key = (event.get("Package", ""), event.get("Test"))
+        if event.get("Action") == "output":
+            plain.append(event.get("Output", "").rstrip('\n'))
+            output.setdefault(key, []).append(event.get("Output", ""))
+        elif event.get("Action") in ("pass", "fail", "skip") and event.get("Test"):
+            status = {"pass": "passed", "fail": "failed", "skip": "skipped"}[event["Action"]]
+            test_output = output.pop(key, [])
+            records[key] = _test_record(
+                f"{key[0]}::{key[1]}", status, event.get("Elapsed", 0), key[0],
+                "".join(test_output) if status == "failed" else ""
+            )
+    return list(records.values()), plain.text()
+
+def parse_cargo_output(stdout: str) -> List[Dict]:
+    """Per-test records from libtest's human-readable `cargo test` output"""
+    failures = {name: text.strip() for name, text in CARGO_FAILURE_PATTERN.findall(stdout)}
+    return [
+        _test_record(name, {"ok": "passed", "FAILED": "failed", "ignored": "skipped"}[outcome],
+                     message=failures.get(name, ""))
+        for name, outcome in CARGO_TEST_PATTERN.findall(stdout)
+    ]
+
+def parse_coverage(path: str, runner: str) -> Optional[float]:
+    """Line/statement coverage percentage from a pytest-cov JSON, jest json-summary or Go cover profile"""
+    if not os.path.exists(path):
+        return None
+    try:
+        if runner == "go":
+            covered = total = 0
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) == 3 and not line.startswith("mode:"):
+                        statements, count = int(parts[1]), int(parts[2])
+                        total += statements
+                        covered += statements if count > 0 else 0
+            return round(100.0 * covered / total, 1) if total else None
+        with open(path, encoding='utf-8') as f:
+            report = json.load(f)
+        if runner == "pytest":
+            return round(report["totals"]["percent_covered"], 1)
+        return round(report["total"]["lines"]["pct"], 1)
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+def ingest_test_reports(command_result: Dict, runner: str, reports: Dict[str, str], project_path: str) -> Tuple[List[Dict], Optional[float]]:
+    """Parse one command's reports into per-test records and its coverage percentage"""
+    records = []
+    try:
+        if runner == "pytest" and os.path.exists(reports.get("junit", "")):
+            records = parse_junit_xml(reports["junit"], project_path)
+        elif runner == "jest" and os.path.exists(reports.get("jest", "")):
+            records = parse_jest_json(reports["jest"], project_path)
+        elif runner == "go":
+            with open(reports["stdout"], encoding='utf-8', errors='replace') as f:
+                records, command_result["stdout"] = parse_go_test_json(f)
+        elif runner == "cargo":
+            with open(reports["stdout"], encoding='utf-8', errors='replace') as f:
+                records = parse_cargo_output(f.read())
+    except (OSError, ValueError, ET.ParseError):
+        records = []
+    
+    coverage = parse_coverage(reports["coverage"], runner) if "coverage" in reports else None
+    return records, coverage
+
+def format_test_failures(test_results: Dict, limit: int = 20) -> str:
+    """Compact failing-test context for prompts: name, file and the tail of each failure message"""
+    failures = test_results.get("failures") or []
+    return "\n\n".join(
+        f"- {record['name']} ({record['file'] or 'unknown file'}) [{record['status']}]\n{record['message']}"
+        for record in failures[:limit]
+    )
+
+# Characters of implicated source sent per debug round before falling back to the symbol index
+DEBUG_CONTEXT_BUDGET = 60000
+
+SYMBOL_PATTERN = re.compile(
+    r'^\s*(?:export\s+)?(?:default\s+)?(?:pub(?:\([^)]*\))?\s+)?(?:public\s+|private\s+|protected\s+|static\s+|async\s+)*'
+    r'(?:(class|struct|interface|enum|trait|type|def|fn|func|function)\s+(?:\([^)]*\)\s*)?([A-Za-z_]\w*))',
+    re.MULTILINE
+)
+
+def extract_symbols(filename: str, content: str) -> List[str]:
+    """Return the top-level classes and functions defined in a source file"""
+    if filename.endswith('.py'):
+        try:
+            tree = ast.parse(content)
+        except SyntaxError:
+            return ["<syntax error>"]
+        symbols = []
+        for node in tree.body:
+            if isinstance(node, ast.ClassDef):
+                methods = [n.name for n in node.body if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))]
+                symbols.append(f"class {node.name}({', '.join(methods)})" if methods else f"class {node.name}")
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                symbols.append(f"def {node.name}")
+        return symbols
+    
+    return [f"{kind} {name}" for kind, name in SYMBOL_PATTERN.findall(content)]
+
+def format_symbol_index(files: Dict[str, str]) -> str:
+    """Compact one-line-per-file index of the symbols defined in files"""
+    lines = []
+    for filename, content in files.items():
+        symbols = extract_symbols(filename, content)
+        lines.append(f"{filename}: {'; '.join(symbols)}" if symbols else filename)
+    return "\n".join(lines)
+
+def find_implicated_files(files: Dict[str, str], error_text: str, budget: int = DEBUG_CONTEXT_BUDGET,
+                          graph: Optional[Dict] = None) -> List[str]:
+    """Pick the files referenced by a traceback or test output, within a character budget
+
+    With an import graph, the direct imports of those files follow them so the
+    model also sees the modules the failing code depends on.
+    """
+    implicated = []
+    for filename in files:
+        module_path = filename.rsplit('.', 1)[0].replace('/', '.')
+        basename = os.path.basename(filename)
+        if (filename in error_text
+                or (len(basename) > 3 and re.search(r'(?<![\w.])' + re.escape(basename), error_text))
+                or ('/' in filename and module_path in error_text)):
+            implicated.append(filename)
+    
+    if not implicated:
+        # Nothing named in the errors: fall back to the test files themselves
+        implicated = [name for name in files if 'test' in name.lower()]
+    
+    if graph:
+        neighbors = [
+            target for name in implicated for target in graph["adjacency"].get(name, [])
+            if target not in implicated and target in files
+        ]
+        implicated += list(dict.fromkeys(neighbors))
+    
+    selected, used = [], 0
+    for filename in implicated:
+        size = len(files[filename])
+        if selected and used + size > budget:
+            continue
+        selected.append(filename)
+        used += size
+    return selected
+
+JS_EXTENSIONS = (".js", ".jsx", ".ts", ".tsx", ".mjs", ".cjs")
+SOURCE_EXTENSIONS = (".py", ".go", ".rs", ".c", ".h", ".cc", ".cpp", ".hpp", ".cxx", ".java", ".kt") + JS_EXTENSIONS
+JS_IMPORT_PATTERN = re.compile(
+    r"""(?:import\s+(?:[\w*{}\s,]+\s+from\s+)?|export\s+[\w*{}\s,]+\s+from\s+|require\(\s*|import\(\s*)['"]([^'"]+)['"]"""
+)
+GO_IMPORT_PATTERN = re.compile(r'import\s*(?:\(([^)]*)\)|(?:\w+\s+)?"([^"]+)")', re.DOTALL)
+RUST_MOD_PATTERN = re.compile(r'^\s*(?:pub(?:\([^)]*\))?\s+)?mod\s+(\w+)\s*;', re.MULTILINE)
+RUST_USE_PATTERN = re.compile(r'^\s*(?:pub(?:\([^)]*\))?\s+)?use\s+crate::(\w+)', re.MULTILINE)
+C_INCLUDE_PATTERN = re.compile(r'^\s*#\s*include\s+"([^"]+)"', re.MULTILINE)
+JVM_IMPORT_PATTERN = re.compile(r'^\s*import\s+(?:static\s+)?([\w.]+)', re.MULTILINE)
+
+def _python_module_index(files: Dict[str, str]) -> Dict[str, str]:
+    """Map dotted module names to project .py files"""
+    index = {}
+    for filename in files:
+        if not filename.endswith('.py'):
+            continue
+        parts = filename[:-3].split('/')
+        if parts[-1] == "__init__":
+            parts = parts[:-1]
+        if not parts:
+            continue
+        index[".".join(parts)] = filename
+        if parts[0] in ("src", "lib") and len(parts) > 1:
+            index.setdefault(".".join(parts[1:]), filename)
+    return index
+
+def _python_imports(filename: str, content: str, index: Dict[str, str]) -> Tuple[set, set]:
+    """Resolve a Python file's imports into (project files, external top-level packages)"""
+    try:
+        tree = ast.parse(content)
+    except SyntaxError:
+        return set(), set()
+    
+    package = filename.split('/')[:-1]
+    internal, external = set(), set()
+    
+    def resolve(dotted: str) -> Optional[str]:
+        parts = dotted.split('.')
+        for end in range(len(parts), 0, -1):
+            target = index.get(".".join(parts[:end]))
+            if target:
+                return target
+        return None
+    
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                target = resolve(alias.name)
+                if target:
+                    internal.add(target)
+                else:
+                    external.add(alias.name.split('.')[0])
+        elif isinstance(node, ast.ImportFrom):
+            base = node.module or ""
+            if node.level:
+                anchor = package[:len(package) - node.level + 1]
+                base = ".".join(anchor + ([base] if base else []))
+            resolved = {resolve(f"{base}.{alias.name}" if base else alias.name) for alias in node.names}
+            resolved.discard(None)
+            if not resolved and base:
+                target = resolve(base)
+                resolved = {target} if target else set()
+            internal |= resolved
+            if not resolved and not node.level and base:
+                external.add(base.split('.')[0])
+    
+    internal.discard(filename)
+    return internal, external
+
+def _resolve_relative(filename: str, target: str, files: Dict[str, str], suffixes: Tuple[str, ...]) -> Optional[str]:
+    base = posixpath.normpath(posixpath.join(posixpath.dirname(filename), target))
+    for suffix in suffixes:
+        if base + suffix in files:
+            return base + suffix
+    return None
+
+def _source_imports(filename: str, content: str, files: Dict[str, str], go_module: str) -> Tuple[set, set]:
+    """Resolve imports for the non-Python languages we generate"""
+    internal, external = set(), set()
+    
+    if filename.endswith(JS_EXTENSIONS):
+        suffixes = ("",) + JS_EXTENSIONS + tuple(f"/index{ext}" for ext in JS_EXTENSIONS)
+        for target in JS_IMPORT_PATTERN.findall(content):
+            if target.startswith('.'):
+                resolved = _resolve_relative(filename, target, files, suffixes)
+                if resolved:
+                    internal.add(resolved)
+            else:
+                parts = target.split('/')
+                external.add("/".join(parts[:2]) if target.startswith('@') else parts[0])
+    
+    elif filename.endswith('.go'):
+        for block, single in GO_IMPORT_PATTERN.findall(content):
+            for path in (re.findall(r'"([^"]+)"', block) if block else [single]):
+                if go_module and (path == go_module or path.startswith(go_module + "/")):
+                    package_dir = path[len(go_module):].strip('/')
+                    internal |= {
+                        name for name in files
+                        if name.endswith('.go') and posixpath.dirname(name) == package_dir
+                    }
+                elif '.' in path.split('/')[0]:
+                    external.add(path)
+    
+    elif filename.endswith('.rs'):
+        stem = posixpath.splitext(posixpath.basename(filename))[0]
+        directory = posixpath.dirname(filename)
+        module_dir = directory if stem in ("main", "lib", "mod") else posixpath.join(directory, stem)
+        for name in RUST_MOD_PATTERN.findall(content):
+            resolved = _resolve_relative(posixpath.join(module_dir, "_"), name, files, (".rs", "/mod.rs"))
+            if resolved:
+                internal.add(resolved)
+        crate_root = next((posixpath.dirname(name) for name in files if name.endswith(("main.rs", "lib.rs"))), "src")
+        for name in RUST_USE_PATTERN.findall(content):
+            resolved = _resolve_relative(posixpath.join(crate_root, "_"), name, files, (".rs", "/mod.rs"))
+            if resolved:
+                internal.add(resolved)
+    
+    elif filename.endswith(('.c', '.h', '.cc', '.cpp', '.hpp', '.cxx')):
+        for target in C_INCLUDE_PATTERN.findall(content):
+            resolved = _resolve_relative(filename, target, files, ("",))
+            resolved = resolved or next((name for name in files if name == target or name.endswith('/' + target)), None)
+            if resolved:
+                internal.add(resolved)
+    
+    elif filename.endswith(('.java', '.kt')):
+        for dotted in JVM_IMPORT_PATTERN.findall(content):
+            path = dotted.replace('.', '/')
+            resolved = next((name for name in files if name.endswith((path + ".java", path + ".kt"))), None)
+            if resolved:
+                internal.add(resolved)
+            elif not dotted.startswith(("java.", "javax.", "kotlin.")):
+                external.add(".".join(dotted.split('.')[:2]))
+    
+    internal.discard(filename)
+    return internal, external
+
+def strongly_connected_components(adjacency: Dict[str, List[str]]) -> List[List[str]]:
+    """Tarjan's algorithm, iterative so deep graphs do not hit the recursion limit"""
+    index_of, lowlink, on_stack = {}, {}, set()
+    stack, components, counter = [], [], 0
+    
+    for root in adjacency:
+        if root in index_of:
+            continue
+        index_of[root] = lowlink[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(adjacency[root]))]
+        
+        while work:
+            node, neighbors = work[-1]
+            descended = False
+            for neighbor in neighbors:
+                if neighbor not in index_of:
+                    index_of[neighbor] = lowlink[neighbor] = counter
+                    counter += 1
+                    stack.append(neighbor)
+                    on_stack.add(neighbor)
+                    work.append((neighbor, iter(adjacency.get(neighbor, []))))
+                    descended = True
+                    break
+                if neighbor in on_stack:
+                    lowlink[node] = min(lowlink[node], index_of[neighbor])
+            if descended:
+                continue
+            
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                lowlink[parent] = min(lowlink[parent], lowlink[node])
+            if lowlink[node] == index_of[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == node:
+                        break
+                components.append(sorted(component))
+    
+    return components
+
+def _resolve_imports(files: Dict[str, str], filenames: List[str], adjacency: Dict, external: Dict):
+    """Fill adjacency and external with the resolved imports of the given source files"""
+    python_index = _python_module_index(files)
+    go_module_match = re.search(r'^module\s+(\S+)', files.get("go.mod", ""), re.MULTILINE)
+    go_module = go_module_match.group(1) if go_module_match else ""
+    
+    for filename in filenames:
+        if not filename.endswith(SOURCE_EXTENSIONS):
+            continue
+        content = files[filename]
+        if filename.endswith('.py'):
+            internal, imported = _python_imports(filename, content, python_index)
+        else:
+            internal, imported = _source_imports(filename, content, files, go_module)
+        adjacency[filename] = sorted(internal)
+        external[filename] = sorted(imported)
+
+def build_import_graph(files: Dict[str, str]) -> Dict:
+    """Import/require graph over project source files with fan-in, fan-out, SCCs and cycles"""
+    adjacency, external = {}, {}
+    _resolve_imports(files, list(files), adjacency, external)
+    return _import_graph(adjacency, external)
+
+def update_import_graph(graph: Dict, files: Dict[str, str], changed: List[str]) -> Dict:
+    """Import graph after edits to `changed`, re-resolving only those files
+
+    Imports resolve against file names, so adding or removing source files (or
+    editing go.mod) rebuilds the whole graph.
+    """
+    sources = {filename for filename in files if filename.endswith(SOURCE_EXTENSIONS)}
+    if sources != set(graph["adjacency"]) or "go.mod" in changed:
+        return build_import_graph(files)
+    adjacency, external = dict(graph["adjacency"]), dict(graph["external"])
+    _resolve_imports(files, changed, adjacency, external)
+    return _import_graph(adjacency, external)
+
+def _import_graph(adjacency: Dict[str, List[str]], external: Dict[str, List[str]]) -> Dict:
+    """Derive reverse edges, fan-in/out, SCCs and cycles from resolved imports"""
+    reverse = {node: [] for node in adjacency}
+    for node, targets in adjacency.items():
+        for target in targets:
+            reverse.setdefault(target, []).append(node)
+    
+    components = strongly_connected_components(adjacency)
+    cycles = [c for c in components if len(c) > 1 or c[0] in adjacency.get(c[0], [])]
+    
+    return {
+        "adjacency": adjacency,
+        "reverse": reverse,
+        "external": external,
+        "fan_in": {node: len(reverse.get(node, [])) for node in adjacency},
+        "fan_out": {node: len(targets) for node, targets in adjacency.items()},
+        "components": components,
+        "cycles": cycles
+    }
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def _cached_import_graph(content_hash: str, _files: Dict[str, str]) -> Dict:
+    return build_import_graph(_files)
+
+def get_import_graph(project_data: Dict) -> Dict:
+    """Import graph for the current project revision, built on first use and cached by content hash"""
+    return _cached_import_graph(project_content_hash(project_data['files']), project_data['files'])
+
+def import_graph_figure(graph: Dict) -> go.Figure:
+    """Plotly network of the import graph; files in the same directory sit together on a circle"""
+    nodes = sorted(graph["adjacency"], key=lambda name: (posixpath.dirname(name), name))
+    positions = {
+        node: (math.cos(2 * math.pi * i / len(nodes)), math.sin(2 * math.pi * i / len(nodes)))
+        for i, node in enumerate(nodes)
+    }
+    in_cycle = {node for cycle in graph["cycles"] for node in cycle}
+    
+    edge_x, edge_y = [], []
+    for node, targets in graph["adjacency"].items():
+        for target in targets:
+            edge_x += [positions[node][0], positions[target][0], None]
+            edge_y += [positions[node][1], positions[target][1], None]
+    
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=edge_x, y=edge_y, mode='lines', line=dict(width=1, color='#00d4ff'), hoverinfo='none'))
+    fig.add_trace(go.Scatter(
+        x=[positions[node][0] for node in nodes],
+        y=[positions[node][1] for node in nodes],
+        mode='markers+text',
+        text=[posixpath.basename(node) for node in nodes],
+        textposition='top center',
+        hovertext=[f"{node}<br>fan-in {graph['fan_in'][node]} • fan-out {graph['fan_out'][node]}" for node in nodes],
+        hoverinfo='text',
+        marker=dict(
+            size=[10 + 4 * graph['fan_in'][node] for node in nodes],
+            color=['#ff4444' if node in in_cycle else '#00ff88' for node in nodes],
+            line=dict(width=1, color='#ffffff')
+        )
+    ))
+    fig.update_layout(
+        title="Module Import Graph (red = import cycle)",
+        showlegend=False,
+        xaxis=dict(visible=False),
+        yaxis=dict(visible=False),
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font_color='white',
+        height=600
+    )
+    return fig
+
+# Test-impact selection: narrow re-runs to the tests that import what changed
+TEST_FILE_PATTERN = re.compile(
+    r'(^|/)(tests?|__tests__|spec)/|(^|/)test_[^/]*\.py$|_test\.(py|go)$|\.(test|spec)\.[jt]sx?$|Tests?\.(java|kt)$'
+)
+# Changes to these can affect any test, so they force a full run
+TEST_GLOBAL_FILES = re.compile(
+    r'(^|/)(conftest\.py|pytest\.ini|tox\.ini|setup\.(py|cfg)|pyproject\.toml|requirements[^/]*\.txt|package(-lock)?\.json|'
+    r'tsconfig[^/]*\.json|(jest|vitest|babel)\.config\.[^/]+|go\.(mod|sum)|Cargo\.(toml|lock)|\.env[^/]*)$'
+)
+
+def is_test_file(filename: str) -> bool:
+    return bool(TEST_FILE_PATTERN.search(filename))
+
+def impacted_files(graph: Dict, changed: List[str]) -> set:
+    """Changed files plus everything that transitively imports them"""
+    impacted, stack = set(), list(changed)
+    while stack:
+        node = stack.pop()
+        if node in impacted:
+            continue
+        impacted.add(node)
+        stack.extend(graph["reverse"].get(node, []))
+    return impacted
+
+def _scope_test_command(cmd: str, files: Dict[str, str], tests: List[str], impacted: set) -> Optional[str]:
+    """Rewrite one test command to run only the impacted tests, or None when it cannot be narrowed"""
+    try:
+        tokens = shlex.split(cmd)
+    except ValueError:
+        return None
+    
+    def under(path, scopes):
+        return not scopes or any(path == scope or path.startswith(scope + '/') for scope in scopes)
+    
+    def project_path(token):
+        """Normalized project-relative path a token names, or None when it is not a path in the project"""
+        path = posixpath.normpath(token.split('::')[0])
+        if path == '.':
+            return ''
+        path = path.lstrip('/')
+        return path if path in files or any(name.startswith(path + '/') for name in files) else None
+    
+    if tokens[:1] == ["pytest"] or tokens[1:3] == ["-m", "pytest"]:
+        runner_length = 1 if tokens[0] == "pytest" else 3
+        arguments = tokens[runner_length:]
+        # Option values (-k expr, -m marker) stay attached to their flag
+        options, scopes, index = [], [], 0
+        while index < len(arguments):
+            token = arguments[index]
+            if token in ("-k", "-m", "-c", "-p", "--rootdir", "--deselect", "--ignore") and index + 1 < len(arguments):
+                options += arguments[index:index + 2]
+                index += 2
+                continue
+            path = None if token.startswith('-') else project_path(token)
+            if path is not None:
+                if path:
+                    scopes.append(path)
+            else:
+                options.append(token)
+            index += 1
+        selected = [test for test in tests if test.endswith('.py') and under(test, scopes)]
+        return shlex.join(tokens[:runner_length] + options + selected) if selected else None
+    
+    if any(token in ("jest", "vitest") for token in tokens[:3]):
+        selected = [test for test in tests if test.endswith(('.js', '.jsx', '.ts', '.tsx'))]
+        return shlex.join(tokens + selected) if selected else None
+    
+    if tokens[:2] == ["go", "test"]:
+        packages = sorted({posixpath.dirname(name) for name in impacted if name.endswith('.go')})
+        options = [token for token in tokens[2:] if token.startswith('-')]
+        return shlex.join(tokens[:2] + options + [f"./{package}" if package else "." for package in packages]) if packages else None
+    
+    return None
+
+def select_impacted_tests(files: Dict[str, str], changed: List[str], commands: List[str],
+                          graph: Optional[Dict] = None) -> Dict[str, str]:
+    """Map each narrowed test command to the original command it stands in for
+
+    Commands that cannot be narrowed (unknown runner, global config changed, or
+    no impacted test in scope) map to themselves, i.e. run in full.
+    """
+    if any(TEST_GLOBAL_FILES.search(name) for name in changed):
+        return {cmd: cmd for cmd in commands}
+    
+    graph = graph or build_import_graph(files)
+    impacted = impacted_files(graph, [name for name in changed if name in graph["adjacency"]])
+    impacted |= set(changed)
+    tests = sorted(name for name in impacted if is_test_file(name))
+    
+    selection = {}
+    for cmd in commands:
+        scoped = _scope_test_command(cmd, files, tests, impacted)
+        selection[scoped or cmd] = cmd
+    return selection
+
+# Line comment prefixes by file extension
+COMMENT_PREFIXES = {
+    "py": ("#",), "sh": ("#",), "rb": ("#",), "yml": ("#",), "yaml": ("#",), "toml": ("#",),
+    "js": ("//",), "jsx": ("//",), "ts": ("//",), "tsx": ("//",), "go": ("//",), "rs": ("//",),
+    "java": ("//",), "kt": ("//",), "c": ("//",), "h": ("//",), "cpp": ("//",), "hpp": ("//",),
+    "cc": ("//",), "cs": ("//",), "swift": ("//",), "php": ("//", "#"), "sql": ("--",)
+}
+BLOCK_COMMENT_EXTENSIONS = {"js", "jsx", "ts", "tsx", "go", "rs", "java", "kt", "c", "h", "cpp", "hpp", "cc", "cs", "swift", "php", "css"}
+BRANCH_PATTERN = re.compile(r'\b(?:if|for|while|case|catch|elif|except)\b|&&|\|\||\?(?=[^?.:])')
+FUNCTION_PATTERN = re.compile(r'\b(?:def|fn|func|function)\b|=>')
+NESTING_NODES = (ast.If, ast.For, ast.AsyncFor, ast.While, ast.With, ast.AsyncWith, ast.Try,
+                 ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Match)
+
+def _python_structure(tree: ast.AST) -> Tuple[int, int, int]:
+    """Return (function count, cyclomatic complexity, max nesting depth) for a parsed module"""
+    functions = 0
+    complexity = 1
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda)):
+            functions += 1
+        elif isinstance(node, (ast.If, ast.For, ast.AsyncFor, ast.While, ast.IfExp, ast.ExceptHandler, ast.Assert, ast.match_case)):
+            complexity += 1
+        elif isinstance(node, ast.BoolOp):
+            complexity += len(node.values) - 1
+        elif isinstance(node, ast.comprehension):
+            complexity += 1 + len(node.ifs)
+    
+    max_nesting = 0
+    stack = [(node, 1) for node in ast.iter_child_nodes(tree)]
+    while stack:
+        node, depth = stack.pop()
+        nested = isinstance(node, NESTING_NODES)
+        if nested:
+            max_nesting = max(max_nesting, depth)
+        for child in ast.iter_child_nodes(node):
+            stack.append((child, depth + 1 if nested else depth))
+    
+    return functions, complexity, max_nesting
+
+def compute_file_metrics(filename: str, content: str) -> Dict:
+    """LOC, SLOC, comment ratio, function count, cyclomatic complexity and max nesting for one file"""
+    ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    prefixes = COMMENT_PREFIXES.get(ext, ())
+    block_comments = ext in BLOCK_COMMENT_EXTENSIONS
+    
+    sloc = comments = 0
+    in_block = False
+    for line in content.splitlines():
+        stripped = line.strip()
+        if not stripped:
+            continue
+        if in_block:
+            comments += 1
+            in_block = "*/" not in stripped
+        elif block_comments and stripped.startswith("/*"):
+            comments += 1
+            in_block = "*/" not in stripped[2:]
+        elif prefixes and stripped.startswith(prefixes):
+            comments += 1
+        else:
+            sloc += 1
+    
+    functions = complexity = max_nesting = 0
+    if ext == "py":
+        try:
+            functions, complexity, max_nesting = _python_structure(ast.parse(content))
+        except SyntaxError:
+            pass
+    elif prefixes:
+        functions = len(FUNCTION_PATTERN.findall(content))
+        complexity = 1 + len(BRANCH_PATTERN.findall(content))
+        depth = 0
+        for char in re.sub(r'"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'', '', content):
+            if char == '{':
+                depth += 1
+                max_nesting = max(max_nesting, depth)
+            elif char == '}':
+                depth = max(depth - 1, 0)
+    
+    return {
+        "file": filename,
+        "loc": content.count('\n') + 1 if content else 0,
+        "sloc": sloc,
+        "comment_lines": comments,
+        "comment_ratio": round(comments / (sloc + comments), 3) if sloc + comments else 0.0,
+        "functions": functions,
+        "complexity": complexity,
+        "max_nesting": max_nesting
+    }
+
+class MetricsEngine:
+    """Per-file code metrics computed once per content hash and shared across sessions
+
+    Changing a few files (debug fixes, refactors) only recomputes those files.
+    Project aggregates are memoized by content hash, and the hash itself is
+    remembered per files dict, so reruns on an unchanged project do no work.
+    Files dicts are treated as immutable, as ProjectStore hands them out.
+    """
+
+    def __init__(self, max_entries: int = 50000, max_projects: int = 64):
+        self.max_entries = max_entries
+        self.max_projects = max_projects
+        self._cache = OrderedDict()
+        self._projects = OrderedDict()
+        self._digests = OrderedDict()
+        self._lock = threading.Lock()
+
+    def file_metrics(self, filename: str, content: str) -> Dict:
+        key = (filename, hashlib.sha1(content.encode('utf-8')).hexdigest())
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return cached
+        
+        metrics = compute_file_metrics(filename, content)
+        with self._lock:
+            self._cache[key] = metrics
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return metrics
+
+    def _digest(self, files: Dict[str, str]) -> str:
+        with self._lock:
+            entry = self._digests.get(id(files))
+            if entry and entry[0] is files:
+                self._digests.move_to_end(id(files))
+                return entry[1]
+        
+        digest = project_content_hash(files)
+        with self._lock:
+            # Holding the dict keeps its id from being reused while the entry lives
+            self._digests[id(files)] = (files, digest)
+            while len(self._digests) > self.max_projects:
+                self._digests.popitem(last=False)
+        return digest
+
+    def project_metrics(self, project_data: Dict) -> Dict:
+        """Aggregate per-file metrics for a project, memoized on its content hash"""
+        key = (self._digest(project_data['files']), len(project_data.get('dependencies', [])))
+        with self._lock:
+            cached = self._projects.get(key)
+            if cached is not None:
+                self._projects.move_to_end(key)
+                return cached
+        
+        metrics = self._aggregate(project_data)
+        with self._lock:
+            self._projects[key] = metrics
+            while len(self._projects) > self.max_projects:
+                self._projects.popitem(last=False)
+        return metrics
+
+    def _aggregate(self, project_data: Dict) -> Dict:
+        per_file = [self.file_metrics(filename, content) for filename, content in project_data['files'].items()]
+        total_files = len(per_file)
+        total_lines = sum(m["loc"] for m in per_file)
+        sloc = sum(m["sloc"] for m in per_file)
+        comment_lines = sum(m["comment_lines"] for m in per_file)
+        functions = sum(m["functions"] for m in per_file)
+        
+        return {
+            "total_files": total_files,
+            "total_lines": total_lines,
+            "avg_lines_per_file": round(total_lines / total_files) if total_files else 0,
+            "dependencies": len(project_data.get('dependencies', [])),
+            "sloc": sloc,
+            "comment_ratio": round(comment_lines / (sloc + comment_lines), 3) if sloc + comment_lines else 0.0,
+            "functions": functions,
+            "complexity": sum(m["complexity"] for m in per_file),
+            "avg_complexity": round(sum(m["complexity"] for m in per_file) / max(functions, 1), 1),
+            "max_nesting": max((m["max_nesting"] for m in per_file), default=0),
+            "per_file": per_file
+        }
+
+@st.cache_resource
+def get_metrics_engine() -> MetricsEngine:
+    """Process-wide metrics engine"""
+    return MetricsEngine()
+
+def health_score(metrics: Dict, test_results: Optional[Dict], security_report: Optional[Dict]) -> int:
+    """0-100 project health derived from code metrics, test and scan results"""
+    score = 100
+    score -= min(20, max(0, metrics["avg_complexity"] - 5) * 2)
+    score -= min(10, max(0, metrics["max_nesting"] - 4) * 2)
+    score -= 10 if metrics["comment_ratio"] < 0.05 else 0
+    if test_results is not None:
+        score -= 0 if test_results["success"] else 25
+    if security_report and security_report.get("success"):
+        counts = security_report.get("counts", {})
+        score -= min(30, counts.get("Critical", 0) * 10 + counts.get("High", 0) * 5 + counts.get("Medium", 0) * 2)
+    return max(0, round(score))
+
+def security_rating(security_report: Optional[Dict]) -> Optional[str]:
+    """Letter grade from the last successful scan's severity counts; None before any scan"""
+    if not (security_report and security_report.get("success")):
+        return None
+    counts = security_report.get("counts", {})
+    if counts.get("Critical", 0):
+        return "F"
+    if counts.get("High", 0):
+        return "D"
+    if counts.get("Medium", 0) > 2:
+        return "C"
+    if counts.get("Medium", 0):
+        return "B"
+    return "A"
+
+# Approximate prompt budget per security scan chunk (1 token ~ 4 characters)
+SCAN_CHUNK_TOKENS = 12000
+SCAN_CONCURRENCY = 4
+SEVERITY_ORDER = ["Critical", "High", "Medium", "Low", "Info"]
+SCAN_SKIP_FILES = ("package-lock.json", "yarn.lock", "pnpm-lock.yaml", "Cargo.lock", "poetry.lock", "go.sum")
+# Prose-only files get the local secret check but are never sent to the model
+SCAN_LOCAL_ONLY = (".md", ".txt", ".rst", ".gitignore", ".dockerignore", "LICENSE")
+
+LOCAL_FIX_SUGGESTIONS = {
+    "CWE-95": "Avoid eval/exec; parse input explicitly (e.g. ast.literal_eval or json.loads)",
+    "CWE-78": "Pass an argument list without shell=True and validate all inputs",
+    "CWE-502": "Use a safe format such as JSON, or yaml.safe_load",
+    "CWE-798": "Load secrets from environment variables or a secret manager"
+}
+
+def chunk_files_for_scan(files: Dict[str, str], token_budget: int = SCAN_CHUNK_TOKENS) -> List[List[Tuple[str, str, int]]]:
+    """Pack line-numbered file segments into chunks of roughly token_budget tokens
+
+    Each segment is (filename, numbered_text, first_line); files larger than the
+    budget are split across several chunks on line boundaries.
+    """
+    char_budget = token_budget * 4
+    chunks, current, used = [], [], 0
+    
+    for filename, content in files.items():
+        lines = content.splitlines()
+        start = 0
+        while start < len(lines) or (start == 0 and not lines):
+            segment, size = [], 0
+            for number in range(start, len(lines)):
+                numbered = f"{number + 1}: {lines[number]}"
+                if segment and size + len(numbered) + 1 > char_budget:
+                    break
+                segment.append(numbered)
+                size += len(numbered) + 1
+            
+            if current and used + size > char_budget:
+                chunks.append(current)
+                current, used = [], 0
+            current.append((filename, "\n".join(segment), start + 1))
+            used += size
+            start += max(len(segment), 1)
+    
+    if current:
+        chunks.append(current)
+    return chunks
+
+def match_finding_file(path: str, filenames) -> Optional[str]:
+    """Map a model-reported path (e.g. './src/app.py' or an absolute path) to one of the scanned filenames"""
+    normalized = posixpath.normpath(str(path or "").replace('\\', '/').strip()).lstrip('/')
+    if normalized in filenames:
+        return normalized
+    matches = [
+        filename for filename in filenames
+        if normalized.endswith('/' + filename) or filename.endswith('/' + normalized)
+    ]
+    return matches[0] if len(matches) == 1 else None
+
+def merge_findings(findings: List[Dict]) -> List[Dict]:
+    """Deduplicate findings and sort them by severity, file and line"""
+    merged = {}
+    for finding in findings:
+        severity = str(finding.get("severity", "Info")).capitalize()
+        normalized = {
+            "file": finding.get("file", ""),
+            "line": finding.get("line") or 0,
+            "cwe": finding.get("cwe", ""),
+            "severity": severity if severity in SEVERITY_ORDER else "Info",
+            "issue": finding.get("issue", ""),
+            "fix": finding.get("fix", "")
+        }
+        merged.setdefault((normalized["file"], normalized["line"], normalized["cwe"]), normalized)
+    
+    return sorted(
+        merged.values(),
+        key=lambda f: (SEVERITY_ORDER.index(f["severity"]), f["file"], f["line"] if isinstance(f["line"], int) else 0)
+    )
+
+# Distribution names whose import name differs
+PACKAGE_IMPORT_NAMES = {
+    "pyyaml": "yaml", "beautifulsoup4": "bs4", "scikit_learn": "sklearn", "pillow": "PIL",
+    "python_dotenv": "dotenv", "opencv_python": "cv2", "psycopg2_binary": "psycopg2",
+    "python_jose": "jose", "pyjwt": "jwt", "google_generativeai": "google", "protobuf": "google",
+    "python_multipart": "multipart", "attrs": "attr", "pymysql": "pymysql", "msgpack_python": "msgpack"
+}
+
+SECRET_NAME_PATTERN = re.compile(r'(?i)(password|passwd|secret|api_?key|token|private_?key|access_?key)')
+SECRET_PLACEHOLDER_PATTERN = re.compile(r'(?i)(example|changeme|change_me|your|xxx|dummy|placeholder|<|\$\{|test)')
+SECRET_VALUE_PATTERNS = [
+    (re.compile(r'AKIA[0-9A-Z]{16}'), "AWS access key"),
+    (re.compile(r'-----BEGIN (?:RSA |EC |OPENSSH )?PRIVATE KEY-----'), "private key"),
+    (re.compile(r'gh[pousr]_[A-Za-z0-9]{36}'), "GitHub token"),
+    (re.compile(r'AIza[0-9A-Za-z_\-]{35}'), "Google API key"),
+    (re.compile(r'sk-[A-Za-z0-9]{32,}'), "API secret key")
+]
+
+# Standard library modules that do something visible when imported
+STDLIB_IMPORT_SIDE_EFFECTS = {"this", "antigravity", "__hello__", "__phello__", "idlelib", "turtle", "turtledemo", "tkinter"}
+MODULE_DUNDERS = {"__file__", "__name__", "__doc__", "__spec__", "__loader__", "__package__", "__path__", "__builtins__", "__annotations__"}
+
+def _declared_import_names(project_data: Dict) -> set:
+    """Top-level import names for the project's declared dependencies"""
+    declared = list(project_data.get('dependencies', []))
+    for filename, content in project_data['files'].items():
+        if os.path.basename(filename).startswith('requirements') and filename.endswith('.txt'):
+            declared.extend(line for line in content.splitlines() if line.strip() and not line.startswith(('#', '-')))
+    
+    names = set()
+    for dep in declared:
+        dist = re.split(r'[<>=!~;\[ ]', str(dep).strip(), 1)[0].lower().replace('-', '_').replace('.', '_')
+        if dist:
+            names.add(PACKAGE_IMPORT_NAMES.get(dist, dist))
+    return names
+
+def _local_module_names(files: Dict[str, str]) -> set:
+    """Top-level module and package names provided by the project itself"""
+    names = set()
+    for filename in files:
+        if not filename.endswith('.py'):
+            continue
+        parts = filename.split('/')
+        names.add(parts[0][:-3] if len(parts) == 1 else parts[0])
+        if parts[0] in ('src', 'lib') and len(parts) > 1:
+            names.add(parts[1][:-3] if len(parts) == 2 else parts[1])
+    return names
+
+def _dangerous_call(node: ast.Call) -> Optional[Tuple[str, str, str]]:
+    """Return (message, cwe, severity) for risky calls"""
+    func = node.func
+    name = func.id if isinstance(func, ast.Name) else None
+    dotted = f"{func.value.id}.{func.attr}" if isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name) else None
+    shell_true = any(kw.arg == "shell" and isinstance(kw.value, ast.Constant) and kw.value.value is True for kw in node.keywords)
+    
+    if name in ("eval", "exec"):
+        return f"Use of {name}() on dynamic input", "CWE-95", "High"
+    if dotted in ("os.system", "os.popen"):
+        return f"{dotted}() runs a shell command", "CWE-78", "High"
+    if dotted and dotted.startswith("subprocess.") and shell_true:
+        return f"{dotted}() with shell=True", "CWE-78", "High"
+    if dotted in ("pickle.loads", "pickle.load", "marshal.loads", "marshal.load"):
+        return f"{dotted}() deserializes untrusted data", "CWE-502", "High"
+    if dotted == "yaml.load" and not any(kw.arg == "Loader" for kw in node.keywords) and len(node.args) < 2:
+        return "yaml.load() without an explicit safe Loader", "CWE-502", "Medium"
+    return None
+
+def analyze_python_file(filename: str, content: str, known_modules: set) -> List[Dict]:
+    """Fast local checks: syntax errors, undefined names, undeclared imports, risky calls, hardcoded secrets"""
+    def finding(kind, line, message, severity="Medium", cwe=""):
+        return {"file": filename, "line": line, "kind": kind, "severity": severity, "cwe": cwe, "message": message}
+    
+    try:
+        tree = ast.parse(content)
+    except SyntaxError as e:
+        return [finding("syntax_error", e.lineno or 0, f"SyntaxError: {e.msg}", "High")]
+    
+    findings = []
+    bound = set(MODULE_DUNDERS)
+    loads = []
+    imported = []
+    star_import = False
+    
+    # With postponed evaluation, annotations are never executed, so names only they use are not undefined
+    annotation_names = set()
+    if any(isinstance(node, ast.ImportFrom) and node.module == "__future__"
+           and any(alias.name == "annotations" for alias in node.names) for node in tree.body):
+        for node in ast.walk(tree):
+            annotations = []
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                annotations.append(node.returns)
+            elif isinstance(node, ast.arg):
+                annotations.append(node.annotation)
+            elif isinstance(node, ast.AnnAssign):
+                annotations.append(node.annotation)
+            for annotation in filter(None, annotations):
+                annotation_names.update(id(name) for name in ast.walk(annotation) if isinstance(name, ast.Name))
+    
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            if isinstance(node.ctx, ast.Load):
+                if id(node) not in annotation_names:
+                    loads.append(node)
+            else:
+                bound.add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            bound.add(node.name)
+        elif isinstance(node, ast.arg):
+            bound.add(node.arg)
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            bound.update(node.names)
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            bound.add(node.name)
+        elif isinstance(node, (ast.MatchAs, ast.MatchStar)) and node.name:
+            bound.add(node.name)
+        elif isinstance(node, ast.MatchMapping) and node.rest:
+            bound.add(node.rest)
+        elif isinstance(node, ast.Import):
+            for alias in node.names:
+                bound.add(alias.asname or alias.name.split('.')[0])
+                imported.append((alias.name.split('.')[0], node.lineno))
+        elif isinstance(node, ast.ImportFrom):
+            for alias in node.names:
+                if alias.name == "*":
+                    star_import = True
+                else:
+                    bound.add(alias.asname or alias.name)
+            if not node.level and node.module:
+                imported.append((node.module.split('.')[0], node.lineno))
+        elif isinstance(node, ast.Call):
+            danger = _dangerous_call(node)
+            if danger:
+                findings.append(finding("dangerous_call", node.lineno, danger[0], danger[2], danger[1]))
+        
+        if isinstance(node, (ast.Assign, ast.AnnAssign)) and isinstance(node.value, ast.Constant) and isinstance(node.value.value, str):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            for target in targets:
+                target_name = target.id if isinstance(target, ast.Name) else getattr(target, "attr", "")
+                value = node.value.value
+                if (SECRET_NAME_PATTERN.search(target_name) and len(value) >= 8
+                        and not SECRET_PLACEHOLDER_PATTERN.search(value)):
+                    findings.append(finding(
+                        "hardcoded_secret", node.lineno, f"Hardcoded secret assigned to '{target_name}'", "High", "CWE-798"
+                    ))
+    
+    for module, line in imported:
+        if module not in sys.stdlib_module_names and module not in known_modules and module != "__future__":
+            findings.append(finding(
+                "missing_import", line,
+                f"Import '{module}' is not a standard library, project or declared dependency module"
+            ))
+    
+    if not star_import:
+        builtin_names = set(dir(builtins))
+        reported = set()
+        for node in loads:
+            if node.id not in bound and node.id not in builtin_names and node.id not in reported:
+                reported.add(node.id)
+                findings.append(finding("undefined_name", node.lineno, f"Undefined name '{node.id}'", "High"))
+    
+    return findings
+
+def scan_secret_patterns(filename: str, content: str) -> List[Dict]:
+    """Language-agnostic search for well-known credential formats"""
+    findings = []
+    for pattern, label in SECRET_VALUE_PATTERNS:
+        for match in pattern.finditer(content):
+            findings.append({
+                "file": filename,
+                "line": content.count('\n', 0, match.start()) + 1,
+                "kind": "hardcoded_secret",
+                "severity": "Critical",
+                "cwe": "CWE-798",
+                "message": f"Hardcoded {label}"
+            })
+    return findings
+
+def analyze_project(project_data: Dict) -> List[Dict]:
+    """Run the local static analysis over every file of a generated project"""
+    known_modules = _declared_import_names(project_data) | _local_module_names(project_data['files'])
+    findings = []
+    for filename, content in project_data['files'].items():
+        if filename.endswith('.py'):
+            findings.extend(analyze_python_file(filename, content, known_modules))
+        findings.extend(scan_secret_patterns(filename, content))
+    return findings
+
+def format_static_hints(findings: List[Dict], limit: int = 40) -> str:
+    """Compact one-line-per-finding summary for inclusion in prompts"""
+    lines = [f"{f['file']}:{f['line']} [{f['kind']}] {f['message']}" for f in findings[:limit]]
+    if len(findings) > limit:
+        lines.append(f"... and {len(findings) - limit} more")
+    return "\n".join(lines) if lines else "none"
+
+def _stdlib_provides(module: str, attributes: set) -> bool:
+    """Whether a standard library module can be imported here and defines all the attributes"""
+    if module in STDLIB_IMPORT_SIDE_EFFECTS:
+        return False
+    try:
+        loaded = importlib.import_module(module)
+    except Exception:
+        return False
+    return all(hasattr(loaded, attribute) for attribute in attributes)
+
+def quick_fix_python(content: str, findings: List[Dict]) -> Optional[str]:
+    """Fix trivial problems locally: add imports for undefined standard library module names
+
+    A name is only imported when every use of it is an attribute access the module
+    provides (json.loads); anything else is more likely a typo and is left to the model.
+    """
+    undefined = {
+        re.search(r"'(\w+)'", f["message"]).group(1) for f in findings if f["kind"] == "undefined_name"
+    } & set(sys.stdlib_module_names)
+    if not undefined:
+        return None
+    
+    tree = ast.parse(content)
+    attributes = {
+        id(node.value): node.attr for node in ast.walk(tree)
+        if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name)
+    }
+    uses = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and node.id in undefined and isinstance(node.ctx, ast.Load):
+            uses.setdefault(node.id, []).append(attributes.get(id(node)))
+    missing = sorted(
+        name for name, used in uses.items() if all(used) and _stdlib_provides(name, set(used))
+    )
+    if not missing:
+        return None
+    
+    insert_at = 0
+    for node in tree.body:
+        is_docstring = isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant) and isinstance(node.value.value, str)
+        is_future = isinstance(node, ast.ImportFrom) and node.module == "__future__"
+        if (is_docstring and insert_at == 0) or is_future:
+            insert_at = node.end_lineno
+        else:
+            break
+    
+    lines = content.splitlines(keepends=True)
+    imports = "".join(f"import {name}\n" for name in missing)
+    return "".join(lines[:insert_at]) + imports + "".join(lines[insert_at:])
+
+# Project context reuse: one compact representation per revision, long prefixes registered with Gemini context caching
+CONTEXT_REVISIONS = 32
+CONTEXT_CACHE_MIN_TOKENS = 4096
+CONTEXT_CACHE_TTL = 3600
+# Send a delta against the cached snapshot while it stays under this fraction of the full context
+CONTEXT_DELTA_RATIO = 0.25
+
+class ProjectContext:
+    """Compact, minified view of one project revision, built once and shared across operations"""
+
+    def __init__(self, project: Dict):
+        self.project = project.get('project_name', 'project')
+        self.files = dict(project['files'])
+        self.revision = project_content_hash(self.files)[:16]
+        self.overview = (
+            f"Project: {self.project}\n"
+            f"Description: {project.get('description', '')}\n"
+            f"Dependencies: {json.dumps(project.get('dependencies', []))}\n"
+            f"Build Commands: {json.dumps(project.get('build_commands', []))}\n"
+            f"Run Commands: {json.dumps(project.get('run_commands', []))}\n"
+            f"Test Commands: {json.dumps(project.get('test_commands', []))}\n"
+            f"Files and symbols:\n{format_symbol_index(dict(sorted(self.files.items())))}\n"
+        )
+        self.full = (
+            f"{self.overview}\n"
+            f"Project files as minified JSON:\n{json.dumps(self.files, separators=(',', ':'), sort_keys=True)}\n"
+        )
+
+    def delta(self, base_files: Dict[str, str]) -> str:
+        """Describe how this revision differs from an earlier snapshot of the same project"""
+        changed = {name: content for name, content in self.files.items() if base_files.get(name) != content}
+        deleted = sorted(set(base_files) - set(self.files))
+        if not changed and not deleted:
+            return ""
+        return (
+            "The project has changed since the snapshot above. Current versions of changed files and deleted paths:\n"
+            f"{json.dumps({'changed': changed, 'deleted': deleted}, separators=(',', ':'), sort_keys=True)}\n"
+        )
+
+# Errors meaning a cached-content handle is no longer usable (expired, deleted or not ours)
+CONTEXT_CACHE_GONE_ERRORS = {"NotFound", "PermissionDenied", "FailedPrecondition"}
+
+def context_cache_gone(error: Exception) -> bool:
+    return (
+        type(error).__name__ in CONTEXT_CACHE_GONE_ERRORS
+        or getattr(error, "code", None) in (403, 404)
+        or "cachedcontent" in str(error).lower().replace(" ", "").replace("_", "")
+    )
+
+class ProjectContextManager:
+    """LRU of ProjectContext per revision plus remote context-cache handles per (model, revision)"""
+
+    def __init__(self, max_revisions: int = CONTEXT_REVISIONS):
+        self.max_revisions = max_revisions
+        self.lock = threading.Lock()
+        self.contexts = OrderedDict()
+        self.remote = {}
+        self._create_locks = {}
+
+    def context(self, project: Dict) -> ProjectContext:
+        """Context for the project's current revision, built on first use"""
+        revision = project_content_hash(project['files'])[:16]
+        with self.lock:
+            if revision in self.contexts:
+                self.contexts.move_to_end(revision)
+                return self.contexts[revision]
+        
+        context = ProjectContext(project)
+        with self.lock:
+            self.contexts[revision] = context
+            while len(self.contexts) > self.max_revisions:
+                self.contexts.popitem(last=False)
+        return context
+
+    def _reusable(self, model_name: str, context: ProjectContext) -> Optional[Tuple[Optional[object], str]]:
+        """Live entry for this revision, or the snapshot with the smallest acceptable delta (caller holds lock)"""
+        now = time.time()
+        for key in [key for key, entry in self.remote.items() if entry["expires"] <= now + 60]:
+            del self.remote[key]
+        
+        entry = self.remote.get((model_name, context.revision))
+        if entry:
+            return entry["handle"], ""
+        
+        best = None
+        for (entry_model, _), entry in self.remote.items():
+            if entry_model != model_name or entry["handle"] is None:
+                continue
+            delta = context.delta(entry["files"])
+            if len(delta) <= CONTEXT_DELTA_RATIO * len(context.full) and (best is None or len(delta) < len(best[1])):
+                best = (entry["handle"], delta)
+        return best
+
+    def remote_prefix(self, model_name: str, context: ProjectContext, create) -> Tuple[Optional[object], str]:
+        """Cached-content handle holding this project's context, and the delta to send alongside it
+
+        `create(text)` registers a new cached prefix and returns its handle. Handles
+        are keyed by revision; a snapshot of another revision is reused while the
+        delta against it stays small. Contexts too short for context caching, or
+        models that reject it, get (None, "") and the caller sends the full prompt.
+        Only one create runs per (model, revision), outside the manager-wide lock.
+        """
+        if len(context.full) // 4 < CONTEXT_CACHE_MIN_TOKENS:
+            return None, ""
+        
+        key = (model_name, context.revision)
+        with self.lock:
+            reusable = self._reusable(model_name, context)
+            if reusable is not None:
+                return reusable
+            create_lock = self._create_locks.setdefault(key, threading.Lock())
+        
+        with create_lock:
+            with self.lock:
+                entry = self.remote.get(key)
+                if entry:
+                    return entry["handle"], ""
+            
+            try:
+                handle = create(context.full)
+            except Exception:
+                handle = None
+            
+            with self.lock:
+                self.remote[key] = {
+                    "handle": handle,
+                    "files": context.files,
+                    "expires": time.time() + (CONTEXT_CACHE_TTL if handle else 600)
+                }
+                self._create_locks.pop(key, None)
+        return handle, ""
+
+    def invalidate(self, handle: object):
+        """Forget a handle the service no longer knows (expired or deleted) so the next call recreates it"""
+        with self.lock:
+            for key in [key for key, entry in self.remote.items() if entry["handle"] is handle]:
+                del self.remote[key]
+
+@st.cache_resource
+def get_context_manager() -> ProjectContextManager:
+    """Process-wide project context manager"""
+    return ProjectContextManager()
+
+class CodeOracle:
+    def __init__(self, api_key: str, cache: Optional[ResponseCache] = None, telemetry: Optional[LLMTelemetry] = None,
+                 governor: Optional[RequestGovernor] = None, contexts: Optional[ProjectContextManager] = None):
+        self.api_key = api_key
+        genai.configure(api_key=api_key)
+        self.models = {}
+        self.cache = cache
+        self.telemetry = telemetry or LLMTelemetry()
+        self.governor = governor or RequestGovernor(os.path.join(CACHE_DIR, "governor.sqlite"))
+        self.router = ModelRouter(self.telemetry)
+        self.contexts = contexts or ProjectContextManager()
+        self.use_cache = True
+        self.projects = {}
+    
+    def model_for(self, model_name: str):
+        """GenerativeModel client per model name, created on first use"""
+        if model_name not in self.models:
+            self.models[model_name] = genai.GenerativeModel(model_name)
+        return self.models[model_name]
+    
+    def _cached_context_model(self, model_name: str, context: ProjectContext) -> Tuple[Optional[object], str, object]:
+        """Model bound to a Gemini cached-content prefix for the project context, the delta to send, and the handle"""
+        if genai_caching is None:
+            return None, "", None
+        
+        def create(text):
+            return genai_caching.CachedContent.create(
+                model=f"models/{model_name}",
+                display_name=f"{context.project}-{context.revision}"[:128],
+                contents=[text],
+                ttl=timedelta(seconds=CONTEXT_CACHE_TTL)
+            )
+        
+        handle, delta = self.contexts.remote_prefix(model_name, context, create)
+        if handle is None:
+            return None, "", None
+        return genai.GenerativeModel.from_cached_content(cached_content=handle), delta, handle
+    
+    def generate_text(self, method: str, prompt: str, context: Optional[ProjectContext] = None,
+                      model_name: Optional[str] = None) -> str:
+        """Run a prompt through the routed (or the given) model, serving identical prompts from the response cache
+
+        With a project context the prompt is sent after the context prefix, which
+        is served from Gemini context caching when the model supports it.
+        """
+        full_prompt = f"{context.full}\n{prompt}" if context else prompt
+        model_name = model_name or self.router.route(method, full_prompt)
+        with self.telemetry.call(method, model_name, full_prompt) as call:
+            if not (self.cache and self.use_cache):
+                call.cache = "off"
+            else:
+                cached = self.cache.get(model_name, method, full_prompt)
+                if cached is not None:
+                    call.cache = "hit"
+                    call.output(cached)
+                    return cached
+            
+            while True:
+                self.governor.acquire(method, full_prompt)
+                try:
+                    model, delta, handle = self._cached_context_model(model_name, context) if context else (None, "", None)
+                    response = None
+                    if model is not None:
+                        try:
+                            response = model.generate_content(f"{delta}\n{prompt}" if delta else prompt)
+                        except Exception as e:
+                            if not context_cache_gone(e):
+                                raise
+                            # Expired or deleted on the service side: drop it and send the context inline
+                            self.contexts.invalidate(handle)
+                    if response is None:
+                        response = self.model_for(model_name).generate_content(full_prompt)
+                    text = response.text
+                    break
+                except Exception as e:
+                    delay = self.governor.retry_delay(e, call.retries)
+                    if delay is None:
+                        raise
+                    call.retries += 1
+                    time.sleep(delay)
+            call.output(text)
+            call.usage(response)
+        
+        if self.cache:
+            self.cache.set(model_name, method, full_prompt, text)
+        return text
+    
+    def stream_text(self, method: str, prompt: str) -> Iterator[str]:
+        """Stream a prompt's response in chunks; a cache hit is replayed as a single chunk"""
+        model_name = self.router.route(method, prompt)
+        with self.telemetry.call(method, model_name, prompt) as call:
+            if not (self.cache and self.use_cache):
+                call.cache = "off"
+            else:
+                cached = self.cache.get(model_name, method, prompt)
+                if cached is not None:
+                    call.cache = "hit"
+                    call.output(cached)
+                    yield cached
+                    return
+            
+            chunks = []
+            while True:
+                self.governor.acquire(method, prompt)
+                try:
+                    response = self.model_for(model_name).generate_content(prompt, stream=True)
+                    for chunk in response:
+                        try:
+                            text = chunk.text
+                        except ValueError:
+                            # Chunks without text parts (e.g. the final finish-reason chunk)
+                            continue
+                        call.output(text)
+                        chunks.append(text)
+                        yield text
+                    break
+                except Exception as e:
+                    # Once chunks have been handed out a retry would duplicate them
+                    delay = None if chunks else self.governor.retry_delay(e, call.retries)
+                    if delay is None:
+                        raise
+                    call.retries += 1
+                    time.sleep(delay)
+            call.usage(response)
+        
+        if self.cache:
+            self.cache.set(model_name, method, prompt, "".join(chunks))
+    
+    def forget(self, method: str, prompt: str):
+        """Remove cached responses from every model tier so the next call goes back to the model"""
+        if self.cache:
+            for model_name in MODEL_TIERS.values():
+                self.cache.invalidate(model_name, method, prompt)
+        
+    def _project_prompt(self, prompt: str, language: str, architecture: str) -> str:
+        """Build the project generation prompt"""
+        return f"""
+        You are CodeOracle, an expert software engineer. Generate a complete, production-ready {language} project based on the user's requirements.
+        
+        CRITICAL REQUIREMENTS:
+        1. Create a multi-file project structure with proper organization
+        2. Include all necessary files: source code, tests, README.md, requirements/package files, .gitignore
+        3. Write actual working code, not pseudocode or placeholders
+        4. Include comprehensive error handling and logging
+        5. Follow {language} best practices and conventions
+        6. Make the code modular and well-documented
+        7. Include unit tests and integration tests
+        8. Add security considerations where applicable
+        
+        Project Requirements: {prompt}
+        Target Language: {language}
+        Architecture Pattern: {architecture}
+        
+        Return the response as a JSON object with this exact structure:
+        {{
+            "project_name": "project-name",
+            "description": "Brief project description",
+            "files": {{
+                "filename1.ext": "file content here",
+                "filename2.ext": "file content here",
+                "tests/test_file.ext": "test content here",
+                "README.md": "comprehensive readme",
+                ".gitignore": "appropriate gitignore for {language}"
+            }},
+            "dependencies": ["list", "of", "dependencies"],
+            "build_commands": ["command1", "command2"],
+            "run_commands": ["command1", "command2"],
+            "test_commands": ["test command"],
+            "architecture_notes": "explanation of the chosen architecture"
+        }}
+        """
+    
+    # Follow-up calls allowed to fetch files missing from a truncated generation
+    MAX_CONTINUATIONS = 2
+    
+    PROJECT_DEFAULTS = {
+        "project_name": "generated-project",
+        "description": "",
+        "dependencies": [],
+        "build_commands": [],
+        "run_commands": [],
+        "test_commands": [],
+        "architecture_notes": ""
+    }
+    
+    def _continuation_prompt(self, system_prompt: str, received_files: List[str]) -> str:
+        """Ask for the remainder of a truncated project response"""
+        return f"""{system_prompt}
+        
+        Your previous response was cut off. These files were already received and must NOT be repeated:
+        {json.dumps(sorted(received_files))}
+        
+        Return the same JSON structure containing only the remaining files, plus every top-level field.
+        """
+    
+    def _merge_project(self, project_data: Dict, more: Dict) -> Dict:
+        merged = {**project_data, **{key: value for key, value in more.items() if key != "files"}}
+        merged["files"] = {**project_data["files"], **more.get("files", {})}
+        return merged
+    
+    def generate_project(self, prompt: str, language: str, architecture: str = "standard", raise_errors: bool = False) -> Dict:
+        """Generate a complete project from natural language prompt
+
+        A truncated response keeps its complete files and only the missing ones
+        are requested in a continuation call.
+        """
+        
+        system_prompt = self._project_prompt(prompt, language, architecture)
+        
+        try:
+            response_text = self.generate_text("generate_project", system_prompt)
+            
+            try:
+                project_data, complete = salvage_json_files(response_text)
+            except ValueError:
+                self.forget("generate_project", system_prompt)
+                raise
+            
+            for _ in range(self.MAX_CONTINUATIONS):
+                if complete:
+                    break
+                continuation_prompt = self._continuation_prompt(system_prompt, list(project_data["files"]))
+                try:
+                    more, complete = salvage_json_files(self.generate_text("generate_project_continue", continuation_prompt))
+                except ValueError:
+                    # Keep what the first reply salvaged; don't replay the bad continuation from cache
+                    self.forget("generate_project_continue", continuation_prompt)
+                    break
+                project_data = self._merge_project(project_data, more)
+            
+            return {**self.PROJECT_DEFAULTS, **project_data, "truncated": not complete}
+            
+        except Exception as e:
+            if raise_errors:
+                raise
+            st.error(f"Generation failed: {str(e)}")
+            return None
+    
+    def generate_project_stream(self, prompt: str, language: str, architecture: str = "standard") -> Iterator[Tuple[str, object]]:
+        """Generate a project while streaming, yielding ("file", (name, content)) events and a final ("project", data)
+
+        On failure an ("error", message) event precedes ("project", None).
+        """
+        
+        system_prompt = self._project_prompt(prompt, language, architecture)
+        
+        try:
+            project_data, complete = None, False
+            current_prompt, method = system_prompt, "generate_project"
+            
+            for _ in range(self.MAX_CONTINUATIONS + 1):
+                parser = ProjectStreamParser()
+                chunks = []
+                for text in self.stream_text(method, current_prompt):
+                    chunks.append(text)
+                    for filename, content in parser.feed(text):
+                        yield "file", (filename, content)
+                
+                try:
+                    more, complete = salvage_json_files("".join(chunks))
+                except ValueError:
+                    self.forget(method, current_prompt)
+                    if project_data is None:
+                        raise
+                    break
+                
+                project_data = more if project_data is None else self._merge_project(project_data, more)
+                if complete:
+                    break
+                current_prompt = self._continuation_prompt(system_prompt, list(project_data["files"]))
+                method = "generate_project_continue"
+            
+            yield "project", {**self.PROJECT_DEFAULTS, **project_data, "truncated": not complete}
+            
+        except Exception as e:
+            yield "error", f"Generation failed: {str(e)}"
+            yield "project", None
+    
+    def run_tests(self, project_path: str, language: str, test_commands: List[str], on_event=None,
+                  cancel: Optional[threading.Event] = None) -> Dict:
+        """Run automated tests in project_path and return results
+
+        Known runners (pytest, jest, go test, cargo test) run with machine-readable
+        reporters and are parsed into per-test records with durations, failure
+        messages and coverage where reported. success means every command ran,
+        exited 0 and had no failing test; failed_tests lists the failing commands
+        as given. on_event receives the ("line", ...) events from stream_commands
+        for live output.
+        """
+        results = {
+            "success": False,
+            "output": "",
+            "errors": "",
+            "coverage": None,
+            "failed_tests": [],
+            "tests": [],
+            "failures": [],
+            "summary": {}
+        }
+        report_dir = tempfile.mkdtemp(prefix="singularity-reports-")
+        
+        try:
+            instrumented = {}
+            for index, cmd in enumerate(test_commands):
+                command, runner, reports = instrument_test_command(cmd, project_path, report_dir, index)
+                instrumented[command] = (cmd, runner, reports)
+            
+            command_results = []
+            stdout_paths = {
+                command: reports["stdout"] for command, (_, _, reports) in instrumented.items() if "stdout" in reports
+            }
+            for event, payload in stream_commands(list(instrumented), project_path, cancel=cancel, stdout_paths=stdout_paths):
+                if event == "results":
+                    command_results = payload
+                elif on_event:
+                    on_event(event, payload)
+            
+            coverages = []
+            for command_result in command_results:
+                cmd, runner, reports = instrumented[command_result["command"]]
+                records, coverage = ingest_test_reports(command_result, runner, reports, project_path)
+                for record in records:
+                    record["command"] = cmd
+                results["tests"] += records
+                if coverage is not None:
+                    coverages.append(coverage)
+                
+                results["output"] += f"Command: {cmd}\n"
+                results["output"] += command_result["stdout"]
+                
+                if command_result["returncode"] != 0 or any(r["status"] in ("failed", "error") for r in records):
+                    results["errors"] += command_result["stderr"]
+                    results["failed_tests"].append(cmd)
+            
+            tests = results["tests"]
+            results["failures"] = [record for record in tests if record["status"] in ("failed", "error")]
+            results["success"] = len(command_results) == len(instrumented) > 0 and not results["failed_tests"]
+            results["coverage"] = round(sum(coverages) / len(coverages), 1) if coverages else None
+            results["summary"] = {
+                "total": len(tests),
+                "passed": sum(record["status"] == "passed" for record in tests),
+                "failed": len(results["failures"]),
+                "skipped": sum(record["status"] == "skipped" for record in tests),
+                "duration": round(sum(record["duration"] for record in tests), 2)
+            }
+                    
+        except Exception as e:
+            results["errors"] = str(e)
+        finally:
+            shutil.rmtree(report_dir, ignore_errors=True)
+            
+        return results
+    
+    def _rerun_impacted(self, project_path: str, language: str, files: Dict[str, str], changed: List[str],
+                        failed_commands: List[str], graph: Optional[Dict] = None) -> Dict:
+        """Re-run only the tests impacted by changed files; once those pass, confirm with the full failing commands"""
+        selection = select_impacted_tests(files, changed, failed_commands, graph=graph)
+        results = self.run_tests(project_path, language, list(selection))
+        results["failed_tests"] = [selection[cmd] for cmd in results["failed_tests"]]
+        
+        narrowed = any(scoped != original for scoped, original in selection.items())
+        if narrowed and not results["failed_tests"]:
+            results = self.run_tests(project_path, language, failed_commands)
+        return results
+    
+    def debug_and_fix(self, project_data: Dict, test_results: Dict, max_iterations: int = 3,
+                      workspace: Optional["WorkspaceLease"] = None, language: str = "") -> Dict:
+        """Autonomous debugging loop
+
+        Each round sends only the files implicated by the failing output plus a symbol
+        index of the rest. When a workspace is given the fixes are written to it and
+        the failing test commands are re-run, narrowed to the tests the fixed files
+        impact, stopping as soon as they pass.
+        """
+        project_path = workspace.materialize(project_data) if workspace else None
+        files = dict(project_data['files'])
+        graph = build_import_graph(files)
+        explanations = []
+        iterations = 0
+        
+        try:
+            for iteration in range(max_iterations):
+                iterations = iteration + 1
+                static_findings = [
+                    f for f in analyze_project({**project_data, "files": files})
+                    if f["kind"] in ("syntax_error", "undefined_name", "missing_import")
+                ]
+                
+                # Trivial failures (missing standard library imports) are fixed without a model call
+                local_fixes = {}
+                for filename in sorted({f["file"] for f in static_findings}):
+                    fixed = quick_fix_python(files[filename], [f for f in static_findings if f["file"] == filename])
+                    if fixed:
+                        local_fixes[filename] = fixed
+                
+                if local_fixes:
+                    files.update(local_fixes)
+                    graph = update_import_graph(graph, files, list(local_fixes))
+                    explanations.append(
+                        f"**Round {iterations} (local):** Added missing standard library imports in {', '.join(local_fixes)}"
+                    )
+                    static_findings = [
+                        f for f in analyze_project({**project_data, "files": files})
+                        if f["kind"] in ("syntax_error", "undefined_name", "missing_import")
+                    ]
+                    if project_path:
+                        workspace.write_files(project_data, local_fixes)
+                        test_results = self._rerun_impacted(
+                            project_path, language, files, list(local_fixes), test_results['failed_tests'], graph
+                        )
+                        if not test_results["failed_tests"]:
+                            break
+                
+                static_hints = format_static_hints(static_findings)
+                # Per-test failure records replace the raw stderr when the runner reported them
+                failures = format_test_failures(test_results)
+                failure_context = failures or test_results['errors'][-8000:]
+                error_text = f"{failures}\n{test_results['errors']}\n{test_results['output']}\n{static_hints}"
+                implicated = find_implicated_files(files, error_text, graph=graph)
+                context_files = {name: files[name] for name in implicated}
+                other_files = {name: content for name, content in files.items() if name not in context_files}
+                
+                debug_prompt = f"""
+        The following project has failing tests. Analyze the errors and fix the code:
+        
+        Test Failures: {failure_context}
+        Failed Commands: {test_results['failed_tests']}
+        
+        Local static analysis findings:
+        {static_hints}
+        
+        Files implicated by the failure (full content):
+        {json.dumps(context_files, separators=(',', ':'))}
+        
+        Symbol index of the remaining project files (path: symbols):
+        {format_symbol_index(other_files)}
+        
+        Fix the issues and return the corrected files in the same JSON structure.
+        You may change any project file, including ones only listed in the symbol index.
+        Focus on:
+        1. Syntax errors
+        2. Import/dependency issues  
+        3. Logic errors causing test failures
+        4. Missing error handling
+        
+        Return only the corrected files that need changes in this format:
+        {{
+            "fixed_files": {{
+                "filename": "corrected content"
+            }},
+            "fix_explanation": "What was fixed and why"
+        }}
+        """
+                
+                response_text = self.generate_text("debug_and_fix", debug_prompt)
+                
+                try:
+                    fix_data, _ = salvage_json_files(response_text, "fixed_files")
+                except ValueError:
+                    self.forget("debug_and_fix", debug_prompt)
+                    raise
+                
+                fixed_files = {
+                    filename: content for filename, content in fix_data.get("fixed_files", {}).items()
+                    if is_safe_project_path(filename)
+                }
+                explanations.append(f"**Round {iterations}:** {fix_data.get('fix_explanation', '')}")
+                
+                # Apply fixes
+                files.update(fixed_files)
+                
+                if not project_path or not fixed_files:
+                    break
+                
+                graph = update_import_graph(graph, files, list(fixed_files))
+                workspace.write_files(project_data, fixed_files)
+                test_results = self._rerun_impacted(
+                    project_path, language, files, list(fixed_files), test_results['failed_tests'], graph
+                )
+                if not test_results["failed_tests"]:
+                    break
+                
+            return {
+                "success": True,
+                "explanation": "\n\n".join(explanations),
+                "updated_project": {**project_data, "files": files},
+                "iterations": iterations,
+                "test_results": test_results
+            }
+            
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+    
+    REFACTOR_OBJECTIVES = {
+        "readability": "Refactor for maximum readability and maintainability",
+        "performance": "Optimize for performance and efficiency", 
+        "size": "Minimize code size and bundle size",
+        "security": "Enhance security and add security best practices"
+    }
+    
+    def refactor_code(self, project_data: Dict, refactor_type: str) -> Dict:
+        """Refactor code for one objective, returning changed files and per-file unified diffs"""
+        
+        context = self.contexts.context(project_data)
+        prompt = f"""
+        {self.REFACTOR_OBJECTIVES[refactor_type]} for the project above.
+        
+        Return only the files you changed, as a JSON object with this exact structure:
+        {{
+            "files": {{
+                "filename": "complete refactored content"
+            }},
+            "explanation": "What was changed and why, as markdown"
+        }}
+        """
+        
+        try:
+            response_text = self.generate_text("refactor_code", prompt, context=context)
+            
+            try:
+                refactor_data, _ = salvage_json_files(response_text)
+            except ValueError:
+                self.forget("refactor_code", f"{context.full}\n{prompt}")
+                raise
+            
+            changed_files = {
+                filename: content
+                for filename, content in refactor_data.get("files", {}).items()
+                if project_data['files'].get(filename) != content
+            }
+            diffs = {
+                filename: "".join(difflib.unified_diff(
+                    project_data['files'].get(filename, "").splitlines(keepends=True),
+                    content.splitlines(keepends=True),
+                    fromfile=f"a/{filename}",
+                    tofile=f"b/{filename}"
+                ))
+                for filename, content in changed_files.items()
+            }
+            
+            return {
+                "success": True,
+                "objective": refactor_type,
+                "explanation": refactor_data.get("explanation", ""),
+                "files": changed_files,
+                "diffs": diffs
+            }
+        except Exception as e:
+            return {"success": False, "objective": refactor_type, "error": str(e)}
+    
+    def refactor_many(self, project_data: Dict, objectives: List[str], max_concurrency: int = 4, on_result=None) -> Dict[str, Dict]:
+        """Run several refactor objectives concurrently, keyed by objective"""
+        results = {}
+        # Build the shared project context once rather than racing to parse the project in every worker
+        self.contexts.context(project_data)
+        
+        with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(objectives)))) as pool:
+            futures = {pool.submit(self.refactor_code, project_data, objective): objective for objective in objectives}
+            for future in as_completed(futures):
+                objective = futures[future]
+                results[objective] = future.result()
+                if on_result:
+                    on_result(objective, results[objective])
+        
+        return results
+    
+    def explain_code(self, code: str, language: str) -> str:
+        """Provide detailed code explanation"""
+        
+        prompt = f"""
+        Explain this {language} code line by line with:
+        1. What each function/class does
+        2. Time/space complexity analysis
+        3. Alternative approaches
+        4. How a senior developer would improve it
+        5. Potential issues or edge cases
+        
+        Code:
+        {code}
+        """
+        
+        try:
+            response_text = self.generate_text("explain_code", prompt)
+            return response_text
+        except Exception as e:
+            return f"Explanation failed: {str(e)}"
+    
+    def _scan_chunk(self, chunk: List[Tuple[str, str, int]], language: str, local_findings: List[Dict],
+                    model_name: str) -> List[Dict]:
+        """Ask the model for structured findings on one chunk of files"""
+        sections = "\n\n".join(
+            f"=== {filename} (from line {first_line}) ===\n{text}" for filename, text, first_line in chunk
+        )
+        chunk_files = {filename for filename, _, _ in chunk}
+        hints = format_static_hints([f for f in local_findings if f["file"] in chunk_files])
+        prompt = f"""
+        Perform a security analysis of these {language} project files using OWASP guidelines.
+        Lines are prefixed with their line number.
+        
+        {sections}
+        
+        Already detected by local static analysis (do not repeat these):
+        {hints}
+        
+        Identify:
+        1. Security vulnerabilities
+        2. Input validation issues
+        3. Authentication/authorization flaws
+        4. Data exposure risks
+        5. Dependency vulnerabilities
+        
+        Return only a JSON object with this exact structure (an empty list if nothing is found):
+        {{
+            "findings": [
+                {{"file": "path", "line": 1, "cwe": "CWE-89", "severity": "Critical|High|Medium|Low|Info", "issue": "short description", "fix": "suggested fix"}}
+            ]
+        }}
+        """
+        
+        response_text = self.generate_text("security_scan", prompt, model_name=model_name)
+        try:
+            return extract_json_object(response_text, required_key="findings")["findings"]
+        except ValueError:
+            self.forget("security_scan", prompt)
+            raise
+    
+    def security_scan(self, project_data: Dict, language: str) -> Dict:
+        """Perform security analysis as a map-reduce over token-budgeted chunks
+
+        Findings are cached per file content hash and scanning model, so a rescan
+        only sends the files that changed since the last scan.
+        """
+        
+        local_findings = [
+            f for f in analyze_project(project_data) if f["kind"] in ("dangerous_call", "hardcoded_secret")
+        ]
+        findings = [
+            {
+                "file": f["file"],
+                "line": f["line"],
+                "cwe": f["cwe"],
+                "severity": f["severity"],
+                "issue": f"[local] {f['message']}",
+                "fix": LOCAL_FIX_SUGGESTIONS.get(f["cwe"], "")
+            }
+            for f in local_findings
+        ]
+        
+        files = {
+            filename: content for filename, content in project_data['files'].items()
+            if os.path.basename(filename) not in SCAN_SKIP_FILES and not filename.endswith(SCAN_LOCAL_ONLY)
+        }
+        if project_data.get('dependencies'):
+            files["<dependencies>"] = "\n".join(str(dep) for dep in project_data['dependencies'])
+        
+        # Route once so every chunk, and the per-file cache entries, use the same model
+        model_name = self.router.route("security_scan", "")
+        pending, errors = {}, []
+        for filename, content in files.items():
+            cache_prompt = f"{language}\0{filename}\0{hashlib.sha256(content.encode('utf-8')).hexdigest()}"
+            cached = self.cache.get(model_name, "security_scan_file", cache_prompt) if (self.cache and self.use_cache) else None
+            if cached is not None:
+                findings.extend(json.loads(cached))
+            else:
+                pending[filename] = (content, cache_prompt)
+        
+        chunks = chunk_files_for_scan({filename: content for filename, (content, _) in pending.items()})
+        
+        try:
+            with ThreadPoolExecutor(max_workers=SCAN_CONCURRENCY) as pool:
+                futures = {pool.submit(self._scan_chunk, chunk, language, local_findings, model_name): chunk for chunk in chunks}
+                chunk_results = {}
+                for future in as_completed(futures):
+                    chunk = futures[future]
+                    try:
+                        chunk_results[id(chunk)] = future.result()
+                    except Exception as e:
+                        errors.append(f"{', '.join(sorted({name for name, _, _ in chunk}))}: {str(e)}")
+            
+            per_file = {}
+            # Files that must not be cached: their chunk failed, or returned findings we could not attribute
+            uncacheable = set()
+            for chunk in chunks:
+                chunk_files = {filename for filename, _, _ in chunk}
+                if id(chunk) not in chunk_results:
+                    uncacheable |= chunk_files
+                    continue
+                for filename in chunk_files:
+                    per_file.setdefault(filename, [])
+                for finding in chunk_results[id(chunk)]:
+                    filename = match_finding_file(finding.get("file", ""), chunk_files)
+                    if filename is None:
+                        findings.append(finding)
+                        uncacheable |= chunk_files
+                    else:
+                        per_file[filename].append({**finding, "file": filename})
+            
+            for filename, file_findings in per_file.items():
+                findings.extend(file_findings)
+                if self.cache and filename in pending and filename not in uncacheable:
+                    self.cache.set(model_name, "security_scan_file", pending[filename][1], json.dumps(file_findings))
+            
+            if chunks and len(errors) == len(chunks):
+                return {"success": False, "error": "; ".join(errors)}
+            
+            findings = merge_findings(findings)
+            counts = {severity: sum(f["severity"] == severity for f in findings) for severity in SEVERITY_ORDER}
+            report = (
+                f"Scanned {len(files)} file(s): {len(pending)} analyzed, {len(files) - len(pending)} unchanged from cache.\n\n"
+                + " • ".join(f"**{severity}:** {count}" for severity, count in counts.items())
+            )
+            return {
+                "success": True,
+                "findings": findings,
+                "counts": counts,
+                "report": report,
+                "errors": errors
+            }
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+    
+    def generate_cicd(self, project_data: Dict, language: str, platform: str) -> str:
+        """Generate CI/CD configuration"""
+        
+        prompt = f"""
+        Generate {platform} CI/CD configuration for this {language} project:
+        
+        Project: {project_data['project_name']}
+        Dependencies: {project_data.get('dependencies', [])}
+        Build Commands: {project_data.get('build_commands', [])}
+        Test Commands: {project_data.get('test_commands', [])}
+        
+        Include:
+        1. Build pipeline
+        2. Test automation
+        3. Security scanning
+        4. Deployment steps
+        5. Environment management
+        
+        Platform: {platform}
+        """
+        
+        try:
+            response_text = self.generate_text("generate_cicd", prompt)
+            return response_text
+        except Exception as e:
+            return f"CI/CD generation failed: {str(e)}"
+
+def create_project_files(project_data: Dict, base_path: str) -> List[str]:
+    """Create actual files from project data, returning an error message per file that could not be written
+
+    Safe to call from worker threads: nothing is reported through Streamlit, and
+    paths that would resolve outside base_path are refused.
+    """
+    os.makedirs(base_path, exist_ok=True)
+    errors = []
+    
+    for filename, content in project_data["files"].items():
+        file_path = resolve_project_path(base_path, filename)
+        if file_path is None:
+            errors.append(f"Refused to create {filename}: path escapes the project directory")
+            continue
+        
+        try:
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            with open(file_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+        except Exception as e:
+            errors.append(f"Failed to create file {filename}: {str(e)}")
+    
+    return errors
+
+WORKSPACE_ROOT = os.path.join(tempfile.gettempdir(), "singularity-ai-workspaces")
+WORKSPACE_IDLE_TTL = 2 * 3600
+WORKSPACE_QUOTA_MB = 4096
+
+def is_safe_project_path(filename: str) -> bool:
+    """True for relative paths that stay inside the project (no '..' escape, no absolute or drive paths)"""
+    normalized = posixpath.normpath(filename.replace('\\', '/'))
+    return bool(filename) and not (
+        posixpath.isabs(normalized) or normalized == '..' or normalized.startswith('../') or re.match(r'^[A-Za-z]:', normalized)
+    )
+
+def resolve_project_path(root: str, filename: str) -> Optional[str]:
+    """Real path of a project file under root, or None if it would land outside root (e.g. '../x')"""
+    real_root = os.path.realpath(root)
+    file_path = os.path.realpath(os.path.join(real_root, filename))
+    return file_path if file_path.startswith(real_root + os.sep) else None
+
+def _safe_slug(name: str) -> str:
+    return re.sub(r'[^A-Za-z0-9._-]+', '-', name).strip('.-') or "project"
+
+class WorkspaceManager:
+    """Keeps one materialized directory per session and project, shared by build and test
+
+    Only files whose content hash changed are rewritten, so build tool caches
+    (node_modules, target/, __pycache__) survive between runs. Workspaces are
+    removed when their session ends, after an idle TTL, or oldest-first when the
+    total size exceeds the disk quota.
+    """
+
+    def __init__(self, root: str = WORKSPACE_ROOT, idle_ttl: int = WORKSPACE_IDLE_TTL,
+                 quota_mb: int = WORKSPACE_QUOTA_MB):
+        self.root = root
+        self.idle_ttl = idle_ttl
+        self.quota_bytes = quota_mb * 1024 * 1024
+        self.workspaces = {}
+        self._lock = threading.Lock()
+        self._workspace_locks = {}
+        self._last_gc = 0.0
+        os.makedirs(root, exist_ok=True)
+        self.collect_garbage(force=True)
+
+    def workspace_path(self, session_id: str, project_name: str) -> str:
+        return os.path.join(self.root, _safe_slug(session_id), _safe_slug(project_name))
+
+    def _entry(self, session_id: str, project_name: str) -> Tuple[str, Dict, threading.Lock]:
+        path = self.workspace_path(session_id, project_name)
+        with self._lock:
+            entry = self.workspaces.setdefault(path, {"session_id": session_id, "hashes": {}, "written": 0})
+            entry["last_used"] = time.time()
+            workspace_lock = self._workspace_locks.setdefault(path, threading.Lock())
+        return path, entry, workspace_lock
+
+    @staticmethod
+    def _write(path: str, hashes: Dict[str, str], files: Dict[str, str]) -> int:
+        """Write files whose hash changed, skipping paths that resolve outside the workspace"""
+        os.makedirs(path, exist_ok=True)
+        written = 0
+        for filename, content in files.items():
+            file_path = resolve_project_path(path, filename)
+            if file_path is None:
+                continue
+            
+            content_hash = hashlib.sha1(content.encode('utf-8')).hexdigest()
+            if hashes.get(filename) == content_hash and os.path.exists(file_path):
+                continue
+            
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            with open(file_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            hashes[filename] = content_hash
+            written += 1
+        return written
+
+    def materialize(self, session_id: str, project_data: Dict) -> str:
+        """Bring the workspace in line with project_data and return its path"""
+        path, entry, workspace_lock = self._entry(session_id, project_data.get("project_name", "project"))
+        
+        with workspace_lock:
+            hashes = entry["hashes"]
+            written = self._write(path, hashes, project_data["files"])
+            
+            for filename in set(hashes) - set(project_data["files"]):
+                file_path = resolve_project_path(path, filename)
+                if file_path:
+                    _remove_file(file_path)
+                del hashes[filename]
+            
+            entry["written"] = written
+        
+        self.collect_garbage()
+        return path
+
+    def write_files(self, session_id: str, project_name: str, files: Dict[str, str]) -> str:
+        """Write changed files (e.g. debug fixes) into a workspace, keeping its content hashes accurate
+
+        A later materialize() of a different revision then rewrites exactly these files.
+        """
+        path, entry, workspace_lock = self._entry(session_id, project_name)
+        with workspace_lock:
+            entry["written"] = self._write(path, entry["hashes"], files)
+        return path
+
+    def release(self, session_id: str):
+        """Delete every workspace belonging to a session"""
+        with self._lock:
+            for path in [p for p, entry in self.workspaces.items() if entry["session_id"] == session_id]:
+                self.workspaces.pop(path, None)
+                self._workspace_locks.pop(path, None)
+        shutil.rmtree(os.path.join(self.root, _safe_slug(session_id)), ignore_errors=True)
+
+    def collect_garbage(self, force: bool = False):
+        """Remove idle workspaces, then the least recently used ones while over quota"""
+        now = time.time()
+        if not force and now - self._last_gc < 60:
+            return
+        self._last_gc = now
+        
+        candidates = []
+        for session_dir in os.scandir(self.root):
+            if not session_dir.is_dir():
+                continue
+            for project_dir in os.scandir(session_dir.path):
+                if not project_dir.is_dir():
+                    continue
+                entry = self.workspaces.get(project_dir.path)
+                last_used = entry["last_used"] if entry else project_dir.stat().st_mtime
+                candidates.append((last_used, project_dir.path))
+        
+        candidates.sort()
+        kept = []
+        for last_used, path in candidates:
+            if now - last_used > self.idle_ttl:
+                self._remove(path)
+            else:
+                kept.append((path, _directory_size(path)))
+        
+        total = sum(size for _, size in kept)
+        for path, size in kept:
+            if total <= self.quota_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def _remove(self, path: str):
+        with self._lock:
+            self.workspaces.pop(path, None)
+            self._workspace_locks.pop(path, None)
+        shutil.rmtree(path, ignore_errors=True)
+
+def _directory_size(path: str) -> int:
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.lstat(os.path.join(dirpath, filename)).st_size
+            except OSError:
+                pass
+    return total
+
+@st.cache_resource
+def get_workspace_manager() -> WorkspaceManager:
+    """Process-wide workspace manager"""
+    return WorkspaceManager()
+
+class WorkspaceLease:
+    """Session-owned handle whose finalizer releases the session's workspaces when the session goes away"""
+
+    def __init__(self, manager: WorkspaceManager, session_id: str):
+        self.manager = manager
+        self.session_id = session_id
+        weakref.finalize(self, manager.release, session_id)
+
+    def materialize(self, project_data: Dict) -> str:
+        return self.manager.materialize(self.session_id, project_data)
+
+    def write_files(self, project_data: Dict, files: Dict[str, str]) -> str:
+        return self.manager.write_files(self.session_id, project_data.get("project_name", "project"), files)
+
+BUILD_CACHE_DIR = os.path.join(CACHE_DIR, "builds")
+BUILD_CACHE_MAX_MB = 2048
+BUILD_ARTIFACT_MAX_MB = 256
+# Directories never captured as build artifacts: dependency trees and tool caches
+BUILD_ARTIFACT_SKIP_DIRS = {
+    "node_modules", ".venv", "venv", "env", "__pycache__", ".git", ".pytest_cache", ".mypy_cache",
+    ".gradle", ".cargo", "vendor"
+}
+
+def merkle_hash(files: Dict[str, str]) -> str:
+    """Root of a Merkle tree over the project's directories and file contents"""
+    tree = {}
+    for filename, content in files.items():
+        node = tree
+        parts = filename.split('/')
+        for part in parts[:-1]:
+            node = node.setdefault(part + '/', {})
+        node[parts[-1]] = hashlib.sha256(content.encode('utf-8')).hexdigest()
+    
+    def digest(node):
+        entries = "".join(
+            f"{name}\0{digest(child) if isinstance(child, dict) else child}\0" for name, child in sorted(node.items())
+        )
+        return hashlib.sha256(entries.encode('utf-8')).hexdigest()
+    
+    return digest(tree)
+
+def toolchain_fingerprint(commands: List[str]) -> str:
+    """Identify the executables a command list resolves to, by path, size and modification time"""
+    parts = [sys.platform]
+    for executable in sorted({cmd.split()[0] for cmd in commands if cmd.strip()}):
+        path = shutil.which(executable)
+        if path:
+            stat = os.stat(path)
+            parts.append(f"{executable}={os.path.realpath(path)}:{stat.st_size}:{int(stat.st_mtime)}")
+        else:
+            parts.append(f"{executable}=missing")
+    return "|".join(parts)
+
+def snapshot_tree(root: str) -> Dict[str, Tuple[int, int]]:
+    """(mtime_ns, size) of every file under root, skipping dependency and tool cache directories"""
+    snapshot = {}
+    for directory, subdirs, filenames in os.walk(root):
+        subdirs[:] = [name for name in subdirs if name not in BUILD_ARTIFACT_SKIP_DIRS]
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            snapshot[os.path.relpath(path, root)] = (stat.st_mtime_ns, stat.st_size)
+    return snapshot
+
+class BuildCache:
+    """Successful build outputs and artifacts keyed by project Merkle root, commands and toolchain"""
+
+    def __init__(self, root: str = BUILD_CACHE_DIR, max_mb: int = BUILD_CACHE_MAX_MB):
+        self.root = root
+        self.max_bytes = max_mb * 1024 * 1024
+        self.path = os.path.join(root, "index.sqlite")
+        os.makedirs(root, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS builds (
+                    key TEXT PRIMARY KEY,
+                    output TEXT,
+                    artifacts INTEGER,
+                    dependency_dirs TEXT,
+                    size INTEGER,
+                    created_at REAL,
+                    last_access REAL
+                )
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _archive_path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.tar.gz")
+
+    @staticmethod
+    def make_key(files: Dict[str, str], commands: List[str]) -> str:
+        payload = "\0".join([merkle_hash(files), json.dumps(commands), toolchain_fingerprint(commands)])
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str, project_path: str) -> Optional[Dict]:
+        """Stored build result, restoring its artifacts into project_path; None on a miss
+
+        Installed dependency trees (node_modules, .venv, ...) are not archived, so
+        a workspace that lacks one the original build produced is a miss and gets
+        a real build, which the shared dependency cache keeps fast.
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT output, artifacts, dependency_dirs FROM builds WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE builds SET last_access = ? WHERE key = ?", (time.time(), key))
+        
+        output, artifacts, dependency_dirs = row
+        if any(not os.path.isdir(os.path.join(project_path, name)) for name in json.loads(dependency_dirs or "[]")):
+            return None
+        if artifacts:
+            try:
+                with tarfile.open(self._archive_path(key), 'r:gz') as archive:
+                    if hasattr(tarfile, 'data_filter'):
+                        archive.extractall(project_path, filter='data')
+                    else:
+                        archive.extractall(project_path)
+            except (OSError, tarfile.TarError):
+                self.invalidate(key)
+                return None
+        
+        return {"success": True, "output": output, "cached": True, "artifacts": artifacts}
+
+    def put(self, key: str, result: Dict, project_path: str, before: Dict[str, Tuple[int, int]],
+            source_files: Dict[str, str]):
+        """Store a successful build with the files it created or changed in the workspace"""
+        after = snapshot_tree(project_path)
+        artifacts = [
+            path for path, stamp in after.items()
+            if before.get(path) != stamp and path.replace(os.sep, '/') not in source_files
+        ]
+        if sum(after[path][1] for path in artifacts) > BUILD_ARTIFACT_MAX_MB * 1024 * 1024:
+            return
+        
+        size = 0
+        if artifacts:
+            temp_path = f"{self._archive_path(key)}.{os.getpid()}.tmp"
+            with tarfile.open(temp_path, 'w:gz') as archive:
+                for path in artifacts:
+                    archive.add(os.path.join(project_path, path), arcname=path)
+            os.replace(temp_path, self._archive_path(key))
+            size = os.path.getsize(self._archive_path(key))
+        
+        dependency_dirs = sorted(
+            name for name in BUILD_ARTIFACT_SKIP_DIRS if os.path.isdir(os.path.join(project_path, name))
+        )
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO builds (key, output, artifacts, dependency_dirs, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, result["output"], len(artifacts), json.dumps(dependency_dirs), size + len(result["output"]), now, now)
+            )
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM builds").fetchone()[0]
+            evicted = []
+            for old_key, old_size in conn.execute("SELECT key, size FROM builds ORDER BY last_access").fetchall():
+                if total <= self.max_bytes:
+                    break
+                evicted.append(old_key)
+                total -= old_size
+            conn.executemany("DELETE FROM builds WHERE key = ?", [(old_key,) for old_key in evicted])
+        
+        for old_key in evicted:
+            try:
+                os.remove(self._archive_path(old_key))
+            except OSError:
+                pass
+
+    def invalidate(self, key: str):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM builds WHERE key = ?", (key,))
+        try:
+            os.remove(self._archive_path(key))
+        except OSError:
+            pass
+
+    def stats(self) -> Dict:
+        with self._connect() as conn:
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM builds").fetchone()
+        return {"entries": entries, "size_mb": round(size / (1024 * 1024), 1)}
+
+@st.cache_resource
+def get_build_cache() -> BuildCache:
+    """Process-wide build cache"""
+    return BuildCache()
+
+PROJECT_STORE_DIR = os.path.join(CACHE_DIR, "projects")
+PROJECT_STORE_MAX_MB = 1024
+PROJECT_STORE_MEMORY_MB = 64
+PROJECT_STORE_LOADED = 8
+PROJECT_HISTORY_LIMIT = 50
+# Revisions untouched this long are evictable even if a session never released them (e.g. after a crash)
+PROJECT_STORE_STALE_SECONDS = 30 * 24 * 3600
+# Blob encodings, recorded in the first byte so either codec can read the other's blobs
+BLOB_RAW, BLOB_ZLIB, BLOB_ZSTD = b"r", b"z", b"s"
+
+class ProjectStore:
+    """Content-addressed project revisions on disk, shared by all sessions and worker processes
+
+    File contents are stored once per distinct content as compressed blobs; a revision
+    is the project metadata plus a filename -> blob hash manifest. Sessions hold only
+    revision IDs and retain/release them; unreferenced revisions are evicted least
+    recently used first once the blobs exceed max_mb. Recently loaded revisions are
+    kept decompressed in memory, with identical files shared between them.
+    """
+
+    def __init__(self, root: str = PROJECT_STORE_DIR, max_mb: int = PROJECT_STORE_MAX_MB,
+                 memory_mb: int = PROJECT_STORE_MEMORY_MB):
+        self.root = root
+        self.max_bytes = max_mb * 1024 * 1024
+        self.memory_bytes = memory_mb * 1024 * 1024
+        self.path = os.path.join(root, "index.sqlite")
+        os.makedirs(os.path.join(root, "blobs"), exist_ok=True)
+        self._lock = threading.Lock()
+        self._blobs = OrderedDict()
+        self._blob_bytes = 0
+        self._loaded = OrderedDict()
+        
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS blobs (
+                    hash TEXT PRIMARY KEY,
+                    size INTEGER,
+                    stored INTEGER,
+                    refs INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS revisions (
+                    id TEXT PRIMARY KEY,
+                    parent TEXT,
+                    meta TEXT,
+                    manifest TEXT,
+                    size INTEGER,
+                    refs INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL,
+                    last_access REAL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_revisions_access ON revisions(refs, last_access)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _blob_path(self, blob_hash: str) -> str:
+        return os.path.join(self.root, "blobs", blob_hash[:2], blob_hash[2:])
+
+    @staticmethod
+    def _encode(data: bytes) -> bytes:
+        if len(data) < 256:
+            return BLOB_RAW + data
+        if zstandard is not None:
+            return BLOB_ZSTD + zstandard.ZstdCompressor(level=9).compress(data)
+        return BLOB_ZLIB + zlib.compress(data, 6)
+
+    @staticmethod
+    def _decode(data: bytes) -> bytes:
+        codec, payload = data[:1], data[1:]
+        if codec == BLOB_ZSTD:
+            if zstandard is None:
+                raise RuntimeError("Project blob is zstd-compressed but the zstandard package is not installed")
+            return zstandard.ZstdDecompressor().decompress(payload)
+        if codec == BLOB_ZLIB:
+            return zlib.decompress(payload)
+        return payload
+
+    def _cache_blob(self, blob_hash: str, content: str) -> str:
+        """Keep a decoded blob in the memory LRU, returning the shared string"""
+        with self._lock:
+            if blob_hash in self._blobs:
+                self._blobs.move_to_end(blob_hash)
+                return self._blobs[blob_hash]
+            self._blobs[blob_hash] = content
+            self._blob_bytes += len(content)
+            while self._blob_bytes > self.memory_bytes and len(self._blobs) > 1:
+                _, evicted = self._blobs.popitem(last=False)
+                self._blob_bytes -= len(evicted)
+        return content
+
+    def _read_blob(self, blob_hash: str) -> str:
+        with self._lock:
+            if blob_hash in self._blobs:
+                self._blobs.move_to_end(blob_hash)
+                return self._blobs[blob_hash]
+        with open(self._blob_path(blob_hash), 'rb') as f:
+            content = self._decode(f.read()).decode('utf-8')
+        return self._cache_blob(blob_hash, content)
+
+    def put(self, project: Dict, parent: Optional[str] = None, retain: bool = False) -> str:
+        """Store a project and return its revision ID; identical projects share one revision
+
+        Runs as one IMMEDIATE transaction, so no eviction (from any process) can
+        interleave between finding a blob present and referencing it. With retain
+        the revision's reference is taken in the same transaction, so it cannot be
+        evicted before the caller holds it.
+        """
+        meta = json.dumps({key: value for key, value in project.items() if key != 'files'}, sort_keys=True)
+        manifest = {
+            filename: hashlib.sha256(content.encode('utf-8')).hexdigest()
+            for filename, content in project['files'].items()
+        }
+        manifest_json = json.dumps(manifest, sort_keys=True)
+        revision = hashlib.sha256(f"{meta}\0{manifest_json}".encode('utf-8')).hexdigest()[:32]
+        now = time.time()
+        
+        contents = {blob_hash: project['files'][filename] for filename, blob_hash in manifest.items()}
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            inserted = conn.execute(
+                "INSERT OR IGNORE INTO revisions (id, parent, meta, manifest, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (revision, parent, meta, manifest_json, sum(len(c.encode('utf-8')) for c in contents.values()), now, now)
+            ).rowcount
+            if not inserted:
+                conn.execute(
+                    "UPDATE revisions SET last_access = ?, refs = refs + ? WHERE id = ?", (now, int(retain), revision)
+                )
+                return revision
+            if retain:
+                conn.execute("UPDATE revisions SET refs = 1 WHERE id = ?", (revision,))
+            
+            known = {
+                row[0] for row in conn.execute(
+                    f"SELECT hash FROM blobs WHERE hash IN ({','.join('?' for _ in contents)})", list(contents)
+                )
+            } if contents else set()
+            for blob_hash in set(contents) - known:
+                data = contents[blob_hash].encode('utf-8')
+                encoded = self._encode(data)
+                path = self._blob_path(blob_hash)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(temp_path, 'wb') as f:
+                    f.write(encoded)
+                os.replace(temp_path, path)
+                conn.execute("INSERT OR IGNORE INTO blobs (hash, size, stored) VALUES (?, ?, ?)",
+                             (blob_hash, len(data), len(encoded)))
+            conn.executemany("UPDATE blobs SET refs = refs + 1 WHERE hash = ?", [(h,) for h in contents])
+        
+        for blob_hash, content in contents.items():
+            self._cache_blob(blob_hash, content)
+        self._evict(keep=revision)
+        return revision
+
+    def load(self, revision: Optional[str]) -> Optional[Dict]:
+        """Project for a revision ID, or None if it was never stored or has been evicted
+
+        The returned dict is shared between sessions and must not be modified in place.
+        """
+        if not revision:
+            return None
+        with self._lock:
+            if revision in self._loaded:
+                self._loaded.move_to_end(revision)
+                return self._loaded[revision]
+        
+        with self._connect() as conn:
+            row = conn.execute("SELECT meta, manifest FROM revisions WHERE id = ?", (revision,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE revisions SET last_access = ? WHERE id = ?", (time.time(), revision))
+        
+        try:
+            files = {filename: self._read_blob(blob_hash) for filename, blob_hash in json.loads(row[1]).items()}
+        except OSError:
+            return None
+        project = {**json.loads(row[0]), "files": files}
+        
+        with self._lock:
+            self._loaded[revision] = project
+            while len(self._loaded) > PROJECT_STORE_LOADED:
+                self._loaded.popitem(last=False)
+        return project
+
+    def retain(self, revision: str):
+        with self._connect() as conn:
+            conn.execute("UPDATE revisions SET refs = refs + 1, last_access = ? WHERE id = ?", (time.time(), revision))
+
+    def release(self, revision: str):
+        with self._connect() as conn:
+            conn.execute("UPDATE revisions SET refs = MAX(refs - 1, 0) WHERE id = ?", (revision,))
+
+    def _evict(self, keep: str):
+        """Drop unreferenced revisions, oldest first, and the blobs only they used until under max_bytes"""
+        removed = []
+        with self._connect() as conn:
+            # Blob files are deleted while the write lock is held, before a concurrent put can see them as absent
+            conn.execute("BEGIN IMMEDIATE")
+            total = conn.execute("SELECT COALESCE(SUM(stored), 0) FROM blobs").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            for revision, manifest in conn.execute(
+                "SELECT id, manifest FROM revisions WHERE (refs = 0 OR last_access < ?) AND id != ? ORDER BY last_access",
+                (time.time() - PROJECT_STORE_STALE_SECONDS, keep)
+            ).fetchall():
+                if total <= self.max_bytes:
+                    break
+                hashes = list(set(json.loads(manifest).values()))
+                conn.execute("DELETE FROM revisions WHERE id = ?", (revision,))
+                conn.executemany("UPDATE blobs SET refs = refs - 1 WHERE hash = ?", [(h,) for h in hashes])
+                if hashes:
+                    unused = conn.execute(
+                        f"SELECT hash, stored FROM blobs WHERE refs <= 0 AND hash IN ({','.join('?' for _ in hashes)})",
+                        hashes
+                    ).fetchall()
+                    conn.executemany("DELETE FROM blobs WHERE hash = ?", [(h,) for h, _ in unused])
+                    removed.extend(h for h, _ in unused)
+                    total -= sum(stored for _, stored in unused)
+                with self._lock:
+                    self._loaded.pop(revision, None)
+            
+            for blob_hash in removed:
+                _remove_file(self._blob_path(blob_hash))
+
+    def stats(self) -> Dict:
+        with self._connect() as conn:
+            revisions, logical = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM revisions").fetchone()
+            blobs, stored = conn.execute("SELECT COUNT(*), COALESCE(SUM(stored), 0) FROM blobs").fetchone()
+        return {
+            "revisions": revisions,
+            "blobs": blobs,
+            "stored_mb": round(stored / (1024 * 1024), 1),
+            "ratio": round(logical / stored, 1) if stored else 0.0
+        }
+
+@st.cache_resource
+def get_project_store() -> ProjectStore:
+    """Process-wide project store"""
+    return ProjectStore()
+
+class ProjectHistory:
+    """A session's undo/redo stack of project revision IDs, releasing them when the session goes away"""
+
+    def __init__(self, store: ProjectStore, limit: int = PROJECT_HISTORY_LIMIT):
+        self.store = store
+        self.limit = limit
+        self.entries = []  # (revision, label)
+        self.position = -1
+        self.stashed = set()
+        weakref.finalize(self, ProjectHistory._release_all, store, self.entries, self.stashed)
+
+    @staticmethod
+    def _release_all(store: ProjectStore, entries: List[Tuple[str, str]], stashed: set):
+        for revision, _ in entries:
+            store.release(revision)
+        for revision in stashed:
+            store.release(revision)
+
+    @property
+    def current(self) -> Optional[str]:
+        return self.entries[self.position][0] if self.position >= 0 else None
+
+    def project(self) -> Optional[Dict]:
+        return self.store.load(self.current)
+
+    def commit(self, project: Dict, label: str) -> str:
+        """Store a project as the new current revision, discarding anything that could be redone"""
+        return self.apply(self.store.put(project, parent=self.current, retain=True), label, retained=True)
+
+    def apply(self, revision: str, label: str, retained: bool = False) -> str:
+        """Make an already stored revision current; retained means the caller already holds a reference for it"""
+        if revision == self.current:
+            if retained:
+                self.store.release(revision)
+            return revision
+        for old_revision, _ in self.entries[self.position + 1:]:
+            self.store.release(old_revision)
+        del self.entries[self.position + 1:]
+        
+        if not retained:
+            self.store.retain(revision)
+        self.entries.append((revision, label))
+        while len(self.entries) > self.limit:
+            self.store.release(self.entries.pop(0)[0])
+        self.position = len(self.entries) - 1
+        return revision
+
+    def stash(self, project: Dict) -> str:
+        """Store a candidate project (e.g. a refactor result) without making it current"""
+        revision = self.store.put(project, parent=self.current, retain=True)
+        if revision in self.stashed:
+            self.store.release(revision)
+        else:
+            self.stashed.add(revision)
+        return revision
+
+    def unstash(self, revision: Optional[str]):
+        if revision in self.stashed:
+            self.stashed.discard(revision)
+            self.store.release(revision)
+
+    @property
+    def can_undo(self) -> bool:
+        return self.position > 0
+
+    @property
+    def can_redo(self) -> bool:
+        return self.position < len(self.entries) - 1
+
+    def undo(self):
+        if self.can_undo:
+            self.position -= 1
+
+    def redo(self):
+        if self.can_redo:
+            self.position += 1
+
+JOB_WORKERS = 8
+
+class Job:
+    """A long-running operation executed off the Streamlit script thread"""
+
+    def __init__(self, kind: str, label: str):
+        self.id = uuid.uuid4().hex[:8]
+        self.kind = kind
+        self.label = label
+        self.status = "queued"
+        self.progress = 0.0
+        self.message = ""
+        self.result = None
+        self.error = None
+        self.log = LogBuffer()
+        self.cancel_event = threading.Event()
+        self.partial = {}
+        self.context = {}
+        self.applied = False
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def active(self) -> bool:
+        return self.status in ("queued", "running")
+
+    @property
+    def elapsed(self) -> float:
+        if not self.started_at:
+            return 0.0
+        return round((self.finished_at or time.time()) - self.started_at, 1)
+
+    def cancel(self):
+        """Ask the job to stop; running commands are killed at their next poll"""
+        self.cancel_event.set()
+        self.message = "Cancelling..."
+
+    def update(self, progress: Optional[float] = None, message: Optional[str] = None):
+        if progress is not None:
+            self.progress = max(0.0, min(1.0, progress))
+        if message is not None:
+            self.message = message
+
+@st.cache_resource
+def get_job_pool() -> ThreadPoolExecutor:
+    """Process-wide pool running background jobs for all sessions"""
+    return ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="singularity-job")
+
+def submit_job(kind: str, label: str, fn, *args, **context) -> Job:
+    """Queue fn(job, *args) on the job pool and track it in session state
+
+    Worker functions must not touch st.* APIs; keyword arguments are kept on the
+    job as context for applying the result back in the script thread.
+    """
+    job = Job(kind, label)
+    job.context = context
+    st.session_state.jobs[job.id] = job
+    
+    def run():
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            if not job.cancel_event.is_set():
+                job.result = fn(job, *args)
+            if job.cancel_event.is_set():
+                job.error = "Cancelled"
+                job.status = "cancelled"
+            else:
+                job.status = "done"
+                job.progress = 1.0
+        except Exception as e:
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.log.close()
+            job.finished_at = time.time()
+    
+    get_job_pool().submit(run)
+    return job
+
+def run_build(job: Job, project_path: str, build_commands: List[str]) -> Dict:
+    """Run build commands in order, streaming their output into the job log"""
+    build_success = True
+    build_output = ""
+    
+    for index, cmd in enumerate(build_commands):
+        if job.cancel_event.is_set():
+            build_success = False
+            break
+        job.update(index / max(len(build_commands), 1), f"$ {cmd}")
+        job.log.append(f"$ {cmd}")
+        result = run_command(
+            cmd, project_path,
+            on_line=lambda stream, line: job.log.append(line),
+            limits={"timeout": 60},
+            cancel=job.cancel_event
+        )
+        build_output += f"$ {cmd}\n{result['stdout']}\n"
+        if result["returncode"] != 0:
+            build_success = False
+            build_output += f"Error: {result['stderr']}\n"
+    
+    return {
+        "success": build_success,
+        "output": build_output
+    }
+
+def run_build_job(job: Job, workspace: WorkspaceLease, project_data: Dict, use_cache: bool = True) -> Dict:
+    """Sync the workspace and build the project, reusing a cached build of identical inputs"""
+    job.update(message="Syncing workspace")
+    project_path = workspace.materialize(project_data)
+    build_commands = project_data.get('build_commands', [])
+    if not use_cache:
+        return run_build(job, project_path, build_commands)
+    
+    cache = get_build_cache()
+    key = cache.make_key(project_data['files'], build_commands)
+    cached = cache.get(key, project_path)
+    if cached:
+        job.log.append(f"Build cache hit ({cached['artifacts']} artifacts restored)")
+        return cached
+    
+    before = snapshot_tree(project_path)
+    result = run_build(job, project_path, build_commands)
+    if result["success"]:
+        cache.put(key, result, project_path, before, project_data['files'])
+    return result
+
+def run_test_job(job: Job, oracle, workspace: WorkspaceLease, project_data: Dict, language: str) -> Dict:
+    """Sync the workspace and run the project's test commands"""
+    job.update(message="Syncing workspace")
+    project_path = workspace.materialize(project_data)
+    job.update(message="Running tests")
+    
+    def collect(event, payload):
+        cmd, stream, line = payload
+        job.log.append(f"[{cmd}] {line}")
+    
+    return oracle.run_tests(
+        project_path, language, project_data.get('test_commands', []), on_event=collect, cancel=job.cancel_event
+    )
+
+def run_debug_job(job: Job, oracle, workspace: WorkspaceLease, project_data: Dict, test_results: Dict,
+                  max_iterations: int, language: str) -> Dict:
+    """Run the bounded debug loop against the session workspace"""
+    job.update(message="Debugging")
+    return oracle.debug_and_fix(
+        project_data,
+        test_results,
+        max_iterations,
+        workspace=workspace,
+        language=language
+    )
+
+def run_refactor_job(job: Job, oracle, project_data: Dict, objectives: List[str], max_concurrency: int) -> Dict:
+    """Fan refactor objectives out concurrently, reporting each as it completes"""
+    job.update(message=f"0/{len(objectives)} objectives done")
+    
+    def report(objective, result):
+        done = len(job.partial) + 1
+        job.partial[objective] = result
+        job.update(done / len(objectives), f"{done}/{len(objectives)} objectives done")
+    
+    return oracle.refactor_many(project_data, objectives, max_concurrency, on_result=report)
+
+def run_generation(job: Job, oracle, prompt: str, language: str, architecture: str, stream: bool) -> Dict:
+    """Generate a project, exposing files in job.partial as they stream in"""
+    if not stream:
+        job.update(message="Waiting for the model...")
+        return oracle.generate_project(prompt, language, architecture, raise_errors=True)
+    
+    project_data, error = None, None
+    for event, payload in oracle.generate_project_stream(prompt, language, architecture):
+        if event == "file":
+            filename, content = payload
+            job.partial[filename] = content
+            job.update(message=f"{len(job.partial)} files received")
+        elif event == "error":
+            error = payload
+        else:
+            project_data = payload
+    
+    if project_data is None:
+        raise RuntimeError(error or "Generation failed")
+    return project_data
+
+BATCH_ROOT = os.path.join(tempfile.gettempdir(), "singularity-ai-batches")
+BATCH_MAX_ROWS = 200
+
+def parse_batch_specs(data: bytes, filename: str, language: str, architecture: str) -> List[Dict]:
+    """Read prompt/language/architecture rows from a CSV or JSONL upload
+
+    Missing language or architecture cells fall back to the sidebar selection;
+    a row without a prompt raises ValueError naming its line.
+    """
+    text = data.decode('utf-8-sig')
+    if filename.lower().endswith(('.jsonl', '.ndjson')):
+        rows = []
+        for number, line in enumerate(text.splitlines(), 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Line {number}: invalid JSON ({e.msg})")
+            if not isinstance(row, dict):
+                raise ValueError(f"Line {number}: expected a JSON object")
+            rows.append((number, row))
+    else:
+        reader = csv.DictReader(io.StringIO(text))
+        rows = [
+            (reader.line_num, {str(key).strip().lower(): value for key, value in row.items() if key})
+            for row in reader
+        ]
+    
+    specs = []
+    for number, row in rows:
+        prompt = str(row.get("prompt") or "").strip()
+        if not prompt:
+            raise ValueError(f"Line {number}: missing prompt")
+        specs.append({
+            "prompt": prompt,
+            "language": str(row.get("language") or "").strip() or language,
+            "architecture": str(row.get("architecture") or "").strip() or architecture
+        })
+    
+    if not specs:
+        raise ValueError("No rows found")
+    if len(specs) > BATCH_MAX_ROWS:
+        raise ValueError(f"At most {BATCH_MAX_ROWS} rows per batch")
+    return specs
+
+def _run_batch_item(oracle, spec: Dict, project_path: str, build_and_test: bool, row: Dict) -> Dict:
+    """Generate, materialize and optionally build and test one batch row, updating its status row"""
+    row["Status"] = "generating"
+    project_data = oracle.generate_project(spec["prompt"], spec["language"], spec["architecture"], raise_errors=True)
+    row["Project"] = project_data["project_name"]
+    row["Files"] = len(project_data["files"])
     
-    def explain_code(self, code: str, language: str) -> str:
-        """Provide detailed code explanation"""
-        
-        prompt = f"""
-        Explain this {language} code line by line with:
-        1. What each function/class does
-        2. Time/space complexity analysis
-        3. Alternative approaches
-        4. How a senior developer would improve it
-        5. Potential issues or edge cases
-        
-        Code:
-        {code}
-        """
+    errors = create_project_files(project_data, project_path)
+    if errors:
+        row["Error"] = "; ".join(errors)[:200]
+    
+    if build_and_test:
+        row["Status"] = "building"
+        build_ok = all(
+            run_command(cmd, project_path, limits={"timeout": 60})["returncode"] == 0
+            for cmd in project_data.get('build_commands', [])
+        )
+        row["Build"] = "✅" if build_ok else "❌"
         
+        row["Status"] = "testing"
+        test_results = oracle.run_tests(project_path, spec["language"], project_data.get('test_commands', []))
+        row["Tests"] = "✅" if test_results["success"] else "❌"
+    
+    return project_data
+
+def run_batch_job(job: Job, oracle, specs: List[Dict], max_concurrency: int, build_and_test: bool) -> Dict:
+    """Generate every batch row concurrently under the request governor and bundle the results
+
+    Rows live in job.partial so the jobs panel can show a progress table; the
+    result holds one archive with a directory per project plus a summary report.
+    """
+    batch_path = os.path.join(BATCH_ROOT, job.id)
+    for index, spec in enumerate(specs, 1):
+        job.partial[index] = {
+            "#": index, "Prompt": spec["prompt"][:60], "Language": spec["language"], "Status": "queued",
+            "Project": "", "Files": 0, "Build": "", "Tests": "", "Seconds": 0.0, "Error": ""
+        }
+    
+    def run(index, spec):
+        row = job.partial[index]
+        started = time.time()
         try:
-            response = self.model.generate_content(prompt)
-            return response.text
+            project_data = _run_batch_item(oracle, spec, os.path.join(batch_path, str(index)), build_and_test, row)
+            row["Status"] = "done"
+            return index, project_data
         except Exception as e:
-            return f"Explanation failed: {str(e)}"
+            row["Status"] = "failed"
+            row["Error"] = str(e)[:200]
+            return index, None
+        finally:
+            row["Seconds"] = round(time.time() - started, 1)
     
-    def security_scan(self, project_data: Dict, language: str) -> Dict:
-        """Perform security analysis"""
+    projects = {}
+    job.update(0.0, f"0/{len(specs)} projects done")
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(specs)))) as pool:
+            futures = [pool.submit(run, index, spec) for index, spec in enumerate(specs, 1)]
+            for done, future in enumerate(as_completed(futures), 1):
+                index, project_data = future.result()
+                if project_data:
+                    projects[index] = project_data
+                job.update(done / len(specs), f"{done}/{len(specs)} projects done")
+    finally:
+        shutil.rmtree(batch_path, ignore_errors=True)
+    
+    rows = [job.partial[index] for index in sorted(job.partial)]
+    lines = [
+        "# Batch Generation Summary",
+        "",
+        f"{len(projects)}/{len(specs)} projects generated.",
+        "",
+        "| # | Project | Language | Files | Build | Tests | Seconds | Error |",
+        "|---|---------|----------|-------|-------|-------|---------|-------|"
+    ]
+    for row in rows:
+        error = row["Error"].replace("|", "\\|").replace("\n", " ")
+        lines.append(
+            f"| {row['#']} | {row['Project']} | {row['Language']} | {row['Files']} | {row['Build']} | "
+            f"{row['Tests']} | {row['Seconds']} | {error} |"
+        )
+    summary = "\n".join(lines) + "\n"
+    
+    bundle = {"BATCH_SUMMARY.md": summary, "batch_summary.json": json.dumps(rows, indent=2)}
+    for index, project_data in projects.items():
+        folder = f"{index:03d}-{_safe_slug(project_data['project_name'])}"
+        for filename, content in project_data["files"].items():
+            if is_safe_project_path(filename):
+                bundle[f"{folder}/{posixpath.normpath(filename)}"] = content
+    
+    archive = io.BytesIO()
+    write_project_archive(bundle, archive, "zip")
+    
+    return {"rows": rows, "summary": summary, "archive": archive.getvalue(), "generated": len(projects)}
+
+class MetricsHistory:
+    """Append-only SQLite time series of per-project build, test, scan and latency metrics"""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS samples (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    ts REAL NOT NULL,
+                    project TEXT NOT NULL,
+                    revision TEXT,
+                    metric TEXT NOT NULL,
+                    value REAL NOT NULL,
+                    label TEXT
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_samples_series ON samples(project, metric, ts)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def record(self, project: str, revision: str, samples: List[Tuple[str, float]], ts: Optional[float] = None,
+               label: Optional[str] = None):
+        """Append (metric, value) samples for one project revision"""
+        ts = ts or time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO samples (ts, project, revision, metric, value, label) VALUES (?, ?, ?, ?, ?, ?)",
+                [(ts, project, revision, metric, float(value), label) for metric, value in samples]
+            )
+
+    def query(self, project: str, metrics: List[str], start: float, end: Optional[float] = None,
+              max_points: int = 200) -> pd.DataFrame:
+        """Downsampled range query: one averaged point per time bucket and metric"""
+        end = end or time.time()
+        bucket = max(1.0, (end - start) / max_points)
+        placeholders = ",".join("?" for _ in metrics)
         
-        prompt = f"""
-        Perform a comprehensive security analysis of this {language} project using OWASP guidelines:
+        with self._connect() as conn:
+            rows = conn.execute(f"""
+                SELECT CAST(ts / ? AS INTEGER) * ? AS bucket, metric, AVG(value), MIN(value), MAX(value), COUNT(*)
+                FROM samples
+                WHERE project = ? AND metric IN ({placeholders}) AND ts BETWEEN ? AND ?
+                GROUP BY bucket, metric
+                ORDER BY bucket
+            """, (bucket, bucket, project, *metrics, start, end)).fetchall()
         
-        {json.dumps(project_data['files'], indent=2)}
+        frame = pd.DataFrame(rows, columns=["bucket", "metric", "value", "min", "max", "samples"])
+        frame["time"] = pd.to_datetime(frame["bucket"], unit="s")
+        return frame
+
+    def events(self, project: str, limit: int = 20) -> List[Tuple[float, str, str, float]]:
+        """Most recent (ts, revision, event, success) rows for the project timeline"""
+        with self._connect() as conn:
+            return conn.execute("""
+                SELECT ts, revision, label, value FROM samples
+                WHERE project = ? AND metric = 'event'
+                ORDER BY ts DESC LIMIT ?
+            """, (project, limit)).fetchall()
+
+@st.cache_resource
+def get_metrics_history() -> MetricsHistory:
+    """Process-wide metrics history store"""
+    return MetricsHistory(os.path.join(CACHE_DIR, "metrics_history.sqlite"))
+
+# Timeline label per job kind
+JOB_EVENT_LABELS = {
+    "generate": "Generated", "build": "Built", "test": "Tested", "debug": "Debugged",
+    "scan": "Scanned", "refactor": "Refactored", "cicd": "CI/CD generated"
+}
+
+def job_succeeded(job: Job) -> bool:
+    """Whether a finished job achieved its goal, judged from its result rather than only from not raising"""
+    if job.status != "done" or job.result is None:
+        return False
+    result = job.result
+    if job.kind == "refactor":
+        return bool(result) and all(item.get("success") for item in result.values())
+    if job.kind == "cicd":
+        return not str(result).startswith("CI/CD generation failed")
+    if isinstance(result, dict):
+        if result.get("error") or not result.get("success", True):
+            return False
+        if job.kind == "debug":
+            # A debug round that ran but left failing tests did not fix the project
+            return not (result.get("test_results") or {}).get("failed_tests")
+    return True
+
+def record_job_metrics(job: Job):
+    """Append a finished job's real measurements to the metrics history"""
+    project = job.context.get("project")
+    produced = None
+    if job.kind == "generate" and job.status == "done":
+        produced = job.result
+    elif job.kind == "debug" and job.status == "done" and job.result["success"]:
+        produced = job.result["updated_project"]
+    project = produced or project
+    if not project:
+        return
+    
+    done = job.status == "done"
+    samples = [(f"{job.kind}_duration", job.elapsed)]
+    
+    if done and job.kind == "build":
+        samples.append(("build_success", 1.0 if job.result["success"] else 0.0))
+    elif done and job.kind == "test":
+        summary = job.result.get("summary") or {}
+        if summary.get("total"):
+            samples.append(("test_pass_rate", 100.0 * summary["passed"] / summary["total"]))
+            samples.append(("test_count", summary["total"]))
+        else:
+            commands = len(project.get('test_commands', [])) or 1
+            samples.append(("test_pass_rate", 100.0 * (1 - len(job.result["failed_tests"]) / commands)))
+        if job.result.get("coverage") is not None:
+            samples.append(("test_coverage", job.result["coverage"]))
+    elif done and job.kind == "scan" and job.result["success"]:
+        samples.append(("scan_findings", len(job.result["findings"])))
+        samples.append(("scan_critical_high", job.result["counts"]["Critical"] + job.result["counts"]["High"]))
+    elif produced:
+        metrics = get_metrics_engine().project_metrics(project)
+        samples.append(("avg_complexity", metrics["avg_complexity"]))
+        samples.append(("sloc", metrics["sloc"]))
+        samples.append(("health_score", health_score(metrics, None, None)))
+    
+    samples.append(("event", 1.0 if job_succeeded(job) else 0.0))
+    get_metrics_history().record(
+        project.get('project_name', 'project'),
+        project_content_hash(project['files'])[:12],
+        samples,
+        ts=job.finished_at,
+        label=JOB_EVENT_LABELS.get(job.kind, job.kind)
+    )
+
+def apply_finished_jobs():
+    """Move results of finished jobs into session state (runs in the script thread)"""
+    for job in st.session_state.jobs.values():
+        if job.active or job.applied:
+            continue
+        job.applied = True
+        record_job_metrics(job)
         
-        Identify:
-        1. Security vulnerabilities
-        2. Input validation issues
-        3. Authentication/authorization flaws
-        4. Data exposure risks
-        5. Dependency vulnerabilities
+        if job.status in ("failed", "cancelled"):
+            st.session_state.job_errors.append(f"{job.label}: {job.error}")
+            if job.kind == "generate":
+                st.session_state.generation_status = "error"
+            continue
         
-        Return findings with severity levels and suggested fixes.
-        """
+        if job.kind == "generate":
+            st.session_state.project_history.commit(job.result, JOB_EVENT_LABELS["generate"])
+            st.session_state.generation_status = "success"
+        elif job.kind == "build":
+            st.session_state.build_output = job.result
+        elif job.kind == "test":
+            st.session_state.test_results = job.result
+        elif job.kind == "debug":
+            if job.result["success"]:
+                st.session_state.project_history.commit(job.result["updated_project"], JOB_EVENT_LABELS["debug"])
+                st.session_state.test_results = job.result["test_results"]
+            st.session_state.debug_result = {key: value for key, value in job.result.items() if key != "updated_project"}
+        elif job.kind == "scan":
+            st.session_state.security_report = job.result
+        elif job.kind == "refactor":
+            history = st.session_state.project_history
+            base = job.context["project"]
+            for objective, result in job.result.items():
+                if result["success"]:
+                    # Keep the refactored project in the store and only its revision ID in the session
+                    previous = st.session_state.refactor_results.get(objective)
+                    history.unstash(previous and previous["revision"])
+                    revision = history.stash({**base, "files": {**base["files"], **result["files"]}})
+                    st.session_state.refactor_results[objective] = {
+                        **{key: value for key, value in result.items() if key != "files"},
+                        "revision": revision
+                    }
+                else:
+                    st.session_state.job_errors.append(f"Refactor ({objective}): {result['error']}")
+        elif job.kind == "cicd":
+            st.session_state.cicd_configs[job.context["platform"]] = job.result
+        elif job.kind == "batch":
+            st.session_state.batch_result = job.result
         
-        try:
-            response = self.model.generate_content(prompt)
-            return {"success": True, "report": response.text}
-        except Exception as e:
-            return {"success": False, "error": str(e)}
+        # Projects now live in the store; don't keep extra copies alive on finished jobs
+        job.context.pop("project", None)
+        if job.kind in ("generate", "debug", "refactor"):
+            job.result = None
+            job.partial = {}
+
+# Jobs whose commands watch job.cancel_event
+CANCELLABLE_JOBS = {"build", "test"}
+
+def render_jobs_panel():
+    """Live view of this session's background jobs, refreshed while any are active"""
+    jobs = list(st.session_state.jobs.values())
+    active = any(job.active for job in jobs)
     
-    def generate_cicd(self, project_data: Dict, language: str, platform: str) -> str:
-        """Generate CI/CD configuration"""
+    @st.fragment(run_every=1.5 if active else None)
+    def jobs_fragment():
+        current = list(st.session_state.jobs.values())
+        if any(not job.active and not job.applied for job in current):
+            st.rerun()
         
-        prompt = f"""
-        Generate {platform} CI/CD configuration for this {language} project:
+        for error in st.session_state.job_errors:
+            st.error(f"⚠️ {error}")
+        st.session_state.job_errors = []
         
-        Project: {project_data['project_name']}
-        Dependencies: {project_data['dependencies']}
-        Build Commands: {project_data['build_commands']}
-        Test Commands: {project_data['test_commands']}
+        recent = [job for job in current if job.active or time.time() - (job.finished_at or 0) < 30]
+        if not recent:
+            return
         
-        Include:
-        1. Build pipeline
-        2. Test automation
-        3. Security scanning
-        4. Deployment steps
-        5. Environment management
+        with st.expander(f"⏳ Background Jobs ({sum(job.active for job in current)} active)", expanded=True):
+            st.dataframe(pd.DataFrame([
+                {
+                    "Job": job.id,
+                    "Operation": job.label,
+                    "Status": job.status,
+                    "Progress": f"{round(job.progress * 100)}%",
+                    "Elapsed (s)": job.elapsed,
+                    "Message": job.message
+                }
+                for job in recent
+            ]), use_container_width=True)
+            
+            for job in recent:
+                if not job.active:
+                    continue
+                if job.kind == "batch":
+                    st.markdown(f"**📦 {job.label}**")
+                    st.dataframe(
+                        pd.DataFrame([job.partial[index] for index in sorted(job.partial)]),
+                        use_container_width=True,
+                        hide_index=True
+                    )
+                elif job.kind == "generate" and job.partial:
+                    received = list(job.partial.keys())
+                    st.markdown(f"**📡 {job.label}:** `{len(received)}` files received so far")
+                    live_file = st.selectbox("View file:", received, index=len(received) - 1, key=f"live_file_browser_{job.id}")
+                    file_ext = live_file.split('.')[-1] if '.' in live_file else 'text'
+                    st.code(job.partial[live_file], language=file_ext)
+                elif job.kind in CANCELLABLE_JOBS:
+                    if st.button(f"⏹️ Cancel {job.label}", key=f"cancel_job_{job.id}"):
+                        job.cancel()
+    
+    jobs_fragment()
+
+def render_job_log(kind: str):
+    """Live log of this session's latest job of a kind, with cancel while it runs and the full log once done"""
+    jobs = [job for job in st.session_state.jobs.values() if job.kind == kind]
+    if not jobs:
+        return
+    job = max(jobs, key=lambda j: j.created_at)
+    
+    @st.fragment(run_every=1.0 if job.active else None)
+    def log_fragment():
+        if not job.active and not job.applied:
+            st.rerun()
+        if job.active:
+            col1, col2 = st.columns([3, 1])
+            with col1:
+                st.markdown(f"**📜 {job.label}** • {job.status} • {job.elapsed}s • {len(job.log)} lines")
+            with col2:
+                if kind in CANCELLABLE_JOBS and st.button("⏹️ Cancel", key=f"cancel_{kind}_{job.id}"):
+                    job.cancel()
+            st.code("\n".join(job.log.last(200)) or "Waiting for output...", language="bash")
+        elif job.log.path:
+            st.download_button(
+                label=f"📥 Full {kind} log ({job.log.lines} lines)",
+                data=job.log.full_text(),
+                file_name=f"{kind}-{job.id}.log",
+                mime="text/plain",
+                key=f"download_log_{job.id}"
+            )
+    
+    log_fragment()
+
+# Archive formats offered for project export: label -> (extension, mime type)
+ARCHIVE_FORMATS = {
+    "zip": (".zip", "application/zip"),
+    "zip-store": (".zip", "application/zip"),
+    "tar.gz": (".tar.gz", "application/gzip")
+}
+
+def project_content_hash(files: Dict[str, str]) -> str:
+    """Stable hash of a project's file names and contents"""
+    digest = hashlib.sha256()
+    for filename in sorted(files):
+        digest.update(filename.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(files[filename].encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+def write_project_archive(files: Dict[str, str], fileobj, archive_format: str = "zip", compression_level: int = 6):
+    """Write a project archive to a binary file object, compressing file by file"""
+    if archive_format == "tar.gz":
+        with tarfile.open(fileobj=fileobj, mode='w:gz', compresslevel=compression_level) as tar_file:
+            for filename, content in files.items():
+                data = content.encode('utf-8')
+                info = tarfile.TarInfo(name=filename)
+                info.size = len(data)
+                info.mtime = int(time.time())
+                tar_file.addfile(info, io.BytesIO(data))
+    else:
+        compression = zipfile.ZIP_STORED if archive_format == "zip-store" else zipfile.ZIP_DEFLATED
+        with zipfile.ZipFile(fileobj, 'w', compression, compresslevel=compression_level) as zip_file:
+            for filename, content in files.items():
+                zip_file.writestr(filename, content)
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def _build_archive(content_hash: str, archive_format: str, compression_level: int, _files: Dict[str, str]) -> bytes:
+    """Build an archive in memory; memoized on the project content hash"""
+    buffer = io.BytesIO()
+    write_project_archive(_files, buffer, archive_format, compression_level)
+    return buffer.getvalue()
+
+def create_zip_download(project_data: Dict, archive_format: str = "zip", compression_level: int = 6) -> bytes:
+    """Create downloadable archive, reusing the previous one while the files are unchanged"""
+    files = project_data["files"]
+    return _build_archive(project_content_hash(files), archive_format, compression_level, files)
+
+# Project browser: one directory level rendered at a time, large files paged, search over an inverted index
+BROWSER_PAGE_LINES = 400
+BROWSER_DIR_PAGE = 50
+SEARCH_RESULT_LIMIT = 100
+
+def trigrams(text: str) -> set:
+    """Distinct lowercased 3-character substrings, the keys of the search index"""
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class ProjectIndex:
+    """Directory tree and trigram -> files inverted index, updated only for files whose hash changed"""
+
+    def __init__(self):
+        self.hashes = {}
+        self.grams = {}
+        self.postings = {}
+        self.tree = {}
+        self._files = None
+
+    def update(self, files: Dict[str, str]) -> int:
+        """Sync with the project's files, returning how many were (re)indexed"""
+        if files is self._files:
+            return 0
+        self._files = files
         
-        Platform: {platform}
-        """
+        changed = 0
+        for filename in set(self.hashes) - set(files):
+            self._remove(filename)
+            changed += 1
+        for filename, content in files.items():
+            content_hash = hashlib.sha1(content.encode('utf-8')).hexdigest()
+            if self.hashes.get(filename) == content_hash:
+                continue
+            self._remove(filename)
+            self.hashes[filename] = content_hash
+            self.grams[filename] = trigrams(content)
+            for gram in self.grams[filename]:
+                self.postings.setdefault(gram, set()).add(filename)
+            changed += 1
         
-        try:
-            response = self.model.generate_content(prompt)
-            return response.text
-        except Exception as e:
-            return f"CI/CD generation failed: {str(e)}"
+        if changed:
+            self.tree = {}
+            for filename in files:
+                parts = filename.split('/')
+                for depth in range(len(parts)):
+                    parent = '/'.join(parts[:depth])
+                    entry = self.tree.setdefault(parent, (set(), []))
+                    if depth < len(parts) - 1:
+                        entry[0].add('/'.join(parts[:depth + 1]))
+                    else:
+                        entry[1].append(filename)
+        return changed
 
-def create_project_files(project_data: Dict, base_path: str):
-    """Create actual files from project data"""
-    # Ensure base directory exists
-    os.makedirs(base_path, exist_ok=True)
-    
-    for filename, content in project_data["files"].items():
-        file_path = os.path.join(base_path, filename)
+    def _remove(self, filename: str):
+        for gram in self.grams.pop(filename, ()):
+            postings = self.postings.get(gram)
+            if postings:
+                postings.discard(filename)
+                if not postings:
+                    del self.postings[gram]
+        self.hashes.pop(filename, None)
+
+    def listing(self, directory: str) -> Tuple[List[str], List[str]]:
+        """Immediate subdirectories and files of a directory ('' is the project root)"""
+        subdirs, files = self.tree.get(directory, (set(), []))
+        return sorted(subdirs), sorted(files)
+
+    def count_files(self, directory: str) -> int:
+        prefix = directory + '/'
+        return sum(1 for filename in self.hashes if filename.startswith(prefix))
+
+    def search(self, files: Dict[str, str], query: str, limit: int = SEARCH_RESULT_LIMIT) -> List[Dict]:
+        """Case-insensitive substring matches, scanning only files that contain every trigram of the query
+
+        Queries shorter than three characters have no trigrams and scan every file.
+        """
+        needle = query.strip().lower()
+        if not needle:
+            return []
         
-        # Create directory if filename contains subdirectories
-        file_dir = os.path.dirname(file_path)
-        if file_dir and file_dir != base_path:
-            os.makedirs(file_dir, exist_ok=True)
+        candidates = None
+        for gram in sorted(trigrams(needle), key=lambda gram: len(self.postings.get(gram, ()))):
+            candidates = set(self.postings.get(gram, ())) if candidates is None else candidates & self.postings.get(gram, set())
+            if not candidates:
+                return []
         
-        try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(content)
-        except Exception as e:
-            st.error(f"Failed to create file {filename}: {str(e)}")
-            continue
+        results = []
+        for filename in sorted(files if candidates is None else candidates):
+            for number, line in enumerate(files[filename].splitlines(), 1):
+                if needle in line.lower():
+                    results.append({"file": filename, "line": number, "text": line.strip()[:200]})
+                    if len(results) >= limit:
+                        return results
+        return results
 
-def create_zip_download(project_data: Dict) -> bytes:
-    """Create downloadable zip file"""
-    zip_buffer = tempfile.NamedTemporaryFile(delete=False, suffix='.zip')
+def render_project_browser(project: Dict):
+    """File tree, paged viewer and indexed search for the current project"""
+    files = project['files']
+    index = st.session_state.project_index
+    index.update(files)
     
-    with zipfile.ZipFile(zip_buffer.name, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-        for filename, content in project_data["files"].items():
-            zip_file.writestr(filename, content)
+    if st.session_state.browser_dir and st.session_state.browser_dir not in index.tree:
+        st.session_state.browser_dir = ""
+    if st.session_state.browser_file not in files:
+        st.session_state.browser_file = None
+    
+    # Search
+    query = st.text_input("🔎 Search files:", key="browser_search", placeholder="Identifier or text")
+    if query:
+        matches = index.search(files, query)
+        if matches:
+            st.caption(f"{len(matches)}{'+' if len(matches) >= SEARCH_RESULT_LIMIT else ''} matches")
+            st.dataframe(pd.DataFrame(matches), use_container_width=True, hide_index=True, height=min(300, 40 + 35 * len(matches)))
+            target = st.selectbox(
+                "Open match:", [None] + matches,
+                format_func=lambda match: "—" if match is None else f"{match['file']}:{match['line']}",
+                key="browser_search_target"
+            )
+            if target and (target["file"], target["line"]) != st.session_state.browser_opened_match:
+                st.session_state.browser_opened_match = (target["file"], target["line"])
+                st.session_state.browser_file = target["file"]
+                st.session_state.browser_dir = posixpath.dirname(target["file"])
+                st.session_state.browser_page = (target["line"] - 1) // BROWSER_PAGE_LINES + 1
+                st.rerun()
+        else:
+            st.caption("No matches")
+    
+    tree_col, view_col = st.columns([1, 3])
     
-    with open(zip_buffer.name, 'rb') as f:
-        zip_data = f.read()
+    with tree_col:
+        directory = st.session_state.browser_dir
+        parts = directory.split('/') if directory else []
+        crumbs = [""] + ['/'.join(parts[:depth + 1]) for depth in range(len(parts))]
+        crumb_cols = st.columns(len(crumbs))
+        for crumb, column in zip(crumbs, crumb_cols):
+            with column:
+                if st.button(posixpath.basename(crumb) or "📦 root", key=f"crumb_{crumb}"):
+                    st.session_state.browser_dir = crumb
+                    st.rerun()
+        
+        subdirs, dir_files = index.listing(directory)
+        entries = [("dir", name) for name in subdirs] + [("file", name) for name in dir_files]
+        pages = max(1, math.ceil(len(entries) / BROWSER_DIR_PAGE))
+        dir_page = st.number_input("Page", 1, pages, 1, key=f"browser_dir_page_{directory}") if pages > 1 else 1
+        
+        for kind, name in entries[(dir_page - 1) * BROWSER_DIR_PAGE:dir_page * BROWSER_DIR_PAGE]:
+            if kind == "dir":
+                label = f"📁 {posixpath.basename(name)} ({index.count_files(name)})"
+            else:
+                label = f"{'▶️' if name == st.session_state.browser_file else '📄'} {posixpath.basename(name)}"
+            if st.button(label, key=f"browser_{kind}_{name}"):
+                if kind == "dir":
+                    st.session_state.browser_dir = name
+                else:
+                    st.session_state.browser_file = name
+                    st.session_state.browser_page = 1
+                st.rerun()
     
-    os.unlink(zip_buffer.name)
-    return zip_data
+    with view_col:
+        selected_file = st.session_state.browser_file
+        if not selected_file:
+            st.caption(f"{len(files)} files • select a file to view it")
+            return
+        
+        lines = files[selected_file].splitlines()
+        pages = max(1, math.ceil(len(lines) / BROWSER_PAGE_LINES))
+        page = min(max(1, st.session_state.browser_page), pages)
+        if pages > 1:
+            # Widget state is dropped on runs where it isn't rendered, so the page lives in browser_page
+            st.session_state.browser_page_input = page
+            page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, step=1, key="browser_page_input",
+                                   on_change=lambda: setattr(st.session_state, 'browser_page', st.session_state.browser_page_input))
+        st.session_state.browser_page = page
+        
+        first = (page - 1) * BROWSER_PAGE_LINES
+        st.markdown(f"**{selected_file}** • lines {first + 1}–{min(first + BROWSER_PAGE_LINES, len(lines))} of {len(lines)}")
+        file_ext = selected_file.split('.')[-1] if '.' in selected_file else 'text'
+        st.code("\n".join(lines[first:first + BROWSER_PAGE_LINES]), language=file_ext)
+
+def current_project() -> Optional[Dict]:
+    """The session's current project revision, loaded from the project store"""
+    return st.session_state.project_history.project()
 
 # Initialize session state variables to prevent reruns
 def init_session_state():
     """Initialize all session state variables"""
+    if 'session_id' not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+    if 'workspace' not in st.session_state:
+        st.session_state.workspace = WorkspaceLease(get_workspace_manager(), st.session_state.session_id)
     if 'oracle' not in st.session_state:
         st.session_state.oracle = None
-    if 'current_project' not in st.session_state:
-        st.session_state.current_project = None
+    if 'project_history' not in st.session_state:
+        st.session_state.project_history = ProjectHistory(get_project_store())
     if 'test_results' not in st.session_state:
         st.session_state.test_results = None
     if 'generation_status' not in st.session_state:
@@ -520,8 +4810,20 @@ def init_session_state():
         st.session_state.refactor_results = {}
     if 'explanations' not in st.session_state:
         st.session_state.explanations = {}
-    if 'project_metrics' not in st.session_state:
-        st.session_state.project_metrics = {}
+    if 'jobs' not in st.session_state:
+        st.session_state.jobs = {}
+    if 'job_errors' not in st.session_state:
+        st.session_state.job_errors = []
+    if 'debug_result' not in st.session_state:
+        st.session_state.debug_result = None
+    if 'batch_result' not in st.session_state:
+        st.session_state.batch_result = None
+    if 'project_index' not in st.session_state:
+        st.session_state.project_index = ProjectIndex()
+        st.session_state.browser_dir = ""
+        st.session_state.browser_file = None
+        st.session_state.browser_page = 1
+        st.session_state.browser_opened_match = None
     # New authentication states for Singularity-AI app
     if "singularity_app_authenticated" not in st.session_state:
         st.session_state.singularity_app_authenticated = False
@@ -604,7 +4906,10 @@ def main():
 
         # Initialize CodeOracle only once
         if st.session_state.oracle is None:
-            st.session_state.oracle = CodeOracle(api_key)
+            st.session_state.oracle = CodeOracle(
+                api_key, cache=get_response_cache(), telemetry=get_llm_telemetry(), governor=get_request_governor(),
+                contexts=get_context_manager()
+            )
             st.success("✅ Singularity-AI Initialized!")
         
         # Language selection
@@ -626,10 +4931,41 @@ def main():
         max_debug_iterations = st.slider("Max Debug Iterations", 1, 10, 3, key="debug_iter")
         auto_test = st.checkbox("Auto-run tests", value=True, key="auto_test")
         auto_debug = st.checkbox("Auto-debug failures", value=True, key="auto_debug")
+        stream_generation = st.checkbox("Stream generation", value=True, key="stream_generation")
+        st.session_state.oracle.use_cache = st.checkbox("Use response cache", value=True, key="use_response_cache")
+        
+        model_tier = st.selectbox(
+            "🧭 Model Routing",
+            ["auto"] + list(MODEL_TIERS),
+            format_func=lambda tier: "Auto (per operation)" if tier == "auto" else f"{tier} • {MODEL_TIERS[tier]}",
+            key="model_tier_select"
+        )
+        st.session_state.oracle.router.override = None if model_tier == "auto" else model_tier
+        st.session_state.oracle.router.adaptive = st.checkbox(
+            "Fall back to faster models on SLO breach", value=True, key="adaptive_routing"
+        )
+        
+        if st.session_state.oracle.cache:
+            cache_stats = st.session_state.oracle.cache.stats()
+            st.caption(
+                f"🗄️ Response cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses "
+                f"({cache_stats['hit_rate']}%) • {cache_stats['entries']} entries"
+            )
+        build_cache_stats = get_build_cache().stats()
+        st.caption(f"🏗️ Build cache: {build_cache_stats['entries']} builds • {build_cache_stats['size_mb']} MB")
+        project_store_stats = get_project_store().stats()
+        st.caption(
+            f"🗃️ Project store: {project_store_stats['revisions']} revisions • {project_store_stats['blobs']} blobs • "
+            f"{project_store_stats['stored_mb']} MB ({project_store_stats['ratio']}x dedup + compression)"
+        )
+    
+    # Pull in results of background jobs that finished since the last run
+    apply_finished_jobs()
+    render_jobs_panel()
     
     # Main interface tabs
-    tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
-        "✨ Generate", "🔧 Build & Test", "🔍 Analysis", "📊 Dashboard", "🛡️ Security", "🎉 Deploy"
+    tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs([
+        "✨ Generate", "🔧 Build & Test", "🔍 Analysis", "📊 Dashboard", "🛡️ Security", "🎉 Deploy", "📡 Ops"
     ])
     
     with tab1:
@@ -672,117 +5008,156 @@ def main():
         with col1:
             if st.button("🧙‍♂️ Generate Project", type="primary", key="generate_btn"):
                 if prompt:
-                    with st.spinner("🔮 Singularity-AI is crafting your project..."):
-                        project_data = st.session_state.oracle.generate_project(prompt, language, architecture)
-                        
-                        if project_data:
-                            st.session_state.current_project = project_data
-                            st.session_state.generation_status = "success"
-                            
-                            # Calculate initial metrics
-                            total_lines = sum(len(content.split('\n')) for content in project_data['files'].values())
-                            st.session_state.project_metrics = {
-                                'total_files': len(project_data['files']),
-                                'total_lines': total_lines,
-                                'avg_lines_per_file': round(total_lines/len(project_data['files'])),
-                                'dependencies': len(project_data.get('dependencies', []))
-                            }
-                        else:
-                            st.session_state.generation_status = "error"
+                    submit_job(
+                        "generate", f"Generate {language} project",
+                        run_generation, st.session_state.oracle, prompt, language, architecture, stream_generation
+                    )
+                    st.rerun()
                 else:
                     st.error("⚠️ Please provide a project description")
         
+        # Batch mode: one project per CSV/JSONL row
+        with st.expander("📦 Batch Generation"):
+            st.caption("Upload a CSV with a header row or a JSONL file with `prompt`, `language` and `architecture` fields; empty language or architecture uses the sidebar selection.")
+            batch_file = st.file_uploader("Batch spec:", type=["csv", "jsonl", "ndjson"], key="batch_file")
+            col1, col2 = st.columns(2)
+            with col1:
+                batch_concurrency = st.slider("Concurrent generations", 1, 8, 4, key="batch_concurrency")
+            with col2:
+                batch_build_and_test = st.checkbox("Build and test each project", value=False, key="batch_build_and_test")
+            
+            if st.button("🚀 Run Batch", key="batch_btn", disabled=batch_file is None):
+                try:
+                    specs = parse_batch_specs(batch_file.getvalue(), batch_file.name, language, architecture)
+                except (ValueError, UnicodeDecodeError) as e:
+                    st.error(f"⚠️ Invalid batch file: {str(e)}")
+                else:
+                    st.session_state.batch_result = None
+                    submit_job(
+                        "batch", f"Batch ({len(specs)} projects)",
+                        run_batch_job, st.session_state.oracle, specs, batch_concurrency, batch_build_and_test
+                    )
+                    st.rerun()
+            
+            # Display batch results (persistent)
+            if st.session_state.batch_result:
+                batch = st.session_state.batch_result
+                st.markdown(f"**{batch['generated']}/{len(batch['rows'])}** projects generated")
+                st.dataframe(pd.DataFrame(batch["rows"]), use_container_width=True, hide_index=True)
+                col1, col2 = st.columns(2)
+                with col1:
+                    st.download_button(
+                        label="📦 Download Batch ZIP",
+                        data=batch["archive"],
+                        file_name="batch-projects.zip",
+                        mime="application/zip",
+                        key="download_batch_zip"
+                    )
+                with col2:
+                    st.download_button(
+                        label="📝 Download Summary",
+                        data=batch["summary"],
+                        file_name="BATCH_SUMMARY.md",
+                        mime="text/markdown",
+                        key="download_batch_summary"
+                    )
+        
         # Display project overview (persistent)
-        if st.session_state.current_project and st.session_state.generation_status == "success":
-            project = st.session_state.current_project
+        if current_project() and st.session_state.generation_status == "success":
+            project = current_project()
+            
+            project_metrics = get_metrics_engine().project_metrics(project)
             
             st.markdown('<div class="success-box">✨ Project generated successfully!</div>', unsafe_allow_html=True)
             
             st.markdown("### 📋 Project Overview")
+            history = st.session_state.project_history
+            undo_col, redo_col, revision_col = st.columns([1, 1, 4])
+            with undo_col:
+                if st.button("↩️ Undo", key="project_undo", disabled=not history.can_undo):
+                    history.undo()
+                    st.rerun()
+            with redo_col:
+                if st.button("↪️ Redo", key="project_redo", disabled=not history.can_redo):
+                    history.redo()
+                    st.rerun()
+            with revision_col:
+                st.caption(
+                    f"Revision `{history.current[:12]}` • {history.entries[history.position][1]} • "
+                    f"{history.position + 1} of {len(history.entries)}"
+                )
             col1, col2 = st.columns(2)
             
             with col1:
                 st.markdown(f"**🏷️ Name:** `{project['project_name']}`")
                 st.markdown(f"**💻 Language:** `{language}`")
-                st.markdown(f"**📁 Files:** `{st.session_state.project_metrics['total_files']}`")
+                st.markdown(f"**📁 Files:** `{project_metrics['total_files']}`")
             
             with col2:
-                st.markdown(f"**📦 Dependencies:** `{st.session_state.project_metrics['dependencies']}`")
+                st.markdown(f"**📦 Dependencies:** `{project_metrics['dependencies']}`")
                 st.markdown(f"**🏗️ Architecture:** `{architecture}`")
-                st.markdown(f"**📏 Lines:** `{st.session_state.project_metrics['total_lines']}`")
+                st.markdown(f"**📏 Lines:** `{project_metrics['total_lines']}`")
             
             st.markdown(f"**📝 Description:** {project['description']}")
+            if project.get('truncated'):
+                st.warning("⚠️ The model's response was cut off and could not be fully recovered; some files may be missing.")
             
             # File browser
             st.markdown("### 📁 Generated Files")
-            selected_file = st.selectbox(
-                "View file:", 
-                list(project['files'].keys()),
-                key="file_browser"
-            )
-            
-            if selected_file:
-                file_ext = selected_file.split('.')[-1] if '.' in selected_file else 'text'
-                st.code(project['files'][selected_file], language=file_ext)
+            render_project_browser(project)
             
             # Download button
             col1, col2 = st.columns(2)
+            with col2:
+                archive_format = st.selectbox(
+                    "Archive format:",
+                    list(ARCHIVE_FORMATS.keys()),
+                    format_func=lambda fmt: {"zip": "ZIP", "zip-store": "ZIP (store only)", "tar.gz": "tar.gz"}[fmt],
+                    key="archive_format_select"
+                )
+                compression_level = st.slider(
+                    "Compression level", 1, 9, 6,
+                    disabled=archive_format == "zip-store",
+                    key="archive_compression_level"
+                )
             with col1:
-                zip_data = create_zip_download(project)
+                archive_ext, archive_mime = ARCHIVE_FORMATS[archive_format]
+                zip_data = create_zip_download(project, archive_format, compression_level)
                 st.download_button(
-                    label="📦 Download Project ZIP",
+                    label=f"📦 Download Project {archive_format.split('-')[0].upper()}",
                     data=zip_data,
-                    file_name=f"{project['project_name']}.zip",
-                    mime="application/zip",
+                    file_name=f"{project['project_name']}{archive_ext}",
+                    mime=archive_mime,
                     key="download_zip"
                 )
     
     with tab2:
         st.markdown("### 🔧 Build & Test Pipeline")
         
-        if not st.session_state.current_project:
+        if not current_project():
             st.markdown('<div class="info-box">ℹ️ Generate a project first to see build and test options</div>', unsafe_allow_html=True)
         else:
-            project = st.session_state.current_project
+            project = current_project()
             
             col1, col2, col3 = st.columns(3)
             
             with col1:
+                use_build_cache = st.checkbox("Use build cache", value=True, key="use_build_cache")
                 if st.button("🔨 Build Project", key="build_btn"):
-                    with st.spinner("🏗️ Building project..."):
-                        # Create temporary directory
-                        temp_dir = tempfile.mkdtemp()
-                        create_project_files(project, temp_dir)
-                        
-                        # Run build commands
-                        build_success = True
-                        build_output = ""
-                        
-                        for cmd in project.get('build_commands', []):
-                            try:
-                                result = subprocess.run(
-                                    cmd.split(),
-                                    cwd=temp_dir,
-                                    capture_output=True,
-                                    text=True,
-                                    timeout=60
-                                )
-                                build_output += f"$ {cmd}\n{result.stdout}\n"
-                                if result.returncode != 0:
-                                    build_success = False
-                                    build_output += f"Error: {result.stderr}\n"
-                            except Exception as e:
-                                build_success = False
-                                build_output += f"Build failed: {str(e)}\n"
-                        
-                        st.session_state.build_output = {
-                            "success": build_success,
-                            "output": build_output
-                        }
+                    submit_job(
+                        "build", f"Build {project['project_name']}",
+                        run_build_job, st.session_state.workspace, project, use_build_cache,
+                        project=project
+                    )
+                    st.rerun()
+            
+            render_job_log("build")
             
             # Display build results (persistent)
             if st.session_state.build_output:
-                if st.session_state.build_output["success"]:
+                if st.session_state.build_output.get("cached"):
+                    st.markdown('<div class="success-box">⚡ Build served from cache (files, commands and toolchain unchanged)</div>', unsafe_allow_html=True)
+                elif st.session_state.build_output["success"]:
                     st.markdown('<div class="success-box">✅ Build successful!</div>', unsafe_allow_html=True)
                 else:
                     st.markdown('<div class="error-box">❌ Build failed</div>', unsafe_allow_html=True)
@@ -791,17 +5166,14 @@ def main():
             
             with col2:
                 if st.button("🧪 Run Tests", key="test_btn"):
-                    with st.spinner("🔬 Running tests..."):
-                        temp_dir = tempfile.mkdtemp()
-                        create_project_files(project, temp_dir)
-                        
-                        test_results = st.session_state.oracle.run_tests(
-                            temp_dir, 
-                            language, 
-                            project.get('test_commands', [])
-                        )
-                        
-                        st.session_state.test_results = test_results
+                    submit_job(
+                        "test", f"Test {project['project_name']}",
+                        run_test_job, st.session_state.oracle, st.session_state.workspace, project, language,
+                        project=project
+                    )
+                    st.rerun()
+            
+            render_job_log("test")
             
             # Display test results (persistent)
             if st.session_state.test_results:
@@ -810,6 +5182,21 @@ def main():
                 else:
                     st.markdown('<div class="error-box">❌ Some tests failed</div>', unsafe_allow_html=True)
                 
+                test_summary = st.session_state.test_results.get("summary") or {}
+                if test_summary.get("total"):
+                    coverage = st.session_state.test_results.get("coverage")
+                    st.caption(
+                        f"🧪 {test_summary['passed']} passed • {test_summary['failed']} failed • "
+                        f"{test_summary['skipped']} skipped • {test_summary['duration']}s"
+                        + (f" • coverage {coverage}%" if coverage is not None else "")
+                    )
+                    if st.session_state.test_results["failures"]:
+                        st.dataframe(
+                            pd.DataFrame(st.session_state.test_results["failures"])[["name", "file", "status", "duration", "message"]],
+                            use_container_width=True,
+                            hide_index=True
+                        )
+                
                 st.code(st.session_state.test_results["output"], language="bash")
                 
                 if st.session_state.test_results["errors"]:
@@ -819,81 +5206,78 @@ def main():
             with col3:
                 if st.button("🔧 Auto-Debug", key="debug_btn"):
                     if st.session_state.test_results and not st.session_state.test_results["success"]:
-                        with st.spinner("🤖 Auto-debugging..."):
-                            debug_result = st.session_state.oracle.debug_and_fix(
-                                project,
-                                st.session_state.test_results,
-                                max_debug_iterations
-                            )
-                            
-                            if debug_result["success"]:
-                                st.session_state.current_project = debug_result["updated_project"]
-                                st.success("🔧 Auto-debug completed!")
-                                st.markdown(debug_result["explanation"])
-                            else:
-                                st.error(f"Auto-debug failed: {debug_result['error']}")
+                        submit_job(
+                            "debug", f"Auto-debug {project['project_name']}",
+                            run_debug_job, st.session_state.oracle, st.session_state.workspace, project,
+                            st.session_state.test_results, max_debug_iterations, language,
+                            project=project
+                        )
+                        st.rerun()
                     else:
                         st.info("No failing tests to debug")
             
+            # Display auto-debug outcome (persistent)
+            debug_result = st.session_state.debug_result
+            if debug_result:
+                if debug_result["success"]:
+                    st.success(f"🔧 Auto-debug completed in {debug_result['iterations']} round(s)!")
+                    st.markdown(debug_result["explanation"])
+                else:
+                    st.error(f"Auto-debug failed: {debug_result['error']}")
+            
             # Refactoring options
             st.markdown("### 🔄 Refactoring Options")
-            refactor_col1, refactor_col2, refactor_col3, refactor_col4 = st.columns(4)
+            refactor_labels = {
+                "readability": "📚 Readability",
+                "performance": "⚡ Performance",
+                "size": "📦 Size",
+                "security": "🛡️ Security"
+            }
             
+            refactor_col1, refactor_col2 = st.columns([3, 1])
             with refactor_col1:
-                if st.button("📚 Readability", key="refactor_readability"):
-                    with st.spinner("📖 Refactoring for readability..."):
-                        result = st.session_state.oracle.refactor_code(project, "readability")
-                        if result["success"]:
-                            st.session_state.refactor_results["readability"] = result["refactored"]
+                objectives = st.multiselect(
+                    "Objectives:",
+                    list(refactor_labels.keys()),
+                    default=list(refactor_labels.keys()),
+                    format_func=refactor_labels.get,
+                    key="refactor_objectives"
+                )
+            with refactor_col2:
+                refactor_concurrency = st.number_input("Concurrency", 1, 8, 4, key="refactor_concurrency")
             
-            # Display readability refactor result (persistent)
-            if "readability" in st.session_state.refactor_results:
-                with st.expander("📚 Readability Refactor Result"):
-                    st.markdown(st.session_state.refactor_results["readability"])
+            if st.button("🔄 Run Refactors", key="refactor_btn", disabled=not objectives):
+                submit_job(
+                    "refactor", f"Refactor ({', '.join(objectives)})",
+                    run_refactor_job, st.session_state.oracle, project, objectives, refactor_concurrency,
+                    project=project
+                )
+                st.rerun()
             
-            with refactor_col2:
-                if st.button("⚡ Performance", key="refactor_performance"):
-                    with st.spinner("🚀 Optimizing performance..."):
-                        result = st.session_state.oracle.refactor_code(project, "performance")
-                        if result["success"]:
-                            st.session_state.refactor_results["performance"] = result["refactored"]
-            
-            # Display performance refactor result (persistent)
-            if "performance" in st.session_state.refactor_results:
-                with st.expander("⚡ Performance Refactor Result"):
-                    st.markdown(st.session_state.refactor_results["performance"])
-            
-            with refactor_col3:
-                if st.button("📦 Size", key="refactor_size"):
-                    with st.spinner("📉 Minimizing size..."):
-                        result = st.session_state.oracle.refactor_code(project, "size")
-                        if result["success"]:
-                            st.session_state.refactor_results["size"] = result["refactored"]
-            
-            # Display size refactor result (persistent)
-            if "size" in st.session_state.refactor_results:
-                with st.expander("📦 Size Refactor Result"):
-                    st.markdown(st.session_state.refactor_results["size"])
-            
-            with refactor_col4:
-                if st.button("🛡️ Security", key="refactor_security"):
-                    with st.spinner("🔒 Enhancing security..."):
-                        result = st.session_state.oracle.refactor_code(project, "security")
-                        if result["success"]:
-                            st.session_state.refactor_results["security"] = result["refactored"]
-            
-            # Display security refactor result (persistent)
-            if "security" in st.session_state.refactor_results:
-                with st.expander("🛡️ Security Refactor Result"):
-                    st.markdown(st.session_state.refactor_results["security"])
+            # Display refactor results side by side (persistent)
+            shown = [objective for objective in refactor_labels if objective in st.session_state.refactor_results]
+            if shown:
+                for column, objective in zip(st.columns(len(shown)), shown):
+                    result = st.session_state.refactor_results[objective]
+                    with column:
+                        st.markdown(f"#### {refactor_labels[objective]}")
+                        st.markdown(result["explanation"])
+                        st.caption(f"{len(result['diffs'])} file(s) changed")
+                        for filename, diff in result["diffs"].items():
+                            with st.expander(f"± {filename}"):
+                                st.code(diff, language="diff")
+                        if st.button("✅ Apply", key=f"apply_refactor_{objective}",
+                                     disabled=result["revision"] == st.session_state.project_history.current):
+                            st.session_state.project_history.apply(result["revision"], f"Refactor ({objective})")
+                            st.rerun()
     
     with tab3:
         st.markdown("### 🔍 Code Analysis & Insights")
         
-        if not st.session_state.current_project:
+        if not current_project():
             st.markdown('<div class="info-box">ℹ️ Generate a project first to see analysis options</div>', unsafe_allow_html=True)
         else:
-            project = st.session_state.current_project
+            project = current_project()
             
             # Code explanation
             st.markdown("### 📖 Explain Code")
@@ -919,154 +5303,226 @@ def main():
             # Architecture visualization
             st.markdown("### 🏗️ Architecture Overview")
             
-            col1, col2 = st.columns(2)
-            with col1:
-                if st.button("📊 Visualize Architecture", key="viz_arch_btn"):
-                    # Create a simple architecture diagram
-                    files = list(project['files'].keys())
-                    file_types = {}
+            if st.button("📊 Visualize Architecture", key="viz_arch_btn"):
+                st.session_state.show_architecture = True
+            
+            # Display architecture visualization (persistent, graph built lazily per revision)
+            if st.session_state.get('show_architecture'):
+                graph = get_import_graph(project)
+                
+                if graph["adjacency"]:
+                    st.plotly_chart(import_graph_figure(graph), use_container_width=True)
                     
-                    for file in files:
-                        ext = file.split('.')[-1] if '.' in file else 'other'
-                        file_types[ext] = file_types.get(ext, 0) + 1
+                    coupling_df = pd.DataFrame({
+                        "File": list(graph["adjacency"].keys()),
+                        "Fan-in": [graph["fan_in"][node] for node in graph["adjacency"]],
+                        "Fan-out": [graph["fan_out"][node] for node in graph["adjacency"]],
+                        "Imports": [", ".join(targets) for targets in graph["adjacency"].values()]
+                    }).sort_values(["Fan-in", "Fan-out"], ascending=False)
+                    st.dataframe(coupling_df, use_container_width=True, hide_index=True)
                     
-                    # Store visualization data in session state
-                    st.session_state.arch_viz_data = file_types
-            
-            # Display architecture visualization (persistent)
-            if hasattr(st.session_state, 'arch_viz_data'):
-                # Create pie chart of file types
-                fig = px.pie(
-                    values=list(st.session_state.arch_viz_data.values()),
-                    names=list(st.session_state.arch_viz_data.keys()),
-                    title="Project File Distribution",
-                    color_discrete_sequence=px.colors.qualitative.Set3
-                )
-                fig.update_layout(
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    font_color='white'
-                )
-                st.plotly_chart(fig, use_container_width=True)
+                    if graph["cycles"]:
+                        st.warning(f"🔁 {len(graph['cycles'])} import cycle(s) detected")
+                        for cycle in graph["cycles"]:
+                            st.markdown(f"- `{' → '.join(cycle + cycle[:1])}`")
+                    else:
+                        st.success("No import cycles detected")
+                else:
+                    st.info("No source files with resolvable imports found")
                 
-                # Dependency graph (simplified)
+                # External dependencies: declared vs actually imported
                 st.markdown("### 📦 Dependencies")
-                deps = project.get('dependencies', [])
-                if deps:
-                    dep_df = pd.DataFrame({'Dependency': deps, 'Type': ['External'] * len(deps)})
-                    st.dataframe(dep_df, use_container_width=True)
+                imported_by = {}
+                for filename, packages in graph["external"].items():
+                    for package in packages:
+                        if filename.endswith('.py') and package in sys.stdlib_module_names:
+                            continue
+                        imported_by.setdefault(package.lower().replace('-', '_'), []).append(filename)
+                
+                rows, declared_names = [], set()
+                for dep in project.get('dependencies', []):
+                    dist = re.split(r'[<>=!~;\[ ]', str(dep).strip(), 1)[0].lower().replace('-', '_')
+                    import_name = PACKAGE_IMPORT_NAMES.get(dist, dist).lower()
+                    declared_names |= {dist, import_name}
+                    rows.append({"Dependency": str(dep), "Type": "Declared", "Used by": len(imported_by.get(import_name, []))})
+                rows += [
+                    {"Dependency": package, "Type": "Imported, undeclared", "Used by": len(importers)}
+                    for package, importers in sorted(imported_by.items())
+                    if package not in declared_names
+                ]
+                if rows:
+                    st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
                 else:
                     st.info("No external dependencies found")
             
             # Code metrics
             st.markdown("### 📏 Code Metrics")
             
-            st.markdown("### 📏 Code Metrics")
-           
-            if hasattr(st.session_state, 'project_metrics') and st.session_state.project_metrics:
-               metrics = st.session_state.project_metrics
-               col1, col2, col3, col4 = st.columns(4)
-               col1.metric("Total Files", metrics['total_files'])
-               col2.metric("Total Lines", metrics['total_lines'])
-               col3.metric("Avg Lines/File", metrics['avg_lines_per_file'])
-               col4.metric("Dependencies", metrics['dependencies'])
-            elif st.session_state.current_project:
-               # Fallback calculation if metrics not available
-               project = st.session_state.current_project
-               total_files = len(project['files'])
-               total_lines = sum(len(content.split('\n')) for content in project['files'].values())
-               avg_lines = round(total_lines/total_files) if total_files > 0 else 0
-               dependencies = len(project.get('dependencies', []))
-               
-               col1, col2, col3, col4 = st.columns(4)
-               col1.metric("Total Files", total_files)
-               col2.metric("Total Lines", total_lines)
-               col3.metric("Avg Lines/File", avg_lines)
-               col4.metric("Dependencies", dependencies)
+            metrics = get_metrics_engine().project_metrics(project)
+            col1, col2, col3, col4 = st.columns(4)
+            col1.metric("Total Files", metrics['total_files'])
+            col2.metric("Total Lines", metrics['total_lines'])
+            col3.metric("Avg Lines/File", metrics['avg_lines_per_file'])
+            col4.metric("Dependencies", metrics['dependencies'])
+            
+            col1, col2, col3, col4 = st.columns(4)
+            col1.metric("Source Lines", metrics['sloc'])
+            col2.metric("Comment Ratio", f"{metrics['comment_ratio'] * 100:.1f}%")
+            col3.metric("Functions", metrics['functions'])
+            col4.metric("Max Nesting", metrics['max_nesting'])
+            
+            with st.expander("📄 Per-file metrics"):
+                per_file_df = pd.DataFrame(metrics['per_file'])[
+                    ["file", "loc", "sloc", "comment_ratio", "functions", "complexity", "max_nesting"]
+                ]
+                per_file_df.columns = ["File", "LOC", "SLOC", "Comment Ratio", "Functions", "Complexity", "Max Nesting"]
+                st.dataframe(per_file_df.sort_values("Complexity", ascending=False), use_container_width=True, hide_index=True)
     
     with tab4:
         st.markdown("### 📊 Project Health Dashboard")
         
-        if not st.session_state.current_project:
+        if not current_project():
             st.markdown('<div class="info-box">ℹ️ Generate a project first to see the dashboard</div>', unsafe_allow_html=True)
         else:
-            project = st.session_state.current_project
+            project = current_project()
             
-            # Health score calculation (mock)
-            health_score = 85  # This would be calculated based on various metrics
+            metrics = get_metrics_engine().project_metrics(project)
+            project_health = health_score(metrics, st.session_state.test_results, st.session_state.security_report)
             
             col1, col2, col3 = st.columns(3)
             
             with col1:
-                st.metric("🏥 Health Score", f"{health_score}%", "5%")
+                st.metric("🏥 Health Score", f"{project_health}%")
+                st.caption(f"Avg complexity/function {metrics['avg_complexity']} • max nesting {metrics['max_nesting']}")
             with col2:
-                test_coverage = "78%" if st.session_state.test_results and st.session_state.test_results["success"] else "0%"
-                st.metric("🧪 Test Coverage", test_coverage, "12%")
+                coverage = (st.session_state.test_results or {}).get("coverage")
+                st.metric("🧪 Test Coverage", f"{coverage}%" if coverage is not None else "n/a")
+                test_summary = (st.session_state.test_results or {}).get("summary") or {}
+                if test_summary.get("total"):
+                    st.caption(f"{test_summary['passed']}/{test_summary['total']} tests passed in {test_summary['duration']}s")
             with col3:
-                security_rating = "A-" if "security" in st.session_state.refactor_results else "C"
-                st.metric("🛡️ Security Rating", security_rating, "0")
+                rating = security_rating(st.session_state.security_report)
+                st.metric("🛡️ Security Rating", rating or "n/a")
+                if rating:
+                    counts = st.session_state.security_report["counts"]
+                    st.caption(" • ".join(f"{counts.get(severity, 0)} {severity.lower()}" for severity in SEVERITY_ORDER[:3]))
+                else:
+                    st.caption("Run a security scan to rate the project")
             
-            # Project timeline (mock data)
+            # Slowest tests from the last run's per-test records
+            recorded_tests = (st.session_state.test_results or {}).get("tests") or []
+            if recorded_tests:
+                st.markdown("### 🐢 Slowest Tests")
+                slowest = sorted(recorded_tests, key=lambda record: record["duration"], reverse=True)[:10]
+                st.dataframe(
+                    pd.DataFrame(slowest)[["name", "file", "status", "duration"]].rename(columns={
+                        "name": "Test", "file": "File", "status": "Status", "duration": "Seconds"
+                    }),
+                    use_container_width=True,
+                    hide_index=True
+                )
+            
+            history = get_metrics_history()
+            
+            # Project timeline (recorded job events)
             st.markdown("### 🕒 Project Timeline")
-            timeline_events = []
-            if st.session_state.current_project:
-                timeline_events.append(('Generated', datetime.now().strftime('%H:%M:%S'), '✅'))
-            if st.session_state.build_output:
-                status = '✅' if st.session_state.build_output["success"] else '❌'
-                timeline_events.append(('Built', datetime.now().strftime('%H:%M:%S'), status))
-            if st.session_state.test_results:
-                status = '✅' if st.session_state.test_results["success"] else '❌'
-                timeline_events.append(('Tested', datetime.now().strftime('%H:%M:%S'), status))
-            if st.session_state.security_report:
-                timeline_events.append(('Secured', datetime.now().strftime('%H:%M:%S'), '✅'))
+            timeline_events = [
+                (label, datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S'), revision, '✅' if success else '❌')
+                for ts, revision, label, success in history.events(project['project_name'])
+            ]
             
             if timeline_events:
-                timeline_data = pd.DataFrame(timeline_events, columns=['Event', 'Timestamp', 'Status'])
-                st.dataframe(timeline_data, use_container_width=True)
+                timeline_data = pd.DataFrame(timeline_events, columns=['Event', 'Timestamp', 'Revision', 'Status'])
+                st.dataframe(timeline_data, use_container_width=True, hide_index=True)
+            else:
+                st.info("No recorded activity for this project yet")
             
-            # Code quality trends (mock chart)
+            # Recorded trends
             st.markdown("### 📈 Quality Trends")
             
-            # Generate mock trend data
-            dates = pd.date_range(start='2024-01-01', end='2024-12-31', freq='M')
-            quality_data = pd.DataFrame({
-                'Date': dates,
-                'Code Quality': [75 + i*2 + (i%3)*5 for i in range(len(dates))],
-                'Test Coverage': [60 + i*1.5 + (i%2)*3 for i in range(len(dates))],
-                'Security Score': [70 + i*1.8 + (i%4)*4 for i in range(len(dates))]
-            })
+            trend_metrics = {
+                "health_score": "Health Score",
+                "test_pass_rate": "Test Pass Rate (%)",
+                "test_coverage": "Test Coverage (%)",
+                "scan_findings": "Security Findings",
+                "avg_complexity": "Avg Complexity",
+                "build_duration": "Build Duration (s)",
+                "test_duration": "Test Duration (s)",
+                "generate_duration": "Generation Latency (s)",
+                "debug_duration": "Debug Latency (s)",
+                "scan_duration": "Scan Latency (s)"
+            }
+            trend_col1, trend_col2 = st.columns([3, 1])
+            with trend_col1:
+                selected_metrics = st.multiselect(
+                    "Metrics:",
+                    list(trend_metrics.keys()),
+                    default=["health_score", "test_pass_rate", "scan_findings"],
+                    format_func=trend_metrics.get,
+                    key="trend_metrics_select"
+                )
+            with trend_col2:
+                trend_range = st.selectbox("Range:", ["24 hours", "7 days", "30 days", "180 days"], index=1, key="trend_range_select")
             
-            fig = px.line(
-                quality_data, 
-                x='Date', 
-                y=['Code Quality', 'Test Coverage', 'Security Score'],
-                title="Project Health Over Time"
-            )
-            fig.update_layout(
-                plot_bgcolor='rgba(0,0,0,0)',
-                paper_bgcolor='rgba(0,0,0,0)',
-                font_color='white'
-            )
-            st.plotly_chart(fig, use_container_width=True)
+            range_seconds = {"24 hours": 86400, "7 days": 7 * 86400, "30 days": 30 * 86400, "180 days": 180 * 86400}[trend_range]
+            quality_data = history.query(project['project_name'], selected_metrics, time.time() - range_seconds) if selected_metrics else None
+            
+            if quality_data is not None and not quality_data.empty:
+                quality_data["Metric"] = quality_data["metric"].map(trend_metrics)
+                fig = px.line(
+                    quality_data, 
+                    x='time', 
+                    y='value',
+                    color='Metric',
+                    markers=True,
+                    title="Project Health Over Time"
+                )
+                fig.update_layout(
+                    plot_bgcolor='rgba(0,0,0,0)',
+                    paper_bgcolor='rgba(0,0,0,0)',
+                    font_color='white'
+                )
+                st.plotly_chart(fig, use_container_width=True)
+            else:
+                st.info("No samples recorded in this range yet")
     
     with tab5:
         st.markdown("### 🛡️ Security Analysis")
         
-        if not st.session_state.current_project:
+        if not current_project():
             st.markdown('<div class="info-box">ℹ️ Generate a project first to run security analysis</div>', unsafe_allow_html=True)
         else:
-            project = st.session_state.current_project
+            project = current_project()
             
             if st.button("🔍 Run Security Scan", key="security_scan_btn"):
-                with st.spinner("🛡️ Scanning for security vulnerabilities..."):
-                    security_result = st.session_state.oracle.security_scan(project, language)
-                    st.session_state.security_report = security_result
+                oracle = st.session_state.oracle
+                submit_job(
+                    "scan", f"Security scan {project['project_name']}",
+                    lambda job: oracle.security_scan(project, language),
+                    project=project
+                )
+                st.rerun()
             
             # Display security report (persistent)
             if st.session_state.security_report:
                 if st.session_state.security_report["success"]:
+                    report = st.session_state.security_report
                     st.markdown("### 🛡️ Security Report")
-                    st.markdown(st.session_state.security_report["report"])
+                    st.markdown(report["report"])
+                    
+                    severity_cols = st.columns(len(SEVERITY_ORDER))
+                    for column, severity in zip(severity_cols, SEVERITY_ORDER):
+                        column.metric(severity, report["counts"][severity])
+                    
+                    if report["findings"]:
+                        findings_df = pd.DataFrame(report["findings"])[["severity", "file", "line", "cwe", "issue", "fix"]]
+                        findings_df.columns = ["Severity", "File", "Line", "CWE", "Issue", "Fix"]
+                        st.dataframe(findings_df, use_container_width=True, hide_index=True)
+                    else:
+                        st.success("No security findings")
+                    
+                    for error in report["errors"]:
+                        st.warning(f"Partial scan: {error}")
                 else:
                     st.error(f"Security scan failed: {st.session_state.security_report['error']}")
             
@@ -1090,10 +5546,10 @@ def main():
     with tab6:
         st.markdown("### 🪄 Deployment & CI/CD")
         
-        if not st.session_state.current_project:
+        if not current_project():
             st.markdown('<div class="info-box">ℹ️ Generate a project first to see deployment options</div>', unsafe_allow_html=True)
         else:
-            project = st.session_state.current_project
+            project = current_project()
             
             # CI/CD platform selection
             col1, col2 = st.columns(2)
@@ -1107,11 +5563,14 @@ def main():
                 )
                 
                 if st.button("Generate CI/CD Config", key="generate_cicd_btn"):
-                    with st.spinner("⚙️ Generating CI/CD configuration..."):
-                        cicd_config = st.session_state.oracle.generate_cicd(
-                            project, language, cicd_platform
-                        )
-                        st.session_state.cicd_configs[cicd_platform] = cicd_config
+                    oracle = st.session_state.oracle
+                    submit_job(
+                        "cicd", f"{cicd_platform} pipeline",
+                        lambda job: oracle.generate_cicd(project, language, cicd_platform),
+                        platform=cicd_platform,
+                        project=project
+                    )
+                    st.rerun()
                 
                 # Display CI/CD config (persistent)
                 if cicd_platform in st.session_state.cicd_configs:
@@ -1148,8 +5607,8 @@ def main():
                     
                     with st.spinner("🐳 Generating Dockerfile..."):
                         try:
-                            response = st.session_state.oracle.model.generate_content(dockerfile_prompt)
-                            st.session_state.dockerfile_content = response.text
+                            response_text = st.session_state.oracle.generate_text("dockerfile", dockerfile_prompt)
+                            st.session_state.dockerfile_content = response_text
                         except Exception as e:
                             st.error(f"Dockerfile generation failed: {str(e)}")
                 
@@ -1196,10 +5655,10 @@ def main():
                 
                 with st.spinner(f"🚀 Generating {deployment_type} configuration..."):
                     try:
-                        response = st.session_state.oracle.model.generate_content(deploy_prompt)
+                        response_text = st.session_state.oracle.generate_text("deploy", deploy_prompt)
                         if 'deploy_configs' not in st.session_state:
                             st.session_state.deploy_configs = {}
-                        st.session_state.deploy_configs[deployment_type] = response.text
+                        st.session_state.deploy_configs[deployment_type] = response_text
                     except Exception as e:
                         st.error(f"Deployment configuration generation failed: {str(e)}")
             
@@ -1253,10 +5712,10 @@ def main():
                 
                 with st.spinner(f"⚙️ Generating {env_type} environment config..."):
                     try:
-                        response = st.session_state.oracle.model.generate_content(env_prompt)
+                        response_text = st.session_state.oracle.generate_text("env_config", env_prompt)
                         if 'env_configs' not in st.session_state:
                             st.session_state.env_configs = {}
-                        st.session_state.env_configs[env_type] = response.text
+                        st.session_state.env_configs[env_type] = response_text
                     except Exception as e:
                         st.error(f"Environment configuration generation failed: {str(e)}")
             
@@ -1272,6 +5731,80 @@ def main():
                     key=f"download_env_{env_type}"
                 )
 
+    with tab7:
+        st.markdown("### 📡 Model Call Operations")
+        
+        telemetry = get_llm_telemetry()
+        ops_rows = telemetry.summary()
+        
+        if not ops_rows:
+            st.info("No model calls recorded in this process yet")
+        else:
+            ops_data = pd.DataFrame(ops_rows)
+            
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("Model Calls", int(ops_data["calls"].sum()))
+            with col2:
+                st.metric("Errors", int(ops_data["errors"].sum()))
+            with col3:
+                st.metric("Retries", int(ops_data["retries"].sum()))
+            with col4:
+                st.metric("Tokens", f"{int(ops_data['prompt_tokens'].sum() + ops_data['response_tokens'].sum()):,}")
+            
+            st.dataframe(
+                ops_data.rename(columns={
+                    "operation": "Operation", "calls": "Calls", "errors": "Errors", "retries": "Retries",
+                    "cache_hit_rate": "Cache Hit %", "prompt_tokens": "Prompt Tokens", "response_tokens": "Response Tokens",
+                    "p50_s": "p50 (s)", "p95_s": "p95 (s)", "p99_s": "p99 (s)",
+                    "ttft_p50_s": "TTFT p50 (s)", "ttft_p95_s": "TTFT p95 (s)"
+                }),
+                use_container_width=True,
+                hide_index=True
+            )
+            
+            latency_data = ops_data.melt(
+                id_vars="operation", value_vars=["p50_s", "p95_s", "p99_s"], var_name="Percentile", value_name="Seconds"
+            )
+            fig = px.bar(
+                latency_data, x="operation", y="Seconds", color="Percentile", barmode="group",
+                title="Model Latency by Operation (cache hits excluded)"
+            )
+            fig.update_layout(
+                plot_bgcolor='rgba(0,0,0,0)',
+                paper_bgcolor='rgba(0,0,0,0)',
+                font_color='white'
+            )
+            st.plotly_chart(fig, use_container_width=True)
+        
+        st.markdown("### 🧭 Model Routing")
+        routing = pd.DataFrame(st.session_state.oracle.router.status())
+        st.dataframe(
+            routing.rename(columns={
+                "operation": "Operation", "tier": "Tier", "model": "Effective Model", "slo_s": "SLO (s)", "fallback": "SLO Fallback"
+            }),
+            use_container_width=True,
+            hide_index=True
+        )
+        
+        governor = get_request_governor()
+        levels = governor.levels()
+        st.caption(
+            f"🚦 Shared rate budget: {governor.buckets['requests'][0]} RPM ({levels['requests']}% available) • "
+            f"{governor.buckets['tokens'][0]:,} TPM ({levels['tokens']}% available)"
+        )
+        
+        st.markdown("### 📤 Prometheus Export")
+        if telemetry.export_path:
+            st.caption(f"Written every {TELEMETRY_EXPORT_INTERVAL}s to `{telemetry.export_path}` for a textfile collector")
+        st.download_button(
+            label="📥 Download Metrics",
+            data=telemetry.prometheus_text(),
+            file_name="llm_metrics.prom",
+            mime="text/plain",
+            key="download_llm_metrics"
+        )
+
     # Footer with new theme
     st.markdown("---")
     st.markdown(
@@ -0,0 +1,21 @@
+import os
+import sys
+import tempfile
+
+# Keep the app's SQLite stores and caches out of the user's home directory
+os.environ.setdefault("SINGULARITY_CACHE_DIR", tempfile.mkdtemp(prefix="singularity-tests-"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import app
+
+
+@pytest.fixture
+def oracle(tmp_path):
+    """CodeOracle with private stores; tests replace generate_text to script model replies"""
+    return app.CodeOracle(
+        "test-key",
+        cache=app.ResponseCache(str(tmp_path / "llm_cache.sqlite")),
+        governor=app.RequestGovernor(str(tmp_path / "governor.sqlite")),
+    )
@@ -0,0 +1,49 @@
+import io
+import tarfile
+import zipfile
+
+import pytest
+
+import app
+
+
+PROJECT = {"project_name": "demo", "files": {"main.py": "print('hi')\n", "pkg/data.txt": "é" * 1000}}
+
+
+@pytest.fixture(autouse=True)
+def clear_archive_cache():
+    app._build_archive.clear()
+    yield
+    app._build_archive.clear()
+
+
+@pytest.mark.parametrize("archive_format, compression", [
+    ("zip", zipfile.ZIP_DEFLATED), ("zip-store", zipfile.ZIP_STORED)
+])
+def test_zip_round_trip(archive_format, compression):
+    data = app.create_zip_download(PROJECT, archive_format)
+    
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert {info.filename: info.compress_type for info in archive.infolist()} == dict.fromkeys(PROJECT["files"], compression)
+        assert {name: archive.read(name).decode("utf-8") for name in archive.namelist()} == PROJECT["files"]
+
+
+def test_tar_gz_round_trip():
+    data = app.create_zip_download(PROJECT, "tar.gz", compression_level=9)
+    
+    with tarfile.open(fileobj=io.BytesIO(data), mode="r:gz") as archive:
+        assert {member.name: archive.extractfile(member).read().decode("utf-8") for member in archive} == PROJECT["files"]
+
+
+def test_archive_is_memoized_on_content_hash(monkeypatch):
+    writes = []
+    write_project_archive = app.write_project_archive
+    monkeypatch.setattr(app, "write_project_archive", lambda files, *args: writes.append(1) or write_project_archive(files, *args))
+    
+    first = app.create_zip_download(PROJECT)
+    assert app.create_zip_download({**PROJECT, "files": dict(PROJECT["files"])}) == first
+    assert len(writes) == 1
+    
+    app.create_zip_download({**PROJECT, "files": {**PROJECT["files"], "main.py": "print('bye')\n"}})
+    app.create_zip_download(PROJECT, "tar.gz")
+    assert len(writes) == 3
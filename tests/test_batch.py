@@ -0,0 +1,49 @@
+import io
+import threading
+import zipfile
+
+import app
+
+
+CSV = b"prompt,language\nA todo API,Python\n\"A CLI, with commas\",Go\n"
+
+
+def test_parse_batch_specs_reports_csv_line_numbers():
+    specs = app.parse_batch_specs(CSV, "specs.csv", "Python", "standard")
+    
+    assert [spec["prompt"] for spec in specs] == ["A todo API", "A CLI, with commas"]
+    assert [spec["language"] for spec in specs] == ["Python", "Go"]
+
+
+def test_create_project_files_refuses_escaping_paths(tmp_path):
+    base = tmp_path / "project"
+    errors = app.create_project_files(
+        {"files": {"ok/main.py": "print(1)\n", "../escape.py": "x", "/tmp/abs-escape.py": "x"}}, str(base)
+    )
+    
+    assert (base / "ok" / "main.py").read_text() == "print(1)\n"
+    assert len(errors) == 2 and all("escapes" in error for error in errors)
+    assert not (tmp_path / "escape.py").exists()
+
+
+class ScriptedOracle:
+    def generate_project(self, prompt, language, architecture, raise_errors=False):
+        return {"project_name": "../../evil name", "files": {"main.py": "print(1)\n", "../../escape.py": "x"}}
+
+
+def test_batch_job_runs_off_the_script_thread_and_sanitizes_names(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "BATCH_ROOT", str(tmp_path / "batches"))
+    specs = app.parse_batch_specs(CSV, "specs.csv", "Python", "standard")
+    job = app.Job("batch", "batch")
+    outcome = {}
+    
+    worker = threading.Thread(target=lambda: outcome.update(app.run_batch_job(job, ScriptedOracle(), specs, 2, False)))
+    worker.start()
+    worker.join(timeout=60)
+    
+    assert outcome["generated"] == 2
+    assert all("escapes" in row["Error"] for row in outcome["rows"])
+    names = zipfile.ZipFile(io.BytesIO(outcome["archive"])).namelist()
+    assert "001-evil-name/main.py" in names
+    assert not any(".." in name for name in names)
+    assert not list(tmp_path.rglob("escape.py"))
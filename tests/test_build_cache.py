@@ -0,0 +1,81 @@
+import os
+
+import app
+
+
+FILES = {"main.py": "print(1)\n", "pkg/util.py": "X = 1\n"}
+
+
+def write_project(root, files):
+    for name, content in files.items():
+        path = os.path.join(root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content)
+    return str(root)
+
+
+def build(project_path, cache, key, with_dependencies=False):
+    """Simulate a build that writes an artifact (and optionally installs dependencies) and store it"""
+    before = app.snapshot_tree(project_path)
+    os.makedirs(os.path.join(project_path, "dist"))
+    with open(os.path.join(project_path, "dist", "out.bin"), "w") as f:
+        f.write("artifact")
+    if with_dependencies:
+        os.makedirs(os.path.join(project_path, "node_modules", "dep"))
+    cache.put(key, {"success": True, "output": "built"}, project_path, before, FILES)
+
+
+def test_merkle_hash_is_order_independent_and_path_sensitive():
+    reordered = dict(reversed(list(FILES.items())))
+    moved = {"main.py": "print(1)\n", "util.py": "X = 1\n"}
+    
+    assert app.merkle_hash(FILES) == app.merkle_hash(reordered)
+    assert app.merkle_hash(FILES) != app.merkle_hash(moved)
+
+
+def test_make_key_depends_on_files_and_commands():
+    key = app.BuildCache.make_key(FILES, ["python -m compileall ."])
+    
+    assert key == app.BuildCache.make_key(dict(FILES), ["python -m compileall ."])
+    assert key != app.BuildCache.make_key({**FILES, "main.py": "print(2)\n"}, ["python -m compileall ."])
+    assert key != app.BuildCache.make_key(FILES, ["python -m compileall -q ."])
+
+
+def test_hit_restores_artifacts_into_a_fresh_workspace(tmp_path):
+    cache = app.BuildCache(str(tmp_path / "cache"))
+    key = cache.make_key(FILES, ["make"])
+    build(write_project(tmp_path / "first", FILES), cache, key)
+    
+    fresh = write_project(tmp_path / "second", FILES)
+    result = cache.get(key, fresh)
+    
+    assert result == {"success": True, "output": "built", "cached": True, "artifacts": 1}
+    with open(os.path.join(fresh, "dist", "out.bin")) as f:
+        assert f.read() == "artifact"
+    assert cache.get("other", fresh) is None
+    assert cache.stats()["entries"] == 1
+
+
+def test_missing_dependency_directory_is_a_miss(tmp_path):
+    cache = app.BuildCache(str(tmp_path / "cache"))
+    key = cache.make_key(FILES, ["npm run build"])
+    build(write_project(tmp_path / "first", FILES), cache, key, with_dependencies=True)
+    
+    fresh = write_project(tmp_path / "second", FILES)
+    
+    assert cache.get(key, fresh) is None
+    os.makedirs(os.path.join(fresh, "node_modules"))
+    assert cache.get(key, fresh)["cached"]
+
+
+def test_invalidate_drops_entry_and_archive(tmp_path):
+    cache = app.BuildCache(str(tmp_path / "cache"))
+    key = cache.make_key(FILES, ["make"])
+    project = write_project(tmp_path / "first", FILES)
+    build(project, cache, key)
+    
+    cache.invalidate(key)
+    
+    assert cache.get(key, project) is None
+    assert not os.path.exists(cache._archive_path(key))
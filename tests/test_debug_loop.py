@@ -0,0 +1,121 @@
+import json
+
+import pytest
+
+import app
+
+
+PROJECT = {
+    "project_name": "demo",
+    "files": {
+        "calc.py": "def add(a, b):\n    return a - b\n",
+        "reports.py": "def render(rows):\n    return 'UNRELATED_REPORT_BODY'\n",
+        "test_calc.py": "from calc import add\n\ndef test_add():\n    assert add(1, 2) == 3\n",
+    },
+    "test_commands": ["pytest test_calc.py"],
+}
+FAILING = {
+    "failed_tests": ["pytest test_calc.py"],
+    "errors": "test_calc.py:4: AssertionError: assert -1 == 3",
+    "output": "",
+    "failures": [],
+}
+
+
+@pytest.fixture
+def debugger(oracle, tmp_path):
+    """Oracle with scripted fixes and test runs, plus a workspace lease to debug in"""
+    lease = app.WorkspaceLease(app.WorkspaceManager(root=str(tmp_path / "ws")), "s1")
+    oracle.prompts, oracle.runs, oracle.outcomes = [], [], []
+    
+    def generate_text(method, prompt, context=None):
+        oracle.prompts.append(prompt)
+        fixed = f"def add(a, b):\n    return a + b  # round {len(oracle.prompts)}\n"
+        return json.dumps({"fixed_files": {"calc.py": fixed}, "fix_explanation": "use +"})
+    
+    def run_tests(project_path, language, commands):
+        oracle.runs.append(commands)
+        failed = commands if oracle.outcomes.pop(0) else []
+        return {"success": not failed, "failed_tests": failed, "errors": FAILING["errors"] if failed else "",
+                "output": "", "failures": []}
+    
+    oracle.generate_text = generate_text
+    oracle.run_tests = run_tests
+    return oracle, lease
+
+
+def test_loop_stops_as_soon_as_tests_pass(debugger):
+    oracle, lease = debugger
+    oracle.outcomes = [False]
+    
+    result = oracle.debug_and_fix(PROJECT, FAILING, max_iterations=3, workspace=lease, language="Python")
+    
+    assert result["success"] and result["iterations"] == 1
+    assert len(oracle.prompts) == 1
+    assert oracle.runs == [["pytest test_calc.py"]]
+    assert "return a + b" in result["updated_project"]["files"]["calc.py"]
+
+
+def test_loop_stops_at_max_iterations(debugger):
+    oracle, lease = debugger
+    oracle.outcomes = [True, True, True]
+    
+    result = oracle.debug_and_fix(PROJECT, FAILING, max_iterations=2, workspace=lease, language="Python")
+    
+    assert result["iterations"] == 2
+    assert len(oracle.prompts) == 2
+    assert result["test_results"]["failed_tests"] == ["pytest test_calc.py"]
+    assert "# round 2" in result["updated_project"]["files"]["calc.py"]
+
+
+def test_prompt_has_implicated_files_in_full_and_a_symbol_index_of_the_rest(debugger):
+    oracle, lease = debugger
+    oracle.outcomes = [False]
+    
+    oracle.debug_and_fix(PROJECT, FAILING, max_iterations=1, workspace=lease, language="Python")
+    
+    prompt, = oracle.prompts
+    context = json.loads(prompt.split("(full content):\n", 1)[1].split("\n", 1)[0])
+    assert set(context) == {"test_calc.py", "calc.py"}
+    assert "reports.py: def render" in prompt
+    assert "UNRELATED_REPORT_BODY" not in prompt
+
+
+def test_raw_errors_are_not_counted_twice_without_failure_records(debugger, monkeypatch):
+    oracle, lease = debugger
+    oracle.outcomes = [False]
+    seen = []
+    find_implicated_files = app.find_implicated_files
+    
+    def spy(files, error_text, **kwargs):
+        seen.append(error_text)
+        return find_implicated_files(files, error_text, **kwargs)
+    
+    monkeypatch.setattr(app, "find_implicated_files", spy)
+    oracle.debug_and_fix(PROJECT, FAILING, max_iterations=1, workspace=lease, language="Python")
+    
+    assert seen[0].count(FAILING["errors"]) == 1
+
+
+def test_import_graph_is_built_once_and_updated_incrementally(debugger, monkeypatch):
+    oracle, lease = debugger
+    oracle.outcomes = [True, True, False]
+    builds = []
+    build_import_graph = app.build_import_graph
+    monkeypatch.setattr(app, "build_import_graph", lambda files: builds.append(1) or build_import_graph(files))
+    
+    result = oracle.debug_and_fix(PROJECT, FAILING, max_iterations=3, workspace=lease, language="Python")
+    
+    assert result["iterations"] == 3
+    assert len(builds) == 1
+
+
+def test_update_import_graph_matches_a_rebuild():
+    files = dict(PROJECT["files"])
+    graph = app.build_import_graph(files)
+    
+    files["reports.py"] = "from calc import add\n"
+    assert app.update_import_graph(graph, files, ["reports.py"]) == app.build_import_graph(files)
+    
+    files["new.py"] = "import reports\n"
+    assert app.update_import_graph(graph, files, ["new.py"]) == app.build_import_graph(files)
@@ -0,0 +1,68 @@
+import app
+
+
+TRUNCATED = '{"project_name": "demo", "description": "d", "files": {"main.py": "print(1)\\n", "util.py": "def f('
+CONTINUED = '{"project_name": "demo", "files": {"util.py": "def f():\\n    return 1\\n"}}'
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+        self.usage_metadata = None
+
+
+class FakeModel:
+    """Scripted replies keyed by whether the prompt asks for a continuation"""
+
+    def __init__(self, continuation):
+        self.continuation = continuation
+        self.calls = 0
+
+    def generate_content(self, prompt, **kwargs):
+        self.calls += 1
+        return FakeResponse(self.continuation if "was cut off" in prompt else TRUNCATED)
+
+
+def test_unparseable_continuation_keeps_salvaged_files_and_is_not_cached(oracle):
+    model = FakeModel("Sorry, I can't continue.")
+    oracle.model_for = lambda name: model
+    
+    for attempt in range(2):
+        project = oracle.generate_project("demo", "Python", raise_errors=True)
+        assert project["files"] == {"main.py": "print(1)\n"}
+        assert project["truncated"]
+    
+    # The truncated first reply is served from cache; the bad continuation is asked again
+    assert model.calls == 3
+
+
+def test_continuation_completes_project(oracle):
+    model = FakeModel(CONTINUED)
+    oracle.model_for = lambda name: model
+    
+    project = oracle.generate_project("demo", "Python", raise_errors=True)
+    
+    assert set(project["files"]) == {"main.py", "util.py"}
+    assert not project["truncated"]
+    assert project["test_commands"] == []
+
+
+def test_stream_parser_yields_files_as_they_complete():
+    parser = app.ProjectStreamParser()
+    events = []
+    for piece in (TRUNCATED[:40], TRUNCATED[40:70], TRUNCATED[70:]):
+        events += parser.feed(piece)
+    
+    assert events == [("main.py", "print(1)\n")]
+    assert parser.fields["project_name"] == "demo"
+
+
+def test_stream_parser_handles_escapes_split_across_chunks():
+    reply = '{"files": {"a.py": "s = \\"x\\"\\n", "b.py": "\\u00e9"}}'
+    parser = app.ProjectStreamParser()
+    events = []
+    for char in reply:
+        events += parser.feed(char)
+    
+    assert events == [("a.py", 's = "x"\n'), ("b.py", "é")]
+
@@ -0,0 +1,61 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import app
+
+
+class ResourceExhausted(Exception):
+    pass
+
+
+class HttpError(Exception):
+    def __init__(self, code):
+        super().__init__(code)
+        self.code = code
+
+
+def test_retry_delay_backs_off_only_retryable_errors():
+    for attempt in range(app.MAX_RETRIES):
+        delay = app.RequestGovernor.retry_delay(ResourceExhausted(), attempt)
+        assert 0 <= delay <= min(app.BACKOFF_CAP, app.BACKOFF_BASE * 2 ** attempt)
+    
+    assert app.RequestGovernor.retry_delay(HttpError(503), 0) is not None
+    assert app.RequestGovernor.retry_delay(HttpError(400), 0) is None
+    assert app.RequestGovernor.retry_delay(ValueError("bad prompt"), 0) is None
+    assert app.RequestGovernor.retry_delay(ResourceExhausted(), app.MAX_RETRIES) is None
+
+
+def test_buckets_are_shared_through_the_database(tmp_path):
+    path = str(tmp_path / "governor.sqlite")
+    first = app.RequestGovernor(path, rpm=2, tpm=1000)
+    second = app.RequestGovernor(path, rpm=2, tpm=1000)
+    
+    assert first._take(10) == 0.0
+    assert second._take(10) == 0.0
+    assert first._take(10) == pytest.approx(30.0, abs=1.0)
+    assert second.levels()["requests"] < 10
+
+
+def test_higher_priority_waiter_is_admitted_first(tmp_path):
+    governor = app.RequestGovernor(str(tmp_path / "governor.sqlite"), rpm=60, tpm=1000000)
+    with sqlite3.connect(governor.path) as conn:
+        conn.execute("INSERT INTO buckets VALUES ('requests', 0, ?)", (time.time(),))
+    
+    admitted = []
+    
+    def call(operation):
+        governor.acquire(operation, "prompt")
+        admitted.append(operation)
+    
+    bulk = threading.Thread(target=call, args=("security_scan",))
+    bulk.start()
+    time.sleep(0.2)
+    interactive = threading.Thread(target=call, args=("explain_code",))
+    interactive.start()
+    bulk.join(10)
+    interactive.join(10)
+    
+    assert admitted == ["explain_code", "security_scan"]
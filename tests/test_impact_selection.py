@@ -0,0 +1,60 @@
+import app
+
+
+PYTHON_FILES = {
+    "pkg/__init__.py": "",
+    "pkg/core.py": "def f():\n    return 1\n",
+    "pkg/api.py": "from pkg.core import f\n",
+    "tests/test_api.py": "from pkg.api import f\n",
+    "tests/test_core.py": "from pkg import core\n",
+    "tests/test_other.py": "import os\n",
+    "unit/test_x.py": "from pkg.core import f\n",
+}
+
+GO_FILES = {
+    "go.mod": "module example.com/m\n",
+    "a/a.go": "package a\n",
+    "b/b.go": 'package b\nimport "example.com/m/a"\n',
+    "c/c.go": "package c\n",
+}
+
+
+def test_impacted_files_follow_reverse_imports():
+    graph = app.build_import_graph(PYTHON_FILES)
+    
+    assert app.impacted_files(graph, ["pkg/api.py"]) == {"pkg/api.py", "tests/test_api.py"}
+
+
+def test_pytest_is_narrowed_to_impacted_tests_within_its_scope():
+    selection = app.select_impacted_tests(PYTHON_FILES, ["pkg/core.py"], ["pytest tests"])
+    
+    assert selection == {"pytest tests/test_api.py tests/test_core.py": "pytest tests"}
+
+
+def test_pytest_options_are_kept_and_unknown_runners_run_in_full():
+    commands = ["pytest -q", "python -m pytest -k api tests", "make test"]
+    
+    selection = app.select_impacted_tests(PYTHON_FILES, ["pkg/api.py"], commands)
+    
+    assert selection == {
+        "pytest -q tests/test_api.py": "pytest -q",
+        "python -m pytest -k api tests/test_api.py": "python -m pytest -k api tests",
+        "make test": "make test",
+    }
+
+
+def test_no_impacted_test_runs_in_full():
+    selection = app.select_impacted_tests(PYTHON_FILES, ["tests/test_other.py"], ["pytest unit"])
+    
+    assert selection == {"pytest unit": "pytest unit"}
+
+
+def test_global_files_force_a_full_run():
+    for changed in ("conftest.py", "requirements.txt", "pyproject.toml"):
+        assert app.select_impacted_tests(PYTHON_FILES, [changed], ["pytest -q"]) == {"pytest -q": "pytest -q"}
+
+
+def test_go_test_is_narrowed_to_impacted_packages():
+    selection = app.select_impacted_tests(GO_FILES, ["a/a.go"], ["go test -v ./..."])
+    
+    assert selection == {"go test -v ./a ./b": "go test -v ./..."}
@@ -0,0 +1,31 @@
+import app
+
+
+FILES = {
+    "pkg/__init__.py": "",
+    "pkg/core.py": "def f():\n    return 1\n",
+    "pkg/api.py": "import requests\nfrom pkg.core import f\n",
+    "tests/test_core.py": "from pkg import core\n",
+    "main.go": 'package main\nimport "example.com/m/a"\n',
+    "a/a.go": "package a\n",
+    "go.mod": "module example.com/m\n",
+}
+
+
+def test_import_graph_resolves_internal_imports():
+    graph = app.build_import_graph(FILES)
+    
+    assert graph["adjacency"]["pkg/api.py"] == ["pkg/core.py"]
+    assert graph["adjacency"]["tests/test_core.py"] == ["pkg/core.py"]
+    assert graph["adjacency"]["main.go"] == ["a/a.go"]
+    assert graph["external"]["pkg/api.py"] == ["requests"]
+    assert graph["fan_in"]["pkg/core.py"] == 2
+    assert graph["fan_out"]["pkg/core.py"] == 0
+    assert graph["cycles"] == []
+
+
+def test_import_graph_reports_cycles():
+    graph = app.build_import_graph({"a.py": "import b\n", "b.py": "import a\n"})
+    
+    assert graph["cycles"] == [["a.py", "b.py"]]
+
@@ -0,0 +1,134 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import app
+
+
+PROJECT = {"project_name": "jobs-demo", "files": {"main.py": "print('hi')\n"}, "test_commands": ["pytest"]}
+
+
+class SessionState(dict):
+    """Attribute-style dict standing in for st.session_state outside a Streamlit run"""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+    pool = ThreadPoolExecutor(max_workers=2)
+    store = app.ProjectStore(str(tmp_path / "projects"))
+    history = app.MetricsHistory(str(tmp_path / "metrics.sqlite"))
+    monkeypatch.setattr(app.st, "session_state", SessionState())
+    monkeypatch.setattr(app, "get_job_pool", lambda: pool)
+    monkeypatch.setattr(app, "get_project_store", lambda: store)
+    monkeypatch.setattr(app, "get_metrics_history", lambda: history)
+    monkeypatch.setattr(app, "get_workspace_manager", lambda: app.WorkspaceManager(root=str(tmp_path / "ws")))
+    app.init_session_state()
+    yield app.st.session_state
+    pool.shutdown(wait=True)
+
+
+def wait_for(job, timeout=5.0):
+    deadline = time.time() + timeout
+    while job.active and time.time() < deadline:
+        time.sleep(0.01)
+    assert not job.active
+
+
+def test_completed_job_is_applied_once(session):
+    job = app.submit_job("generate", "Generate jobs-demo", lambda job: PROJECT, project=PROJECT)
+    assert session.jobs[job.id] is job
+    wait_for(job)
+    
+    assert (job.status, job.progress, job.error) == ("done", 1.0, None)
+    assert job.started_at <= job.finished_at
+    app.apply_finished_jobs()
+    app.apply_finished_jobs()
+    
+    history = session.project_history
+    assert len(history.entries) == 1
+    assert history.project()["files"] == PROJECT["files"]
+    assert session.generation_status == "success"
+    assert job.applied and job.result is None and "project" not in job.context
+    assert [success for _, _, _, success in app.get_metrics_history().events("jobs-demo")] == [True]
+
+
+def test_failed_job_reports_its_error(session):
+    def fail(job):
+        raise RuntimeError("quota exceeded")
+    
+    job = app.submit_job("generate", "Generate jobs-demo", fail)
+    wait_for(job)
+    app.apply_finished_jobs()
+    
+    assert (job.status, job.error) == ("failed", "quota exceeded")
+    assert session.job_errors == ["Generate jobs-demo: quota exceeded"]
+    assert session.generation_status == "error"
+    assert session.project_history.current is None
+
+
+def test_cancelled_job_discards_its_result(session):
+    started = threading.Event()
+    
+    def wait_for_cancel(job):
+        started.set()
+        job.cancel_event.wait(5)
+        return {"success": True, "output": "late"}
+    
+    job = app.submit_job("build", "Build", wait_for_cancel)
+    assert started.wait(5) and job.status == "running"
+    job.cancel()
+    wait_for(job)
+    app.apply_finished_jobs()
+    
+    assert (job.status, job.error) == ("cancelled", "Cancelled")
+    assert session.build_output is None
+    assert session.job_errors == ["Build: Cancelled"]
+
+
+def test_worker_progress_and_log_are_visible_while_running(session):
+    release = threading.Event()
+    
+    def work(job):
+        job.update(0.5, "halfway")
+        job.log.append("step 1")
+        release.wait(5)
+        return {"success": True, "failed_tests": [], "output": "", "errors": ""}
+    
+    job = app.submit_job("test", "Run tests", work, project=PROJECT)
+    deadline = time.time() + 5
+    while job.progress < 0.5 and time.time() < deadline:
+        time.sleep(0.01)
+    
+    assert (job.status, job.message, job.log.last(1)) == ("running", "halfway", ["step 1"])
+    release.set()
+    wait_for(job)
+    app.apply_finished_jobs()
+    assert session.test_results["success"]
+
+
+def test_refactor_results_are_stashed_and_failures_reported(session):
+    result = {
+        "readability": {"success": True, "objective": "readability", "explanation": "tidy",
+                        "files": {"main.py": "print('hello')\n"}, "diffs": {"main.py": "..."}},
+        "size": {"success": False, "objective": "size", "error": "bad reply"},
+    }
+    job = app.submit_job("refactor", "Refactor", lambda job: result, project=PROJECT)
+    wait_for(job)
+    app.apply_finished_jobs()
+    
+    stored = session.refactor_results["readability"]
+    assert "files" not in stored and stored["explanation"] == "tidy"
+    assert session.project_history.store.load(stored["revision"])["files"] == {"main.py": "print('hello')\n"}
+    assert "size" not in session.refactor_results
+    assert session.job_errors == ["Refactor (size): bad reply"]
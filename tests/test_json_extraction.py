@@ -0,0 +1,31 @@
+import pytest
+
+import app
+
+
+TRUNCATED = '{"project_name": "demo", "description": "d", "files": {"main.py": "print(1)\\n", "util.py": "def f('
+
+
+def test_extract_json_object_tolerates_fences_and_prose():
+    reply = 'Here you go:\n```json\n{"files": {"a.py": "x = {1: 2}"}}\n```\nEnjoy {not json}'
+    
+    assert app.extract_json_object(reply) == {"files": {"a.py": "x = {1: 2}"}}
+
+
+def test_extract_json_object_skips_objects_without_the_required_key():
+    reply = 'Example: {"note": 1} then {"files": {}}'
+    
+    assert app.extract_json_object(reply, required_key="files") == {"files": {}}
+    with pytest.raises(ValueError):
+        app.extract_json_object('{"note": 1}', required_key="files")
+
+
+def test_salvage_json_files():
+    fenced = '```json\n{"project_name": "demo", "files": {"main.py": "x"}}\n```'
+    
+    assert app.salvage_json_files(fenced) == ({"project_name": "demo", "files": {"main.py": "x"}}, True)
+    assert app.salvage_json_files(TRUNCATED) == (
+        {"project_name": "demo", "description": "d", "files": {"main.py": "print(1)\n"}}, False
+    )
+    with pytest.raises(ValueError):
+        app.salvage_json_files('{"project_name": "demo", "files": {"main.py": "pri')
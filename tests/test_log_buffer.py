@@ -0,0 +1,34 @@
+import os
+
+import app
+
+
+def test_bounded_text_keeps_head_and_tail():
+    log = app.LogBuffer(spill=False, head_lines=2, tail_lines=2)
+    for i in range(10):
+        log.append(f"line {i}\n")
+    
+    assert len(log) == 10
+    assert log.text() == "line 0\nline 1\n... 6 lines omitted ...\nline 8\nline 9\n"
+    assert log.last(1) == ["line 9"]
+    assert log.full_text() == log.text()
+
+
+def test_short_log_is_kept_in_full_without_a_file():
+    log = app.LogBuffer(head_lines=1, tail_lines=1)
+    for i in range(3):
+        log.append(f"line {i}")
+    
+    assert log.path is None
+    assert log.full_text() == "line 0\nline 1\nline 2\n"
+
+
+def test_large_log_spills_to_disk():
+    log = app.LogBuffer(head_lines=1, tail_lines=1, spill_bytes=20)
+    for i in range(10):
+        log.append(f"line {i}")
+    
+    assert log.path and os.path.exists(log.path)
+    assert log.full_text() == "".join(f"line {i}\n" for i in range(10))
+    assert log.text() == "line 0\n... 8 lines omitted ...\nline 9\n"
+    log.close()
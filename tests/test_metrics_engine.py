@@ -0,0 +1,37 @@
+import app
+
+
+PROJECT = {
+    "project_name": "demo",
+    "dependencies": ["requests"],
+    "files": {
+        "main.py": "def f(x):\n    if x:\n        return 1\n    return 2\n",
+        "README.md": "# Demo\n",
+    },
+}
+
+
+def test_project_metrics_are_memoized_per_revision(monkeypatch):
+    engine = app.MetricsEngine()
+    first = engine.project_metrics(PROJECT)
+    
+    calls = []
+    monkeypatch.setattr(app, "project_content_hash", lambda files: calls.append(1) or "never")
+    monkeypatch.setattr(app, "compute_file_metrics", lambda *args: calls.append(1))
+    
+    assert engine.project_metrics(PROJECT) is first
+    assert not calls
+
+
+def test_changed_content_is_recomputed():
+    engine = app.MetricsEngine()
+    first = engine.project_metrics(PROJECT)
+    edited = {**PROJECT, "files": {**PROJECT["files"], "main.py": "def f(x):\n    return x\n"}}
+    
+    second = engine.project_metrics(edited)
+    
+    assert second is not first
+    assert second["total_lines"] < first["total_lines"]
+    assert second["dependencies"] == first["dependencies"] == 1
+    # An equal copy of the first revision is served from the content-hash memo
+    assert engine.project_metrics({**PROJECT, "files": dict(PROJECT["files"])}) is first
@@ -0,0 +1,81 @@
+import time
+
+import pytest
+
+import app
+
+
+PROJECT = {"project_name": "metrics-demo", "files": {"main.py": "def f(x):\n    return x + 1\n"}}
+
+
+@pytest.fixture
+def history(tmp_path, monkeypatch):
+    store = app.MetricsHistory(str(tmp_path / "metrics.sqlite"))
+    monkeypatch.setattr(app, "get_metrics_history", lambda: store)
+    return store
+
+
+def finished_job(kind, result, status="done", **context):
+    job = app.Job(kind, kind)
+    job.context = {"project": PROJECT, **context}
+    job.result = result
+    job.status = status
+    job.started_at = time.time() - 1
+    job.finished_at = time.time()
+    return job
+
+
+def events(history):
+    return [success for _, _, _, success in history.events(PROJECT["project_name"])]
+
+
+@pytest.mark.parametrize("kind, result", [
+    ("scan", {"success": False, "error": "quota exceeded"}),
+    ("debug", {"success": False, "error": "No complete JSON object found"}),
+    ("debug", {"success": True, "updated_project": PROJECT, "iterations": 3,
+               "test_results": {"failed_tests": ["pytest"], "summary": {}}}),
+    ("refactor", {"security": {"success": True}, "size": {"success": False, "error": "bad reply"}}),
+    ("cicd", "CI/CD generation failed: timeout"),
+])
+def test_jobs_returning_failures_are_recorded_as_failed_events(history, kind, result):
+    app.record_job_metrics(finished_job(kind, result))
+    assert events(history) == [0.0]
+
+
+def test_successful_jobs_are_recorded_as_successful_events(history):
+    app.record_job_metrics(finished_job("scan", {
+        "success": True, "findings": [], "counts": {severity: 0 for severity in app.SEVERITY_ORDER}
+    }))
+    app.record_job_metrics(finished_job("debug", {
+        "success": True, "updated_project": PROJECT, "iterations": 1, "test_results": {"failed_tests": []}
+    }))
+    assert events(history) == [1.0, 1.0]
+
+
+def test_cancelled_jobs_are_failed_events(history):
+    app.record_job_metrics(finished_job("build", None, status="cancelled"))
+    assert events(history) == [0.0]
+
+
+def test_query_downsamples_into_buckets(history):
+    start = time.time() - 1000
+    for second in range(1000):
+        history.record("p", "r", [("sloc", second)], ts=start + second)
+    
+    frame = history.query("p", ["sloc"], start, start + 1000, max_points=10)
+    
+    assert 10 <= len(frame) <= 11
+    assert frame["samples"].sum() == 1000
+
+
+def test_security_rating_comes_from_the_scan_counts():
+    def report(**counts):
+        return {"success": True, "counts": {severity: counts.get(severity, 0) for severity in app.SEVERITY_ORDER}}
+    
+    assert app.security_rating(None) is None
+    assert app.security_rating({"success": False, "error": "quota exceeded"}) is None
+    assert app.security_rating(report(Low=4, Info=2)) == "A"
+    assert app.security_rating(report(Medium=1)) == "B"
+    assert app.security_rating(report(Medium=3)) == "C"
+    assert app.security_rating(report(High=1)) == "D"
+    assert app.security_rating(report(Critical=1, Medium=1)) == "F"
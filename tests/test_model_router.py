@@ -0,0 +1,45 @@
+import app
+
+
+def record(telemetry, operation, model, duration, error=None, cache="miss"):
+    call = telemetry.call(operation, model, "prompt")
+    call.duration = duration
+    call.error = error
+    call.cache = cache
+    telemetry.record(call)
+
+
+def test_router_falls_back_a_tier_on_slo_breach():
+    telemetry = app.LLMTelemetry()
+    router = app.ModelRouter(telemetry, overrides={})
+    slow = app.OPERATION_SLO_SECONDS["deploy"] + 1
+    
+    for _ in range(app.SLO_MIN_SAMPLES - 1):
+        record(telemetry, "deploy", app.MODEL_TIERS["standard"], slow)
+    assert router.route("deploy", "") == app.MODEL_TIERS["standard"]
+    
+    record(telemetry, "deploy", app.MODEL_TIERS["standard"], slow)
+    assert router.route("deploy", "") == app.MODEL_TIERS["lite"]
+    
+    router.adaptive = False
+    assert router.route("deploy", "") == app.MODEL_TIERS["standard"]
+
+
+def test_router_falls_back_on_errors():
+    telemetry = app.LLMTelemetry()
+    router = app.ModelRouter(telemetry, overrides={})
+    for _ in range(app.SLO_MIN_SAMPLES):
+        record(telemetry, "debug_and_fix", app.MODEL_TIERS["pro"], 1.0, error="InternalServerError")
+    
+    assert router.route("debug_and_fix", "") == app.MODEL_TIERS["standard"]
+
+
+def test_router_overrides_and_lite_promotion():
+    router = app.ModelRouter(app.LLMTelemetry(), overrides={"deploy": "pro"})
+    
+    assert router.route("deploy", "") == app.MODEL_TIERS["pro"]
+    assert router.route("explain_code", "x") == app.MODEL_TIERS["lite"]
+    assert router.route("explain_code", "x" * 4 * (app.LITE_MAX_TOKENS + 1)) == app.MODEL_TIERS["standard"]
+    
+    router.override = "pro"
+    assert router.route("explain_code", "x") == app.MODEL_TIERS["pro"]
@@ -0,0 +1,111 @@
+import threading
+import time
+
+import app
+
+
+def big_project(name="demo", body="x = 1\n"):
+    return {"project_name": name, "files": {f"mod{i}.py": body * 400 + f"# {i}\n" for i in range(10)}}
+
+
+class Creator:
+    def __init__(self, manager=None, delay=0.0):
+        self.manager = manager
+        self.delay = delay
+        self.calls = 0
+
+    def __call__(self, text):
+        if self.manager is not None:
+            # The manager-wide lock must not be held across the network call
+            assert self.manager.lock.acquire(blocking=False)
+            self.manager.lock.release()
+        time.sleep(self.delay)
+        self.calls += 1
+        return object()
+
+
+def test_projects_sharing_a_name_get_their_own_handles():
+    manager = app.ProjectContextManager()
+    create = Creator(manager)
+    first = manager.context(big_project(body="a = 1\n"))
+    second = manager.context(big_project(body="b = 2\n"))
+    
+    handle_a, delta_a = manager.remote_prefix("m", first, create)
+    handle_b, delta_b = manager.remote_prefix("m", second, create)
+    
+    assert handle_a is not handle_b and delta_a == delta_b == ""
+    assert manager.remote_prefix("m", first, create) == (handle_a, "")
+    assert create.calls == 2
+
+
+def test_small_edit_reuses_snapshot_with_delta():
+    manager = app.ProjectContextManager()
+    create = Creator()
+    project = big_project()
+    handle, _ = manager.remote_prefix("m", manager.context(project), create)
+    
+    edited = {**project, "files": {**project["files"], "mod0.py": "print('changed')\n"}}
+    reused, delta = manager.remote_prefix("m", manager.context(edited), create)
+    
+    assert reused is handle and "changed" in delta
+    assert create.calls == 1
+
+
+def test_concurrent_requests_create_one_prefix_without_blocking_others():
+    manager = app.ProjectContextManager()
+    create = Creator(manager, delay=0.3)
+    context = manager.context(big_project())
+    other = manager.context(big_project(body="y = 2\n"))
+    results = []
+    
+    threads = [threading.Thread(target=lambda: results.append(manager.remote_prefix("m", context, create)))
+               for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    started = time.time()
+    manager.remote_prefix("m", other, Creator())
+    assert time.time() - started < 0.2
+    for thread in threads:
+        thread.join()
+    
+    assert create.calls == 1
+    assert len({id(handle) for handle, _ in results}) == 1
+
+
+def test_short_contexts_are_sent_inline():
+    manager = app.ProjectContextManager()
+    context = manager.context({"project_name": "tiny", "files": {"a.py": "x = 1\n"}})
+    assert manager.remote_prefix("m", context, Creator()) == (None, "")
+
+
+class FakeResponse:
+    text = "ok"
+    usage_metadata = None
+
+
+class GoneModel:
+    def generate_content(self, prompt, **kwargs):
+        raise type("NotFound", (Exception,), {})("CachedContent not found")
+
+
+class InlineModel:
+    def __init__(self):
+        self.prompts = []
+
+    def generate_content(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        return FakeResponse()
+
+
+def test_expired_cached_content_falls_back_to_inline_prompt(oracle):
+    manager = oracle.contexts
+    context = manager.context(big_project())
+    handle, _ = manager.remote_prefix("m", context, Creator())
+    inline = InlineModel()
+    oracle._cached_context_model = lambda model_name, ctx: (GoneModel(), "", handle)
+    oracle.model_for = lambda model_name: inline
+    
+    assert oracle.generate_text("refactor_code", "Refactor it", context=context) == "ok"
+    assert inline.prompts and inline.prompts[0].startswith(context.full)
+    assert not manager.remote
@@ -0,0 +1,44 @@
+import app
+
+
+FILES = {
+    "src/config.py": "class AppConfig:\n    debug = False\n",
+    "src/main.py": "from config import AppConfig\n\nprint(AppConfig().debug == False)\n",
+    "README.md": "Run with `python src/main.py`\n",
+}
+
+
+def search(index, files, query):
+    return [(match["file"], match["line"]) for match in index.search(files, query)]
+
+
+def test_search_matches_substrings_inside_identifiers():
+    index = app.ProjectIndex()
+    index.update(FILES)
+    
+    assert search(index, FILES, "Config") == [("src/config.py", 1), ("src/main.py", 1), ("src/main.py", 3)]
+    assert search(index, FILES, "ppconf") == search(index, FILES, "AppConfig")
+    assert search(index, FILES, "==") == [("src/main.py", 3)]
+    assert search(index, FILES, "missing") == []
+
+
+def test_update_reindexes_only_changed_files():
+    index = app.ProjectIndex()
+    assert index.update(FILES) == 3
+    assert index.update(FILES) == 0
+    
+    edited = {**FILES, "src/main.py": "print('hello')\n"}
+    del edited["README.md"]
+    
+    assert index.update(edited) == 2
+    assert search(index, edited, "AppConfig") == [("src/config.py", 1)]
+    assert search(index, edited, "hello") == [("src/main.py", 1)]
+
+
+def test_directory_listing():
+    index = app.ProjectIndex()
+    index.update(FILES)
+    
+    assert index.listing("") == (["src"], ["README.md"])
+    assert index.listing("src") == ([], ["src/config.py", "src/main.py"])
+    assert index.count_files("src") == 2
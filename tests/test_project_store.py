@@ -0,0 +1,88 @@
+import gc
+import os
+import threading
+
+import app
+
+
+def project(name, body, extra=None):
+    files = {"shared.py": "x = 1\n" * 500, "main.py": body}
+    files.update(extra or {})
+    return {"project_name": name, "description": "", "files": files}
+
+
+def test_put_load_roundtrip_and_deduplication(tmp_path):
+    store = app.ProjectStore(str(tmp_path))
+    first = store.put(project("a", "print(1)\n"))
+    second = store.put(project("a", "print(2)\n"))
+    
+    assert store.put(project("a", "print(1)\n")) == first
+    assert store.stats()["revisions"] == 2 and store.stats()["blobs"] == 3
+    
+    fresh = app.ProjectStore(str(tmp_path))
+    assert fresh.load(first) == project("a", "print(1)\n")
+    assert fresh.load(second)["files"]["shared.py"] is fresh.load(first)["files"]["shared.py"]
+    assert fresh.load("missing") is None
+
+
+def test_history_undo_redo_and_release(tmp_path):
+    store = app.ProjectStore(str(tmp_path))
+    history = app.ProjectHistory(store)
+    first = history.commit(project("a", "v1\n"), "Generated")
+    second = history.commit(project("a", "v2\n"), "Auto-debug")
+    
+    history.undo()
+    assert history.current == first and history.can_redo
+    history.redo()
+    assert history.current == second
+    
+    history.undo()
+    third = history.commit(project("a", "v3\n"), "Generated")
+    assert [revision for revision, _ in history.entries] == [first, third] and not history.can_redo
+    
+    candidate = history.stash(project("a", "refactored\n"))
+    history.apply(candidate, "Refactor")
+    assert history.project()["files"]["main.py"] == "refactored\n"
+    
+    del history
+    gc.collect()
+    with store._connect() as conn:
+        assert conn.execute("SELECT SUM(refs) FROM revisions").fetchone()[0] == 0
+
+
+def test_eviction_only_drops_unreferenced_revisions_and_their_blobs(tmp_path):
+    store = app.ProjectStore(str(tmp_path), max_mb=0)
+    history = app.ProjectHistory(store)
+    kept = history.commit(project("a", "kept\n"), "Generated")
+    store.put(project("b", "dropped\n", {"only_b.py": "y = 2\n" * 300}))
+    store.put(project("c", "latest\n"))
+    
+    assert app.ProjectStore(str(tmp_path)).load(kept) == project("a", "kept\n")
+    blob_files = sum(len(names) for _, _, names in os.walk(tmp_path / "blobs"))
+    assert blob_files == store.stats()["blobs"]
+
+
+def test_concurrent_puts_and_evictions_never_lose_retained_blobs(tmp_path):
+    store = app.ProjectStore(str(tmp_path), max_mb=0)
+    histories = [app.ProjectHistory(store) for _ in range(6)]
+    errors = []
+    
+    def work(worker, history):
+        try:
+            for round_ in range(15):
+                history.commit(project(f"p{worker}", f"print({round_})\n"), "Generated")
+                store.put(project("scratch", f"tmp {worker} {round_}\n"))
+        except Exception as e:
+            errors.append(e)
+    
+    threads = [threading.Thread(target=work, args=(worker, history)) for worker, history in enumerate(histories)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert not errors
+    fresh = app.ProjectStore(str(tmp_path), max_mb=0)
+    for history in histories:
+        for revision, _ in history.entries:
+            assert fresh.load(revision) is not None
@@ -0,0 +1,92 @@
+import json
+import threading
+
+import app
+
+
+PROJECT = {
+    "project_name": "demo",
+    "files": {
+        "main.py": "def total(xs):\n    t = 0\n    for x in xs:\n        t += x\n    return t\n",
+        "util.py": "X = 1\n",
+    },
+}
+REPLIES = {
+    "readability": {"files": {"main.py": "def total(values):\n    return sum(values)\n", "util.py": "X = 1\n"},
+                    "explanation": "Use sum"},
+    "security": {"files": {}, "explanation": "Nothing to do"},
+    "size": "I would rather not.",
+}
+
+
+def scripted_refactors(oracle, barrier=None):
+    calls = []
+    
+    def generate_text(method, prompt, context=None):
+        objective = next(name for name, text in oracle.REFACTOR_OBJECTIVES.items() if text in prompt)
+        calls.append(objective)
+        if barrier:
+            barrier.wait(timeout=5)
+        reply = REPLIES[objective]
+        return reply if isinstance(reply, str) else json.dumps(reply)
+    
+    oracle.generate_text = generate_text
+    return calls
+
+
+def test_objectives_run_concurrently_with_per_file_diffs(oracle):
+    # Every call waits for all three to be in flight, so a sequential fan-out would time out
+    barrier = threading.Barrier(3)
+    scripted_refactors(oracle, barrier)
+    reported = []
+    
+    results = oracle.refactor_many(PROJECT, ["readability", "security", "size"],
+                                   on_result=lambda objective, result: reported.append(objective))
+    
+    assert not barrier.broken
+    assert sorted(reported) == ["readability", "security", "size"]
+    readability = results["readability"]
+    assert readability["success"] and readability["explanation"] == "Use sum"
+    assert list(readability["files"]) == ["main.py"]
+    assert list(readability["diffs"]) == ["main.py"]
+    diff = readability["diffs"]["main.py"]
+    assert diff.startswith("--- a/main.py\n+++ b/main.py\n")
+    assert "-    for x in xs:\n" in diff
+    assert "+    return sum(values)\n" in diff
+    assert results["security"]["success"] and results["security"]["files"] == {}
+
+
+def test_failed_objective_is_reported_without_affecting_the_others(oracle):
+    calls = scripted_refactors(oracle)
+    
+    results = oracle.refactor_many(PROJECT, ["readability", "size"])
+    
+    assert results["readability"]["success"]
+    assert results["size"] == {"success": False, "objective": "size", "error": results["size"]["error"]}
+    assert "JSON" in results["size"]["error"]
+    assert sorted(calls) == ["readability", "size"]
+
+
+def test_unparseable_reply_is_not_served_from_cache(oracle):
+    context = oracle.contexts.context(PROJECT)
+    prompt = f"{oracle.REFACTOR_OBJECTIVES['size']} for the project above."
+    forgotten = []
+    oracle.forget = lambda method, text: forgotten.append((method, text))
+    scripted_refactors(oracle)
+    
+    oracle.refactor_code(PROJECT, "size")
+    
+    method, text = forgotten[0]
+    assert method == "refactor_code"
+    assert text.startswith(context.full) and prompt in text
+
+
+def test_project_context_is_built_once_for_all_objectives(oracle, monkeypatch):
+    scripted_refactors(oracle)
+    builds = []
+    project_context = app.ProjectContext
+    monkeypatch.setattr(app, "ProjectContext", lambda project: builds.append(1) or project_context(project))
+    
+    oracle.refactor_many(PROJECT, ["readability", "security", "size"])
+    
+    assert len(builds) == 1
@@ -0,0 +1,46 @@
+import sqlite3
+
+import app
+
+
+def test_set_get_and_stats(tmp_path):
+    cache = app.ResponseCache(str(tmp_path / "cache.sqlite"))
+    
+    assert cache.get("model", "explain_code", "prompt") is None
+    cache.set("model", "explain_code", "prompt", "answer")
+    
+    assert cache.get("model", "explain_code", "prompt") == "answer"
+    assert cache.get("other-model", "explain_code", "prompt") is None
+    assert cache.stats() == {"hits": 1, "misses": 2, "hit_rate": 33.3, "entries": 1}
+
+
+def test_expired_entries_miss_and_are_dropped(tmp_path):
+    cache = app.ResponseCache(str(tmp_path / "cache.sqlite"), ttl_seconds=60)
+    cache.set("model", "deploy", "prompt", "answer")
+    with sqlite3.connect(cache.path) as conn:
+        conn.execute("UPDATE responses SET created_at = created_at - 120")
+    
+    assert cache.get("model", "deploy", "prompt") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = app.ResponseCache(str(tmp_path / "cache.sqlite"), max_entries=2)
+    cache.set("model", "m", "a", "1")
+    cache.set("model", "m", "b", "2")
+    with sqlite3.connect(cache.path) as conn:
+        conn.execute("UPDATE responses SET last_access = last_access - 10 WHERE key = ?", (cache.make_key("model", "m", "a"),))
+    cache.set("model", "m", "c", "3")
+    
+    assert cache.get("model", "m", "a") is None
+    assert cache.get("model", "m", "b") == "2"
+    assert cache.get("model", "m", "c") == "3"
+
+
+def test_invalidate(tmp_path):
+    cache = app.ResponseCache(str(tmp_path / "cache.sqlite"))
+    cache.set("model", "m", "prompt", "not json")
+    
+    cache.invalidate("model", "m", "prompt")
+    
+    assert cache.get("model", "m", "prompt") is None
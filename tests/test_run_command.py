@@ -0,0 +1,50 @@
+import sys
+import threading
+import time
+
+import app
+
+
+PRINT_LIMITS = (
+    f"{sys.executable} -c \"import resource; "
+    "print(resource.getrlimit(resource.RLIMIT_CPU)[0], resource.getrlimit(resource.RLIMIT_DATA)[0])\""
+)
+
+
+def test_commands_run_under_cpu_and_memory_limits(tmp_path):
+    result = app.run_command(PRINT_LIMITS, str(tmp_path), limits={"cpu_seconds": 7, "memory_mb": 1024})
+    
+    assert result["returncode"] == 0, result["stderr"]
+    assert result["stdout"].split() == ["7", str(1024 * 1024 * 1024)]
+
+
+def test_limits_apply_without_prlimit_binary(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "PRLIMIT", None)
+    result = app.run_command(
+        f"{sys.executable} -c \"import time, resource; time.sleep(0.5); print(resource.getrlimit(resource.RLIMIT_CPU)[0])\"",
+        str(tmp_path), limits={"cpu_seconds": 9}
+    )
+    
+    assert result["stdout"].strip() == "9"
+
+
+def test_commands_can_run_concurrently_from_threads(tmp_path):
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(app.run_command(PRINT_LIMITS, str(tmp_path))))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=60)
+    
+    assert len(results) == 8 and all(result["returncode"] == 0 for result in results)
+
+
+def test_cancel_kills_the_command(tmp_path):
+    cancel = threading.Event()
+    threading.Timer(0.3, cancel.set).start()
+    started = time.time()
+    
+    result = app.run_command(f"{sys.executable} -c \"import time; time.sleep(30)\"", str(tmp_path), cancel=cancel)
+    
+    assert result["cancelled"] and time.time() - started < 5
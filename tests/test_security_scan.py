@@ -0,0 +1,72 @@
+import json
+
+import app
+
+
+PROJECT = {
+    "project_name": "demo",
+    "files": {
+        "src/app.py": "import sqlite3\n\ndef find(db, name):\n    return db.execute(f\"SELECT * FROM users WHERE name = '{name}'\")\n",
+        "src/util.py": "def add(a, b):\n    return a + b\n",
+    },
+}
+
+
+def scripted_scan(oracle, findings):
+    calls = []
+
+    def generate_text(method, prompt, context=None, model_name=None):
+        calls.append(model_name)
+        return json.dumps({"findings": findings})
+
+    oracle.generate_text = generate_text
+    return calls
+
+
+def test_match_finding_file_normalizes_model_paths():
+    names = {"src/app.py", "src/util.py"}
+    assert app.match_finding_file("./src/app.py", names) == "src/app.py"
+    assert app.match_finding_file("/workspace/demo/src/app.py", names) == "src/app.py"
+    assert app.match_finding_file("src\\util.py", names) == "src/util.py"
+    assert app.match_finding_file("app.py", names) == "src/app.py"
+    assert app.match_finding_file("other.py", names) is None
+
+
+def test_rescan_keeps_findings_reported_under_unnormalized_path(oracle):
+    finding = {"file": "./src/app.py", "line": 4, "cwe": "CWE-89", "severity": "High",
+               "issue": "SQL injection", "fix": "Use parameters"}
+    calls = scripted_scan(oracle, [finding])
+    
+    first = oracle.security_scan(PROJECT, "Python")
+    second = oracle.security_scan(PROJECT, "Python")
+    
+    assert len(calls) == 1
+    for report in (first, second):
+        sql = [f for f in report["findings"] if f["cwe"] == "CWE-89" and "[local]" not in f["issue"]]
+        assert [f["file"] for f in sql] == ["src/app.py"]
+
+
+def test_unattributed_findings_are_kept_and_not_cached(oracle):
+    finding = {"file": "somewhere/else.py", "line": 1, "cwe": "CWE-798", "severity": "Medium",
+               "issue": "Hard-coded token", "fix": "Use env vars"}
+    calls = scripted_scan(oracle, [finding])
+    
+    first = oracle.security_scan(PROJECT, "Python")
+    second = oracle.security_scan(PROJECT, "Python")
+    
+    assert len(calls) == 2
+    assert any(f["issue"] == "Hard-coded token" for f in first["findings"])
+    assert any(f["issue"] == "Hard-coded token" for f in second["findings"])
+
+
+def test_file_cache_is_keyed_on_the_scanning_model(oracle):
+    finding = {"file": "src/app.py", "line": 4, "cwe": "CWE-89", "severity": "High",
+               "issue": "SQL injection", "fix": "Use parameters"}
+    calls = scripted_scan(oracle, [finding])
+    
+    oracle.security_scan(PROJECT, "Python")
+    oracle.router.override = "pro"
+    oracle.security_scan(PROJECT, "Python")
+    oracle.security_scan(PROJECT, "Python")
+    
+    assert calls == [app.MODEL_TIERS["standard"], app.MODEL_TIERS["pro"]]
@@ -0,0 +1,62 @@
+import app
+
+
+def record(telemetry, operation, model, duration, error=None, cache="miss"):
+    call = telemetry.call(operation, model, "prompt")
+    call.duration = duration
+    call.error = error
+    call.cache = cache
+    telemetry.record(call)
+
+
+def test_telemetry_summary_excludes_cache_hits_from_latency():
+    telemetry = app.LLMTelemetry()
+    for duration in (1.0, 2.0, 3.0, 4.0):
+        record(telemetry, "deploy", "m", duration)
+    record(telemetry, "deploy", "m", 0.0, cache="hit")
+    record(telemetry, "deploy", "m", 5.0, error="ResourceExhausted")
+    
+    row, = telemetry.summary()
+    
+    assert row["calls"] == 6
+    assert row["errors"] == 1
+    assert row["cache_hit_rate"] == 16.7
+    assert row["p50_s"] == 3.0
+    assert row["p99_s"] == 5.0
+
+
+def test_prometheus_text_exposes_counters():
+    telemetry = app.LLMTelemetry()
+    record(telemetry, "deploy", "m", 1.5)
+    record(telemetry, "deploy", "m", 0.5, error="DeadlineExceeded")
+    
+    text = telemetry.prometheus_text()
+    
+    assert "# TYPE singularity_llm_call_duration_seconds summary" in text
+    assert 'singularity_llm_call_duration_seconds{operation="deploy",quantile="0.5"} 0.5' in text
+    assert 'singularity_llm_calls_total{operation="deploy",cache="miss"} 2' in text
+    assert 'singularity_llm_errors_total{operation="deploy",error="DeadlineExceeded"} 1' in text
+
+
+def test_quantile_is_nearest_rank():
+    values = [float(v) for v in range(10, 0, -1)]
+    
+    assert app.LLMTelemetry._quantile(values, 0.5) == 5.0
+    assert app.LLMTelemetry._quantile(values, 0.95) == 10.0
+    assert app.LLMTelemetry._quantile([7.0], 0.99) == 7.0
+
+
+def test_call_context_records_ttft_estimated_tokens_and_errors():
+    telemetry = app.LLMTelemetry()
+    with telemetry.call("explain_code", "m", "p" * 400) as call:
+        call.output("r" * 40)
+    try:
+        with telemetry.call("explain_code", "m", "prompt"):
+            raise TimeoutError()
+    except TimeoutError:
+        pass
+    
+    assert call.ttft is not None and call.ttft <= call.duration
+    row, = telemetry.summary()
+    assert (row["calls"], row["errors"]) == (2, 1)
+    assert (row["prompt_tokens"], row["response_tokens"]) == (101, 10)
@@ -0,0 +1,112 @@
+import json
+import os
+import sys
+
+import app
+
+
+def go_events(count):
+    for index in range(count):
+        test = f"TestCase{index}"
+        yield json.dumps({"Action": "run", "Package": "example.com/pkg", "Test": test})
+        yield json.dumps({"Action": "output", "Package": "example.com/pkg", "Test": test, "Output": f"=== RUN {test}\n"})
+        action = "fail" if index == count // 2 else "pass"
+        yield json.dumps({"Action": action, "Package": "example.com/pkg", "Test": test, "Elapsed": 0.01})
+
+
+def test_go_json_keeps_every_record_of_a_large_suite():
+    count = app.LOG_HEAD_LINES + app.LOG_TAIL_LINES
+    records, plain = app.parse_go_test_json(line + "\n" for line in go_events(count))
+    
+    assert len(records) == count
+    failed = [record for record in records if record["status"] == "failed"]
+    assert [record["name"] for record in failed] == [f"example.com/pkg::TestCase{count // 2}"]
+    assert "=== RUN" in failed[0]["message"]
+    assert len(plain.splitlines()) <= app.LOG_HEAD_LINES + app.LOG_TAIL_LINES + 1
+
+
+def test_cargo_output_records_and_failure_messages():
+    stdout = (
+        "running 3 tests\n"
+        "test tests::adds ... ok\n"
+        "test tests::breaks ... FAILED\n"
+        "test tests::later ... ignored\n"
+        "\nfailures:\n\n"
+        "---- tests::breaks stdout ----\n"
+        "thread 'tests::breaks' panicked at src/lib.rs:10:9\n"
+        "\nfailures:\n    tests::breaks\n"
+    )
+    records = {record["name"]: record for record in app.parse_cargo_output(stdout)}
+    
+    assert {name: record["status"] for name, record in records.items()} == {
+        "tests::adds": "passed", "tests::breaks": "failed", "tests::later": "skipped"
+    }
+    assert "panicked" in records["tests::breaks"]["message"]
+
+
+def test_run_command_writes_full_stdout_beyond_the_bounded_capture(tmp_path):
+    lines = app.LOG_HEAD_LINES + app.LOG_TAIL_LINES + 500
+    transcript = tmp_path / "stdout.txt"
+    result = app.run_command(
+        f"{sys.executable} -c \"[print(i) for i in range({lines})]\"", str(tmp_path), stdout_path=str(transcript)
+    )
+    
+    assert result["returncode"] == 0
+    assert len(transcript.read_text().splitlines()) == lines
+    assert len(result["stdout"].splitlines()) < lines
+
+
+def test_instrumented_go_and_cargo_report_through_stdout_files(tmp_path):
+    go_cmd, runner, reports = app.instrument_test_command("go test ./...", str(tmp_path), str(tmp_path), 0)
+    assert runner == "go" and "-json" in go_cmd and "stdout" in reports
+    
+    _, runner, reports = app.instrument_test_command("cargo test", str(tmp_path), str(tmp_path), 1)
+    assert runner == "cargo" and reports["stdout"].startswith(str(tmp_path))
+    
+    with open(reports["stdout"], "w") as f:
+        f.write("test a ... ok\ntest b ... FAILED\n")
+    records, _ = app.ingest_test_reports({"stdout": "", "stderr": ""}, runner, reports, str(tmp_path))
+    assert [record["status"] for record in records] == ["passed", "failed"]
+
+
+def test_npm_separator_is_not_duplicated(tmp_path):
+    (tmp_path / "package.json").write_text(json.dumps({"scripts": {"test": "jest"}}))
+    
+    plain, runner, _ = app.instrument_test_command("npm test", str(tmp_path), str(tmp_path), 0)
+    with_args, _, _ = app.instrument_test_command("npm test -- --runInBand", str(tmp_path), str(tmp_path), 1)
+    
+    assert runner == "jest"
+    assert plain.startswith("npm test -- --json")
+    assert with_args.count(" -- ") == 1 and with_args.startswith("npm test -- --runInBand --json")
+
+
+def test_junit_report_records(tmp_path):
+    report = tmp_path / "junit.xml"
+    report.write_text(
+        '<testsuite><testcase classname="tests.test_api" name="test_ok" time="0.5"/>'
+        '<testcase classname="tests.test_api" name="test_bad" time="0.1">'
+        '<failure message="assert 1 == 2">trace</failure></testcase>'
+        '<testcase classname="tests.test_api" name="test_skip"><skipped message="later"/></testcase></testsuite>'
+    )
+    (tmp_path / "tests").mkdir()
+    (tmp_path / "tests" / "test_api.py").write_text("")
+    
+    records = app.parse_junit_xml(str(report), str(tmp_path))
+    
+    assert [(record["status"], record["file"]) for record in records] == [
+        ("passed", "tests/test_api.py"), ("failed", "tests/test_api.py"), ("skipped", "tests/test_api.py")
+    ]
+    assert "assert 1 == 2" in records[1]["message"]
+
+
+def test_run_tests_parses_pytest_results(oracle, tmp_path):
+    (tmp_path / "test_sample.py").write_text(
+        "def test_passes():\n    assert True\n\ndef test_fails():\n    assert 1 == 2\n"
+    )
+    
+    results = oracle.run_tests(str(tmp_path), "Python", [f"{sys.executable} -m pytest -q -p no:cacheprovider"])
+    
+    assert not results["success"]
+    assert results["summary"]["total"] == 2 and results["summary"]["failed"] == 1
+    assert results["failures"][0]["name"].endswith("test_fails")
+    assert "test_fails" in app.format_test_failures(results)
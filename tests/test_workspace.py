@@ -0,0 +1,67 @@
+import json
+import os
+import sys
+
+import app
+
+
+PROJECT = {"project_name": "demo", "files": {"check.py": "import sys\nsys.exit(1)\n", "pkg/data.txt": "v1\n"}}
+
+
+def read(path, filename):
+    with open(os.path.join(path, filename), encoding="utf-8") as f:
+        return f.read()
+
+
+def test_materialize_rewrites_only_changed_files_and_removes_dropped_ones(tmp_path):
+    manager = app.WorkspaceManager(root=str(tmp_path / "ws"))
+    path = manager.materialize("s1", PROJECT)
+    assert manager.workspaces[path]["written"] == 2
+    
+    manager.materialize("s1", {**PROJECT, "files": {"check.py": PROJECT["files"]["check.py"]}})
+    
+    assert manager.workspaces[path]["written"] == 0
+    assert not os.path.exists(os.path.join(path, "pkg", "data.txt"))
+
+
+def test_materialize_restores_files_changed_by_write_files(tmp_path):
+    manager = app.WorkspaceManager(root=str(tmp_path / "ws"))
+    path = manager.materialize("s1", PROJECT)
+    manager.write_files("s1", "demo", {"check.py": "print('fixed')\n"})
+    assert read(path, "check.py") == "print('fixed')\n"
+    
+    # e.g. the debug job failed or the user pressed Undo
+    manager.materialize("s1", PROJECT)
+    
+    assert read(path, "check.py") == PROJECT["files"]["check.py"]
+
+
+def test_writes_never_escape_the_workspace(tmp_path):
+    manager = app.WorkspaceManager(root=str(tmp_path / "ws"))
+    manager.materialize("s1", {**PROJECT, "files": {**PROJECT["files"], "../outside.py": "x"}})
+    manager.write_files("s1", "demo", {"../../escaped.py": "x", "/tmp/absolute.py": "x"})
+    
+    assert not list(tmp_path.rglob("outside.py"))
+    assert not list(tmp_path.rglob("escaped.py"))
+    assert not app.is_safe_project_path("../x")
+    assert not app.is_safe_project_path("/etc/passwd")
+    assert app.is_safe_project_path("src/../main.py")
+
+
+def test_debug_fixes_go_through_the_workspace_manager(oracle, tmp_path):
+    manager = app.WorkspaceManager(root=str(tmp_path / "ws"))
+    lease = app.WorkspaceLease(manager, "s1")
+    project = {**PROJECT, "test_commands": [f"{sys.executable} check.py"]}
+    fixes = {"check.py": "import sys\nsys.exit(0)\n", "../evil.py": "x"}
+    oracle.generate_text = lambda method, prompt, context=None: json.dumps(
+        {"fixed_files": fixes, "fix_explanation": "exit cleanly"}
+    )
+    failing = {"failed_tests": project["test_commands"], "errors": "exit 1", "output": "", "failures": []}
+    
+    result = oracle.debug_and_fix(project, failing, max_iterations=1, workspace=lease, language="Python")
+    
+    assert result["success"] and not result["test_results"]["failed_tests"]
+    assert "../evil.py" not in result["updated_project"]["files"]
+    assert not list(tmp_path.rglob("evil.py"))
+    path = lease.materialize(project)
+    assert read(path, "check.py") == PROJECT["files"]["check.py"]